@@ -5,72 +5,210 @@ FastAPI app for student-side workflow:
 1. Receives task requests (Round 1 / Round 2)
 2. Generates or upgrades apps using LLM
 3. Pushes to GitHub and deploys GitHub Pages
-4. Notifies evaluation API
+4. Notifies evaluation API (through a durable outbox)
 """
 
 from fastapi import FastAPI, Request, HTTPException
-from config import STUDENT_SECRET, BASE_REPO_DIR, GITHUB_USERNAME, DEBUG_MODE
-from github_utils import create_or_update_repo
-from llm_generator import generate_app_from_brief, generate_readme_for_repo
-from attachment_utils import save_attachments
-
+from pydantic import ValidationError
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from config import (
+    STUDENT_SECRET, BASE_REPO_DIR, GITHUB_USERNAME, JOB_EVICT_INTERVAL, LEASE_TTL_SECONDS,
+    VERIFY_ENABLED, WARMUP, TASK_EVENTS_POLL_SECONDS, TASK_EVENTS_KEEPALIVE_SECONDS,
+)
+from github_utils import create_or_update_repo, checkout_repo
+from llm_generator import generate_app_from_brief, generate_readme_for_repo, verify_and_repair
+from attachment_utils import ingest_attachments, load_attachments
+from models import TaskRequest
+import ingest
+import events
+import github_api
+import job_store
+import llm_cache
+import llm_client
+import locks
+import log
+import metrics
+import pages_watcher
+import rate_limiter
+import workspace
+from pages_watcher import wait_for_pages
+from outbox import outbox
+import scheduler
+
+from contextlib import asynccontextmanager
 from pathlib import Path
 from uuid import uuid4
 import asyncio
-import traceback
-import requests
+import hmac
 import json
-import httpx
-
-app = FastAPI(title="LLM Code Deployment - Student API", version="1.3.0")
 
-# Track ongoing tasks to avoid duplicate processing per round
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not STUDENT_SECRET:
+        log.error("❌ STUDENT_SECRET is not set; /api-endpoint will reject every request.")
+    outbox.start()
+    await resume_unfinished_jobs()
+    evictor = asyncio.create_task(evict_finished_jobs())
+    adopter = asyncio.create_task(adopt_orphaned_jobs())
+    warmer = asyncio.create_task(warm_up()) if WARMUP else None
+    yield
+    evictor.cancel()
+    adopter.cancel()
+    if warmer is not None:
+        warmer.cancel()
+    await llm_client.aclose()
+    await pages_watcher.watcher.aclose()
+    await outbox.aclose()
+    scheduler.shutdown()
+
+app = FastAPI(title="LLM Code Deployment - Student API", version="1.3.0", lifespan=lifespan)
+
+# Tasks running in this worker; across workers the job lease (locks.py) decides
 ongoing_tasks: dict[str, asyncio.Task] = {}
 
+def task_key(data: dict) -> str:
+    return f"{data['email']}:{data['task']}:{int(data.get('round', 1))}"
+
+def start_task(key: str, data: dict):
+    """
+    Schedule process_task in the background (the caller must hold the job's
+    lease) and drop it from ongoing_tasks once done.
+    """
+    task = asyncio.create_task(run_with_lease(key, data))
+    ongoing_tasks[key] = task
+    task.add_done_callback(lambda t: ongoing_tasks.pop(key, None) if ongoing_tasks.get(key) is t else None)
+
+async def run_with_lease(key: str, data: dict) -> dict | None:
+    """Run process_task while renewing the job lease; release it afterwards. Returns its result."""
+    keeper = asyncio.create_task(locks.keep_lease(key, asyncio.current_task()))
+    try:
+        return await process_task(data)
+    finally:
+        keeper.cancel()
+        locks.release_lease(key)
+
 # ---------------------------------------------------------------------
-# Helper: Wait for GitHub Pages to become live
+# Helper: Job recovery and eviction
 # ---------------------------------------------------------------------
-async def wait_for_pages(url: str, timeout: int = 300) -> bool:
-    """Wait until GitHub Pages returns HTTP 200 or timeout."""
-    start = asyncio.get_event_loop().time()
-    while asyncio.get_event_loop().time() - start < timeout:
+async def resume_unfinished_jobs():
+    """
+    Restart every unfinished job that no live worker holds a lease on: jobs
+    left over from a restart, or from a worker that died mid-run.
+    """
+    for job in await scheduler.run_in_stage("io", job_store.unfinished_jobs):
+        if job["key"] in ongoing_tasks or not locks.acquire_lease(job["key"]):
+            continue
+        log.info("♻️ Resuming %s after stage '%s'", job["key"], job["stage"])
+        start_task(job["key"], job["payload"])
+
+async def adopt_orphaned_jobs():
+    """Periodically pick up jobs whose worker stopped renewing their lease."""
+    while True:
+        await asyncio.sleep(LEASE_TTL_SECONDS)
+        try:
+            await resume_unfinished_jobs()
+        except Exception as e:
+            log.warning("⚠️ Orphaned job scan failed: %s", e)
+
+async def warm_up():
+    """
+    Builds the LLM and GitHub clients and opens their connection pools in the
+    background (WARMUP=true), so the first task doesn't pay for SDK imports
+    and TLS handshakes. Startup doesn't wait for it.
+    """
+    # Let the lifespan finish so the server is listening (and acking requests) first
+    await asyncio.sleep(0.5)
+    await asyncio.gather(
+        llm_client.warm_up(),
+        asyncio.to_thread(github_api.warm_up),
+        return_exceptions=True,
+    )
+    log.debug("🔥 Clients warmed up")
+
+async def evict_finished_jobs():
+    """
+    Periodically drop finished jobs older than JOB_TTL_SECONDS and reclaim
+    workspaces over the disk quota (the first pass also registers folders
+    left on disk by earlier runs).
+    """
+    reconciled = False
+    while True:
+        try:
+            evicted = await scheduler.run_in_stage("io", job_store.evict_expired)
+            if evicted:
+                log.debug("🧹 Evicted %d finished job(s)", evicted)
+        except Exception as e:
+            log.warning("⚠️ Job eviction failed: %s", e)
         try:
-            r = await asyncio.to_thread(lambda: httpx.get(url, timeout=5))
-            if r.status_code == 200:
-                return True
-        except Exception:
-            pass
-        await asyncio.sleep(3)
-    return False
+            if not reconciled:
+                await scheduler.run_in_stage("io", workspace.reconcile)
+                reconciled = True
+            await scheduler.run_in_stage("io", workspace.enforce_quota)
+        except Exception as e:
+            log.warning("⚠️ Workspace eviction failed: %s", e)
+        await asyncio.sleep(JOB_EVICT_INTERVAL)
 
 # ---------------------------------------------------------------------
 # 1️⃣ POST /api-endpoint — receive round request
 # ---------------------------------------------------------------------
 @app.post("/api-endpoint")
 async def receive_task(request: Request):
-    data = await request.json()
+    # Without a configured secret every request would match an empty one
+    if not STUDENT_SECRET:
+        raise HTTPException(status_code=503, detail="STUDENT_SECRET is not configured")
 
-    # Validate secret
-    if data.get("secret") != STUDENT_SECRET:
-        raise HTTPException(status_code=403, detail="Invalid secret")
+    # The body is spooled and scanned, not parsed whole: the secret and routing
+    # fields are checked before any attachment data is decoded.
+    try:
+        body = await ingest.spool_body(request)
+    except ingest.RequestTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
 
-    email = data["email"]
-    task_id = data["task"]
-    round_num = int(data.get("round", 1))
+    with body:
+        try:
+            fields, attachment_specs = ingest.scan_task_body(body.buf)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Malformed JSON body: {e}")
 
-    key = f"{email}:{task_id}:{round_num}"
-    if key in ongoing_tasks and not ongoing_tasks[key].done():
-        print(f"⚠️ Round {round_num} for {task_id} already in progress.")
-        return {
-            "status": "ok",
-            "message": f"Round {round_num} already in progress.",
-            "task": task_id,
-            "round": round_num,
-        }
+        # Validate secret (before the fields, so unauthenticated callers learn nothing about them)
+        secret = fields.get("secret")
+        if not isinstance(secret, str) or not hmac.compare_digest(secret.encode(), STUDENT_SECRET.encode()):
+            raise HTTPException(status_code=403, detail="Invalid secret")
+
+        try:
+            task = TaskRequest.model_validate(fields)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_input=False))
+
+        task_id = task.task
+        round_num = task.round
+
+        key = task.key
+        in_progress = key in ongoing_tasks and not ongoing_tasks[key].done()
+        # The lease also covers the same round running in another worker process
+        if in_progress or not locks.acquire_lease(key):
+            log.warning("⚠️ Round %d for %s already in progress.", round_num, task_id, job=key)
+            return {
+                "status": "ok",
+                "message": f"Round {round_num} already in progress.",
+                "task": task_id,
+                "round": round_num,
+            }
+
+        # Attachments go straight from the spooled body into the blob store
+        try:
+            task.attachments = await scheduler.run_in_stage(
+                "io", ingest.store_attachments, body.buf, attachment_specs
+            )
+        except Exception as e:
+            locks.release_lease(key)
+            raise HTTPException(status_code=400, detail=f"Invalid attachment: {e}")
 
     # Background processing
-    ongoing_tasks[key] = asyncio.create_task(process_task(data))
-    print(f"📌 Round {round_num} for {task_id} started in background.")
+    data = task.model_dump(exclude={"secret"})
+    await scheduler.run_in_stage("io", job_store.create_job, key, data)
+    start_task(key, data)
+    log.info("📌 Round %d for %s started in background.", round_num, task_id, job=key)
 
     # Immediate 200 response
     return {
@@ -83,83 +221,223 @@ async def receive_task(request: Request):
 # ---------------------------------------------------------------------
 # 2️⃣ Core task handler
 # ---------------------------------------------------------------------
-async def process_task(data: dict):
+async def process_task(data: dict) -> dict | None:
+    """
+    Runs the pipeline for one round, checkpointing each completed stage in the
+    job store. Stages already recorded for this job (after a restart) are skipped.
+    Returns the final job record (status, artifacts, error); failures are
+    recorded there rather than raised.
+    """
+    key = task_key(data)
+    # Every log record from this task (and the stage threads it uses) carries its key
+    log.bind(job=key)
+    events.bind(key)
+    repo_folder = None
     try:
         email = data["email"]
         task_id = data["task"]
         round_num = int(data.get("round", 1))
-        nonce = data.get("nonce", str(uuid4()))
         brief = data.get("brief", "")
         evaluation_url = data["evaluation_url"]
-        attachments = data.get("attachments", [])
         checks = data.get("checks", [])
 
-        print(f"\n🚀 Processing Round {round_num} for {task_id} ({email})")
+        # SQLite can wait up to 30s on another worker's write lock, so job
+        # store calls run on the io stage, never on the event loop
+        job = await scheduler.run_in_stage("io", job_store.get_job, key)
+        if job is None:
+            job = await scheduler.run_in_stage("io", job_store.create_job, key, data)
+        artifacts = job["artifacts"]
+        trace = metrics.start_trace(key, artifacts.get("timings"))
+
+        # The nonce names the repo folder, so it must survive a restart
+        nonce = artifacts.get("nonce") or data.get("nonce") or str(uuid4())
+        if artifacts.get("workspace"):
+            repo_folder = Path(artifacts["workspace"])
+        else:
+            repo_folder = BASE_REPO_DIR / f"{task_id}_{nonce}_app"
+        attachments_dir = repo_folder / "attachments"
 
-        # Setup repo folder
-        repo_folder = BASE_REPO_DIR / f"{task_id}_{nonce}_app"
-        repo_folder.mkdir(parents=True, exist_ok=True)
+        if job["stage"] != "received" and not repo_folder.exists():
+            log.warning("⚠️ Workspace is gone; restarting from the first stage.")
+            await scheduler.run_in_stage("io", job_store.reset, key)
+            job = await scheduler.run_in_stage("io", job_store.get_job, key)
+            artifacts = job["artifacts"]
+            trace = metrics.start_trace(key)
+
+        log.info("🚀 Processing Round %d for %s (%s) from stage '%s'", round_num, task_id, email, job["stage"])
+
+        # Setup repo folder and save attachments inside a subfolder only
+        if not job_store.stage_done(job, "attachments"):
+            repo_folder = await scheduler.run_in_stage("io", workspace.allocate, key, f"{task_id}_{nonce}_app")
+            attachments_dir = repo_folder / "attachments"
+            # Round 2+: start from the code already in the repo so it can be edited
+            seeded = False
+            if round_num > 1:
+                with metrics.span("checkout"):
+                    seeded = await scheduler.run_in_stage("git", checkout_repo, task_id, repo_folder)
+            with metrics.span("attachments"):
+                attachments = await scheduler.run_in_stage(
+                    "io", ingest_attachments, data.get("attachments", []), attachments_dir
+                )
+            log.info("📎 Saved %d attachment(s) in %s", len(attachments), attachments_dir)
+            # Payloads that still carry data URLs (not ingested by /api-endpoint)
+            # are stored with blob references instead
+            stored_payload = None
+            if any(a.get("url") for a in data.get("attachments", [])):
+                stored_payload = {k: v for k, v in data.items() if k != "secret"}
+                stored_payload["attachments"] = [a.to_dict() for a in attachments]
+            job = await scheduler.run_in_stage(
+                "io", job_store.advance, key, "attachments",
+                payload=stored_payload, nonce=nonce, workspace=str(repo_folder), seeded=seeded,
+                saved_files=[str(a.path) for a in attachments],
+                attachments=[a.to_dict() for a in attachments],
+                timings=trace.timings,
+            )
+        else:
+            attachments = load_attachments(attachments_dir, job["artifacts"].get("attachments"))
+
+        # Round 1 READMEs don't depend on the generated files, so that LLM call
+        # runs concurrently with code generation instead of after it.
+        readme_task = None
+        if round_num == 1 and not job_store.stage_done(job, "readme"):
+            readme_task = asyncio.create_task(scheduler.run_async_in_stage(
+                "llm",
+                generate_readme_for_repo(
+                    brief=brief,
+                    attachments_dir=attachments_dir,
+                    round_num=round_num,
+                    checks=checks
+                )
+            ))
 
-        # Save attachments inside a subfolder only
-        attachments_dir = repo_folder / "attachments"
-        saved_files = save_attachments(attachments, attachments_dir)
-        print(f"📎 Saved {len(saved_files)} attachment(s) in {attachments_dir}")
-
-        # Generate code from LLM
-        generate_app_from_brief(brief, attachments_dir, repo_folder, round_num=round_num)
-        print("✨ LLM generation completed.")
-
-        # Write LICENSE if missing
-        license_path = repo_folder / "LICENSE"
-        if not license_path.exists():
-            license_path.write_text("MIT License\n")
-
-        # Professional README.md
-        readme_path = repo_folder / "README.md"
-        existing_readme = readme_path.read_text() if readme_path.exists() else ""
-        readme_text = generate_readme_for_repo(
-            brief=brief,
-            attachments_dir=attachments_dir,
-            round_num=round_num,
-            existing_readme=existing_readme,
-            checks=checks
-        )
-        readme_path.write_text(readme_text)
-        print("📄 README.md generated by LLM")
+        try:
+            # Generate code from LLM
+            if not job_store.stage_done(job, "generated"):
+                with metrics.span("llm_generation"):
+                    generated = await scheduler.run_async_in_stage(
+                        "llm",
+                        generate_app_from_brief(
+                            brief, attachments_dir, repo_folder, round_num=round_num, attachments=attachments
+                        )
+                    )
+                log.info("✨ LLM generation completed.")
+
+                # Write LICENSE if missing
+                license_path = repo_folder / "LICENSE"
+                if not license_path.exists():
+                    license_path.write_text("MIT License\n")
+                job = await scheduler.run_in_stage(
+                    "io", job_store.advance, key, "generated",
+                    generated_files=generated, timings=trace.timings, llm=trace.llm,
+                )
+
+            # Professional README.md
+            if not job_store.stage_done(job, "readme"):
+                readme_path = repo_folder / "README.md"
+                # For Round 1 this only times what is left of the concurrent call
+                with metrics.span("readme"):
+                    if readme_task is not None:
+                        readme_text = await readme_task
+                    else:
+                        existing_readme = readme_path.read_text() if readme_path.exists() else ""
+                        readme_text = await scheduler.run_async_in_stage(
+                            "llm",
+                            generate_readme_for_repo(
+                                brief=brief,
+                                attachments_dir=attachments_dir,
+                                round_num=round_num,
+                                existing_readme=existing_readme,
+                                checks=checks
+                            )
+                        )
+                readme_path.write_text(readme_text)
+                log.info("📄 README.md generated by LLM")
+                job = await scheduler.run_in_stage(
+                    "io", job_store.advance, key, "readme", timings=trace.timings, llm=trace.llm
+                )
+        finally:
+            if readme_task is not None and not readme_task.done():
+                readme_task.cancel()
+
+        # Check the site locally and regenerate broken files before the push
+        if VERIFY_ENABLED and not job_store.stage_done(job, "verified"):
+            with metrics.span("verify"):
+                verification = await verify_and_repair(
+                    brief, repo_folder, attachments_dir, checks=checks, round_num=round_num, attachments=attachments
+                )
+            status = "passed" if verification["ok"] else f"{len(verification['problems'])} problem(s) left"
+            log.info("🔎 Local verification %s; repaired %d file(s).", status, len(verification["repaired"]))
+            job = await scheduler.run_in_stage(
+                "io", job_store.advance, key, "verified",
+                verification=verification, timings=trace.timings, llm=trace.llm,
+            )
 
         # Push to GitHub
-        repo_name, commit_sha, pages_url = create_or_update_repo(task_id, repo_folder, round_num)
-        print(f"✅ GitHub push complete: {repo_name} @ {commit_sha}")
+        if not job_store.stage_done(job, "pushed"):
+            with metrics.span("git"):
+                repo_name, commit_sha, pages_url = await scheduler.run_in_stage(
+                    "git", create_or_update_repo, task_id, repo_folder, round_num,
+                    # Without the repo's files in the workspace, a push must not delete them
+                    seeded=job["artifacts"].get("seeded", False),
+                )
+            log.info("✅ GitHub push complete: %s @ %s", repo_name, commit_sha)
+            job = await scheduler.run_in_stage(
+                "io", job_store.advance, key, "pushed",
+                repo_name=repo_name, commit_sha=commit_sha, pages_url=pages_url,
+                timings=trace.timings,
+            )
+        repo_name = job["artifacts"]["repo_name"]
+        commit_sha = job["artifacts"]["commit_sha"]
+        pages_url = job["artifacts"]["pages_url"]
 
         # Wait for GitHub Pages to go live
-        if await wait_for_pages(pages_url):
-            print(f"🌐 GitHub Pages live at {pages_url}")
-        else:
-            print("⚠️ Pages did not go live within timeout. Continuing anyway.")
+        if not job_store.stage_done(job, "pages"):
+            with metrics.span("pages_wait"):
+                pages_live = await wait_for_pages(pages_url, repo_name, commit_sha)
+            if pages_live:
+                log.info("🌐 GitHub Pages live at %s", pages_url)
+            else:
+                log.warning("⚠️ Pages did not go live within timeout. Continuing anyway.")
+            job = await scheduler.run_in_stage(
+                "io", job_store.advance, key, "pages", pages_live=pages_live, timings=trace.timings
+            )
 
         # Notify evaluator
-        await notify_evaluation_api(
-            evaluation_url=evaluation_url,
-            email=email,
-            task_id=task_id,
-            round_num=round_num,
-            nonce=nonce,
-            repo_name=repo_name,
-            commit_sha=commit_sha,
-            pages_url=pages_url,
-        )
-
-        print(f"🏁 Round {round_num} for {task_id} completed successfully.\n")
+        if not job_store.stage_done(job, "notified"):
+            with metrics.span("notify"):
+                notify_evaluation_api(
+                    evaluation_url=evaluation_url,
+                    email=email,
+                    task_id=task_id,
+                    round_num=round_num,
+                    nonce=nonce,
+                    repo_name=repo_name,
+                    commit_sha=commit_sha,
+                    pages_url=pages_url,
+                    job_key=key,
+                )
+            job = await scheduler.run_in_stage("io", job_store.advance, key, "notified", timings=trace.timings)
+
+        await scheduler.run_in_stage("io", job_store.finish, key)
+        metrics.TASKS.inc("success")
+        log.info("🏁 Round %d for %s completed successfully.", round_num, task_id, trace=trace.summary())
 
     except Exception as e:
-        print("❌ process_task() failed:", e)
-        traceback.print_exc()
+        metrics.TASKS.inc("failure")
+        log.error("❌ process_task() failed: %s", e, exc=e)
+        await scheduler.run_in_stage("io", job_store.fail, key, log.redact(str(e)))
+    finally:
+        # Done with the workspace (or failed): record its size and let the quota reclaim it
+        if repo_folder is not None:
+            await scheduler.run_in_stage("io", workspace.release, repo_folder)
+    return await scheduler.run_in_stage("io", job_store.get_job, key)
 
 # ---------------------------------------------------------------------
 # 3️⃣ Notify evaluation API
 # ---------------------------------------------------------------------
-async def notify_evaluation_api(evaluation_url, email, task_id, round_num, nonce,
-                                repo_name, commit_sha, pages_url):
+def notify_evaluation_api(evaluation_url, email, task_id, round_num, nonce,
+                          repo_name, commit_sha, pages_url, job_key=None):
+    """Queue the evaluator POST in the durable outbox (delivered in the background)."""
     payload = {
         "email": email,
         "task": task_id,
@@ -169,30 +447,13 @@ async def notify_evaluation_api(evaluation_url, email, task_id, round_num, nonce
         "commit_sha": commit_sha,
         "pages_url": pages_url,
     }
+    outbox_id = outbox.enqueue(evaluation_url, payload, job_key=job_key)
+    log.info("📮 Notification for %s queued (outbox #%d)", task_id, outbox_id)
 
-    delay = 1
-    for attempt in range(5):
-        try:
-            print(f"📤 POST → {evaluation_url} (attempt {attempt + 1})")
-            print(json.dumps(payload, indent=2))
-
-            response = await asyncio.to_thread(
-                lambda: requests.post(evaluation_url, json=payload, timeout=15)
-            )
-
-            if response.status_code == 200:
-                print("✅ Evaluation API acknowledged successfully.")
-                return
-            else:
-                print(f"⚠️ Evaluation API returned {response.status_code}: {response.text}")
-
-        except Exception as e:
-            print(f"⚠️ Notify attempt {attempt + 1} failed:", e)
-
-        await asyncio.sleep(delay)
-        delay *= 2  # exponential backoff
-
-    print("❌ All notify attempts failed.")
+@app.get("/outbox")
+def outbox_backlog():
+    """Pending, delivered and dead evaluator notifications."""
+    return outbox.backlog()
 
 # ---------------------------------------------------------------------
 # 4️⃣ Optional: Mock evaluator (for local testing)
@@ -200,8 +461,7 @@ async def notify_evaluation_api(evaluation_url, email, task_id, round_num, nonce
 @app.post("/eval-mock")
 async def eval_mock(request: Request):
     data = await request.json()
-    print("\n🧪 Mock evaluator received:")
-    print(json.dumps(data, indent=2))
+    log.info("🧪 Mock evaluator received", payload=data)
     return {"status": "received", "round": data.get("round", "N/A")}
 
 # ---------------------------------------------------------------------
@@ -209,7 +469,150 @@ async def eval_mock(request: Request):
 # ---------------------------------------------------------------------
 @app.get("/health")
 def health():
-    return {"status": "ok", "project": "LLM Code Deployment"}
+    return {
+        "status": "ok",
+        "project": "LLM Code Deployment",
+        "stages": scheduler.stats(),
+        "llm_cache": llm_cache.stats(),
+        "pages_pending": pages_watcher.watcher.pending(),
+        "workspaces": workspace.usage(),
+    }
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text exposition of stage latencies, LLM usage and queue depths."""
+    stage_stats = scheduler.stats()
+    cache = llm_cache.stats()
+    extra = []
+    extra += metrics.gauge_lines(
+        "scheduler_stage_active", "Work items holding a stage slot.",
+        {f'{{stage="{name}"}}': s["active"] for name, s in stage_stats.items()},
+    )
+    extra += metrics.gauge_lines(
+        "scheduler_stage_waiting", "Work items queued for a stage slot.",
+        {f'{{stage="{name}"}}': s["waiting"] for name, s in stage_stats.items()},
+    )
+    extra += metrics.gauge_lines(
+        "llm_cache", "LLM response cache counters and tier sizes.",
+        {f'{{kind="{k}"}}': v for k, v in cache.items() if isinstance(v, (int, float))},
+    )
+    extra += metrics.gauge_lines(
+        "llm_limiter", "Shared LLM rate limiter state (concurrency limit, in-flight, quota left).",
+        {f'{{kind="{k}"}}': v for k, v in rate_limiter.limiter.stats().items()},
+    )
+    extra += metrics.gauge_lines("pages_pending", "Deployments being watched.", {"": pages_watcher.watcher.pending()})
+    extra += metrics.gauge_lines("outbox_pending", "Undelivered evaluator notifications.", {"": outbox.backlog(limit=0)["pending"]})
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
+
+# ---------------------------------------------------------------------
+# 6️⃣ Task status and progress stream
+# ---------------------------------------------------------------------
+def job_view(job: dict) -> dict:
+    """What clients see of a job: stage, timings, results and notification state."""
+    key = job["key"]
+    done = job_store.STAGES.index(job["stage"])
+    return {
+        "key": key,
+        "status": job["status"],
+        "stage": job["stage"],
+        "stages_completed": job_store.STAGES[:done + 1],
+        "stages_remaining": [] if job["status"] == "done" else job_store.STAGES[done + 1:],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "worker": locks.lease_holder(key),
+        "notification": outbox.for_job(key),
+        **events.public_artifacts(job["artifacts"]),
+    }
+
+def get_job_or_404(email: str, task: str, round_num: int) -> dict:
+    job = job_store.get_job(f"{email}:{task}:{round_num}")
+    if job is None:
+        raise HTTPException(status_code=404, detail="No such task round (never received, or evicted)")
+    return job
+
+@app.get("/tasks/{email}/{task}/{round_num}")
+def task_status(email: str, task: str, round_num: int):
+    """Current stage, per-stage timings and results of one round."""
+    return job_view(get_job_or_404(email, task, round_num))
+
+def sse(event: str, data: dict, event_id: int | None = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def task_events(key: str, last_id: int):
+    """
+    Yields a round's progress as server-sent events until it is done or
+    failed: a "snapshot" first (or, on reconnect, the events after
+    Last-Event-ID), then "stage", "file", "done"/"failed" as they happen.
+    Jobs running in another worker are followed by re-reading the job store.
+    """
+    with events.subscribe(key) as queue:
+        # Read the history mark before the job: anything newer comes through the queue
+        missed = events.history(key, last_id) if last_id else []
+        mark = max((r["id"] for r in events.history(key)), default=0)
+        job = await scheduler.run_in_stage("io", job_store.get_job, key)
+        if job is None:
+            return
+        if missed:
+            for record in missed:
+                yield sse(record["event"], record["data"], record["id"])
+        else:
+            yield sse("snapshot", job_view(job), mark or None)
+        sent = max(mark, last_id)
+        seen = (job["stage"], job["status"])
+        if job["status"] in ("done", "failed"):
+            if missed and missed[-1]["event"] not in ("done", "failed"):
+                yield sse(job["status"], job_view(job))
+            return
+
+        idle = 0.0
+        while True:
+            try:
+                record = await asyncio.wait_for(queue.get(), TASK_EVENTS_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                job = await scheduler.run_in_stage("io", job_store.get_job, key)
+                if job is None:
+                    yield sse("failed", {"status": "evicted"})
+                    return
+                if (job["stage"], job["status"]) != seen:
+                    seen = (job["stage"], job["status"])
+                    name = job["status"] if job["status"] in ("done", "failed") else "stage"
+                    data = {"stage": job["stage"], "status": job["status"], "error": job["error"]}
+                    yield sse(name, {**data, **events.public_artifacts(job["artifacts"])})
+                    if name != "stage":
+                        return
+                    idle = 0.0
+                else:
+                    idle += TASK_EVENTS_POLL_SECONDS
+                    if idle >= TASK_EVENTS_KEEPALIVE_SECONDS:
+                        idle = 0.0
+                        yield ": keep-alive\n\n"
+                continue
+
+            if record["id"] <= sent:
+                continue
+            sent = record["id"]
+            idle = 0.0
+            yield sse(record["event"], record["data"], record["id"])
+            if record["event"] == "stage":
+                seen = (record["data"]["stage"], record["data"]["status"])
+            elif record["event"] in ("done", "failed"):
+                return
+
+@app.get("/tasks/{email}/{task}/{round_num}/events")
+def task_event_stream(email: str, task: str, round_num: int, request: Request):
+    """Server-sent events for one round (resumable with the Last-Event-ID header)."""
+    job = get_job_or_404(email, task, round_num)
+    try:
+        last_id = int(request.headers.get("last-event-id") or 0)
+    except ValueError:
+        last_id = 0
+    return StreamingResponse(
+        task_events(job["key"], last_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/")
 def root():
@@ -1,26 +1,243 @@
-import os
+"""
+attachment_utils.py
+-------------------
+Content-addressed store for task attachments.
+
+Each data URL is base64-decoded exactly once, in fixed-size chunks, straight
+into a blob file named by its SHA-256 under ATTACHMENT_STORE_DIR. Identical
+payloads are stored once and hard-linked into every repo's attachments/
+folder. The LLM stage receives StoredAttachment records that hand out the
+original encoded data URL (no re-read, no re-encode) or a memory-mapped view
+of the decoded bytes.
+
+Data URLs can be decoded from a str or straight from a span of a bytes-like
+buffer (e.g. an mmap of the spooled request body), so a large attachment is
+never held in memory as one Python string.
+"""
+
 import base64
+import hashlib
+import mimetypes
+import mmap
+import os
+import re
+import shutil
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from urllib.parse import unquote_to_bytes
 
-def save_attachments(attachments, folder):
+from config import ATTACHMENT_STORE_DIR
+import log
+
+# Encoded characters decoded per step (multiple of 4 so chunks stay aligned)
+CHUNK_CHARS = 256 * 1024
+
+_SHA256 = re.compile(r"[0-9a-f]{64}")
+
+
+@dataclass
+class StoredAttachment:
+    name: str
+    path: Path            # file inside the repo's attachments/ folder
+    mime: str
+    size: int
+    sha256: str = ""
+    _data_url: str | None = field(default=None, repr=False)
+
+    def data_url(self) -> str:
+        """The base64 data URL; reuses the URL received in the request when available."""
+        if self._data_url is None:
+            with self.view() as buf:
+                self._data_url = f"data:{self.mime};base64,{base64.b64encode(buf).decode()}"
+        return self._data_url
+
+    def view(self) -> mmap.mmap:
+        """Read-only memory map of the decoded bytes (use as a context manager)."""
+        with open(self.path, "rb") as f:
+            if self.size == 0:
+                return _EmptyView()
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "mime": self.mime, "size": self.size, "sha256": self.sha256}
+
+
+class _EmptyView(bytes):
+    """Stand-in for mmap of an empty file (mmap cannot map zero bytes)."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def guess_mime(name: str, declared: str = "") -> str:
+    if declared and declared != "application/octet-stream":
+        return declared
+    return mimetypes.guess_type(name)[0] or declared or "application/octet-stream"
+
+
+def _parse_data_url(url, start: int = 0) -> tuple[str, bool, int]:
+    """Returns (mime, is_base64, payload_offset) for a data: URL starting at `start`."""
+    head = url[start:start + 512]
+    if not isinstance(head, str):
+        head = bytes(head).decode("latin-1")
+    comma = head.find(",")
+    if not head.startswith("data:") or comma == -1:
+        raise ValueError("Malformed data URL")
+    meta = head[5:comma].split(";")
+    is_base64 = "base64" in meta[1:]
+    return meta[0], is_base64, start + comma + 1
+
+
+def _decode_into(url, offset: int, end: int, is_base64: bool, out) -> tuple[str, int]:
     """
-    Saves attachments (base64 data URLs) into a folder.
-    Returns: list of saved file paths.
+    Decodes url[offset:end] (str or bytes-like) into `out` chunk by chunk.
+    Returns (sha256, size).
     """
-    os.makedirs(folder, exist_ok=True)
-    saved = []
+    digest = hashlib.sha256()
+    size = 0
+
+    def emit(data: bytes):
+        nonlocal size
+        digest.update(data)
+        out.write(data)
+        size += len(data)
+
+    if not is_base64:
+        emit(unquote_to_bytes(url[offset:end]))
+        return digest.hexdigest(), size
+
+    carry = url[:0]
+    for start in range(offset, end, CHUNK_CHARS):
+        piece = url[start:min(start + CHUNK_CHARS, end)]
+        chunk = carry + piece[:0].join(piece.split())
+        usable = len(chunk) - len(chunk) % 4
+        if usable:
+            emit(base64.b64decode(chunk[:usable]))
+        carry = chunk[usable:]
+    if carry:
+        pad = ("=" if isinstance(carry, str) else b"=") * (-len(carry) % 4)
+        emit(base64.b64decode(carry + pad))
+    return digest.hexdigest(), size
+
+
+def _link_or_copy(src: Path, dest: Path):
+    if dest.exists() or dest.is_symlink():
+        dest.unlink()
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+def store_data_url(url, start: int = 0, end: int | None = None) -> tuple[Path, str, str, int]:
+    """
+    Decodes a data URL into the blob store (deduplicated by content hash).
+    `url` is a str or a bytes-like buffer; start/end select the URL inside it.
+    Returns (blob_path, mime, sha256, size).
+    """
+    end = len(url) if end is None else end
+    mime, is_base64, offset = _parse_data_url(url, start)
+    ATTACHMENT_STORE_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=ATTACHMENT_STORE_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            sha, size = _decode_into(url, offset, end, is_base64, out)
+        os.chmod(tmp_name, 0o644)
+        blob = ATTACHMENT_STORE_DIR / sha
+        if blob.exists():
+            os.unlink(tmp_name)
+        else:
+            os.replace(tmp_name, blob)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+    return blob, mime, sha, size
+
+
+def blob_path(sha256: str) -> Path:
+    if not _SHA256.fullmatch(sha256):
+        raise ValueError(f"Invalid blob id: {sha256!r}")
+    return ATTACHMENT_STORE_DIR / sha256
+
+
+def ingest_attachments(attachments, folder) -> list[StoredAttachment]:
+    """
+    Links attachments into `folder`. Each entry is either a data URL
+    ({"name", "url"}), decoded into the blob store first, or a reference to a
+    blob already stored at request time ({"name", "sha256", "mime"}).
+    Returns: one StoredAttachment per saved file.
+    """
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    stored = []
 
     for att in attachments:
         name = att.get("name")
         url = att.get("url")
-        if not (name and url):
+        if not name:
             continue
 
-        if url.startswith("data:"):
-            _, encoded = url.split(",", 1)
-            data = base64.b64decode(encoded)
-            file_path = os.path.join(folder, name)
-            with open(file_path, "wb") as f:
-                f.write(data)
-            saved.append(file_path)
+        if not url and att.get("sha256"):
+            blob = blob_path(att["sha256"])
+            if not blob.exists():
+                log.warning("⚠️ Attachment blob for %s is missing; skipping it.", name)
+                continue
+            dest = folder / Path(name).name
+            _link_or_copy(blob, dest)
+            stored.append(StoredAttachment(
+                name=dest.name,
+                path=dest,
+                mime=guess_mime(dest.name, att.get("mime", "")),
+                size=blob.stat().st_size,
+                sha256=att["sha256"],
+            ))
+        elif url and url.startswith("data:"):
+            blob, mime, sha, size = store_data_url(url)
+            dest = folder / Path(name).name
+            _link_or_copy(blob, dest)
+            stored.append(StoredAttachment(
+                name=dest.name,
+                path=dest,
+                mime=guess_mime(dest.name, mime),
+                size=size,
+                sha256=sha,
+                _data_url=url,
+            ))
+
+    return stored
+
+
+def load_attachments(folder, records: list[dict] | None = None) -> list[StoredAttachment]:
+    """
+    Rebuilds StoredAttachment records for files already in `folder`
+    (e.g. when a job resumes after a restart). `records` are to_dict() outputs.
+    """
+    folder = Path(folder)
+    known = {r["name"]: r for r in records or []}
+    loaded = []
+    if folder.exists():
+        for f in sorted(folder.iterdir()):
+            if not f.is_file():
+                continue
+            r = known.get(f.name, {})
+            loaded.append(StoredAttachment(
+                name=f.name,
+                path=f,
+                mime=r.get("mime") or guess_mime(f.name),
+                size=f.stat().st_size,
+                sha256=r.get("sha256", ""),
+            ))
+    return loaded
+
 
-    return saved
+def save_attachments(attachments, folder):
+    """
+    Saves attachments (base64 data URLs) into a folder.
+    Returns: list of saved file paths.
+    """
+    return [str(a.path) for a in ingest_attachments(attachments, folder)]
@@ -0,0 +1,227 @@
+"""
+batch.py
+--------
+Offline bulk runner: replays a JSONL file of task payloads (the /api-endpoint
+body format, one per line) through the same process_task pipeline the server
+uses, without going through HTTP.
+
+    python batch.py cohort.jsonl --workers 8 --results results.jsonl
+    python batch.py cohort.jsonl --workers 8 --results results.jsonl --resume
+
+- The input is streamed; at most --workers tasks are in flight. Rounds of
+  the same email/task run in file order, each after the previous one ends.
+- All tasks share this process's LLM rate limiter, stage executors and
+  GitHub/OpenAI connection pools, exactly as requests to one server do.
+- Every task is checkpointed stage by stage in the job store and gets one
+  line in --results (status, repo, commit SHA, Pages URL, per-stage timings).
+  With --resume, tasks already recorded as done are skipped and interrupted
+  or failed ones continue from their last completed stage.
+- A task whose lease another worker (e.g. the running server) holds is
+  reported as "busy" and left alone.
+- Evaluator notifications go through the durable outbox; whatever is not
+  delivered within --notify-timeout is delivered later by the server.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Iterator
+
+from pydantic import ValidationError
+
+from models import TaskRequest
+from outbox import outbox
+import app
+import job_store
+import llm_client
+import locks
+import log
+import pages_watcher
+import scheduler
+import workspace
+
+
+def read_tasks(path: str) -> Iterator[tuple[int, dict | None, str | None]]:
+    """Yields (line number, payload, error) for each non-blank line of a JSONL file ("-" = stdin)."""
+    source = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        for number, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            try:
+                payload = json.loads(line)
+                if not isinstance(payload, dict):
+                    raise ValueError("not a JSON object")
+                # Attachments may still be data URLs here; process_task stores them.
+                # Offline input is trusted, so it needs no secret.
+                TaskRequest.model_validate(
+                    {"secret": "", **{k: v for k, v in payload.items() if k != "attachments"}}
+                )
+            except (ValueError, ValidationError) as e:
+                yield number, None, str(e).splitlines()[0]
+                continue
+            yield number, payload, None
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+
+def load_done(results_path: Path) -> set:
+    """Keys recorded as done, and line numbers recorded as rejected, in an earlier run's results file."""
+    done = set()
+    if results_path.exists():
+        for line in results_path.read_text(encoding="utf-8").splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut off by the interruption
+            if record.get("status") == "done":
+                done.add(record["key"])
+            elif record.get("status") == "rejected":
+                done.add(record["line"])
+    return done
+
+
+def result_record(key: str, line: int, job: dict | None, elapsed: float, status: str | None = None,
+                  error: str | None = None) -> dict:
+    artifacts = (job or {}).get("artifacts", {})
+    return {
+        "key": key,
+        "line": line,
+        "status": status or (job or {}).get("status", "failed"),
+        "stage": (job or {}).get("stage"),
+        "repo_name": artifacts.get("repo_name"),
+        "commit_sha": artifacts.get("commit_sha"),
+        "pages_url": artifacts.get("pages_url"),
+        "pages_live": artifacts.get("pages_live"),
+        "timings": artifacts.get("timings", {}),
+        "seconds": round(elapsed, 3),
+        "error": error or (job or {}).get("error"),
+    }
+
+
+class BatchRunner:
+    def __init__(self, results_path: Path, workers: int, resume: bool):
+        self.results = open(results_path, "a" if resume else "w", encoding="utf-8")
+        self.slots = asyncio.Semaphore(workers)
+        self.resume = resume
+        self.skip = load_done(results_path) if resume else set()
+        # (email, task) -> the latest round scheduled for it
+        self.chains: dict[tuple[str, str], asyncio.Task] = {}
+        self.counts: dict[str, int] = {}
+
+    def write(self, record: dict):
+        self.results.write(json.dumps(record) + "\n")
+        self.results.flush()
+        self.counts[record["status"]] = self.counts.get(record["status"], 0) + 1
+
+    async def run_one(self, line: int, data: dict, after: asyncio.Task | None):
+        try:
+            key = app.task_key(data)
+            if after is not None:
+                # Round N+1 edits what round N pushed
+                await asyncio.gather(after, return_exceptions=True)
+            start = time.monotonic()
+            if not locks.acquire_lease(key):
+                self.write(result_record(key, line, None, 0, status="busy",
+                                         error=f"lease held by {locks.lease_holder(key)}"))
+                return
+            job = job_store.get_job(key)
+            if job is not None and self.resume and job["status"] == "done":
+                # Finished before the interruption, but its result line was not written
+                locks.release_lease(key)
+                self.write(result_record(key, line, job, 0))
+                return
+            # On resume, unfinished and failed jobs continue from their last completed stage
+            if job is None or not self.resume:
+                job_store.create_job(key, data)
+            job = await app.run_with_lease(key, data)
+            self.write(result_record(key, line, job, time.monotonic() - start))
+            await scheduler.run_in_stage("io", workspace.enforce_quota)
+        except Exception as e:
+            self.write(result_record(app.task_key(data), line, None, 0, status="failed", error=str(e)))
+        finally:
+            self.slots.release()
+
+    async def run(self, path: str):
+        running: set[asyncio.Task] = set()
+        for line, payload, error in read_tasks(path):
+            if payload is None:
+                if line in self.skip:
+                    continue
+                self.write({"key": None, "line": line, "status": "rejected", "error": error})
+                continue
+            key = app.task_key(payload)
+            if key in self.skip:
+                self.counts["skipped"] = self.counts.get("skipped", 0) + 1
+                continue
+            data = {k: v for k, v in payload.items() if k != "secret"}
+            await self.slots.acquire()
+            chain = (payload["email"], payload["task"])
+            task = asyncio.create_task(self.run_one(line, data, self.chains.get(chain)))
+            self.chains[chain] = task
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda t, c=chain: self.chains.pop(c) if self.chains.get(c) is t else None)
+        if running:
+            await asyncio.gather(*running)
+
+    def close(self):
+        self.results.close()
+
+
+async def drain_outbox(timeout: float):
+    """Give queued evaluator notifications up to `timeout` seconds to be delivered."""
+    deadline = time.monotonic() + timeout
+    while outbox.backlog()["pending"] and time.monotonic() < deadline:
+        await asyncio.sleep(0.5)
+    pending = outbox.backlog()["pending"]
+    if pending:
+        log.info("📮 %d notification(s) still queued; the server's outbox will deliver them.", pending)
+
+
+async def main_async(args) -> dict:
+    outbox.start()
+    runner = BatchRunner(args.results, args.workers, args.resume)
+    started = time.monotonic()
+    try:
+        await runner.run(args.tasks)
+        await drain_outbox(args.notify_timeout)
+    finally:
+        runner.close()
+        await llm_client.aclose()
+        await pages_watcher.watcher.aclose()
+        await outbox.aclose()
+        scheduler.shutdown()
+    log.flush()
+    summary = ", ".join(f"{n} {status}" for status, n in sorted(runner.counts.items())) or "nothing to do"
+    print(f"📦 Batch finished in {time.monotonic() - started:.1f}s: {summary} (results: {args.results})")
+    return runner.counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("tasks", help="JSONL file of task payloads, or - for stdin")
+    parser.add_argument("--results", type=Path, default=Path("results.jsonl"), help="results JSONL (one line per task)")
+    parser.add_argument("--workers", type=int, default=4, help="tasks processed at the same time")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip tasks already done in --results and continue interrupted ones")
+    parser.add_argument("--notify-timeout", type=float, default=30,
+                        help="seconds to wait at the end for evaluator notifications")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    try:
+        counts = asyncio.run(main_async(args))
+    except KeyboardInterrupt:
+        print("⏸️ Interrupted; rerun with --resume to continue from the checkpoints.")
+        sys.exit(130)
+    failed = sum(n for status, n in counts.items() if status not in ("done", "skipped"))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
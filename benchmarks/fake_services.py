@@ -0,0 +1,363 @@
+"""
+fake_services.py
+----------------
+Offline stand-ins for every external service the pipeline talks to, served
+by one FastAPI app so a benchmark never touches the network:
+
+- /v1/chat/completions    OpenAI-compatible chat API (streaming and not) with
+                          configurable time-to-first-token, token rate and
+                          output size; answers plan / file / files / edits /
+                          README prompts and honours max_tokens; with
+                          --llm-rpm it enforces a requests-per-minute quota
+                          (429 + x-ratelimit-* headers, like the real API);
+                          --llm-slow-rate stalls a fraction of requests
+- /github/...             the GitHub REST calls the publisher and Pages
+                          watcher make, backed by real bare repos under
+                          <root>/remotes (Git Data API via git plumbing)
+- /pages/{repo}/          the Pages site; 200 once a push is PAGES_DELAY old
+- /eval, /eval/received   stub evaluator that records every notification
+
+Point the app at it with OPENAI_BASE_URL, GITHUB_API_URL,
+GIT_REMOTE_URL_TEMPLATE and PAGES_URL_TEMPLATE (run_bench.py does this).
+
+    python benchmarks/fake_services.py --port 9100 --root /tmp/bench
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse, HTMLResponse
+
+# Tunables; set from the command line in main()
+SETTINGS = {
+    "root": Path(tempfile.gettempdir()) / "llm-bench",
+    "llm_latency": 0.5,      # seconds before the first token
+    "llm_tps": 400.0,        # completion tokens per second (0 = instant)
+    "llm_file_kb": 2,        # size of the generated index.html (fits one 2500-token completion)
+    "llm_rpm": 0,            # requests per minute before answering 429 (0 = unlimited)
+    "llm_slow_rate": 0.0,    # fraction of LLM requests that stall (tail latency)
+    "llm_slow_latency": 10.0,  # extra seconds a stalled request waits
+    "pages_delay": 1.0,      # seconds from push until the site is live
+    "eval_fail_rate": 0.0,   # fraction of evaluator POSTs answered with 503
+}
+
+app = FastAPI(title="Offline benchmark services")
+
+_lock = threading.Lock()
+_deploys: dict[str, tuple[str, float]] = {}  # repo -> (head sha, first seen)
+_received: list[dict] = []
+_llm_calls: list[float] = []  # request times within the last minute
+
+
+# ---------------------------------------------------------------------
+# Fake OpenAI
+# ---------------------------------------------------------------------
+def _fake_files(prompt: str) -> list[dict]:
+    tag = hashlib.sha1(prompt.encode()).hexdigest()[:12]
+    filler = "".join(f"<p>Section {i} of {tag}</p>\n" for i in range(SETTINGS["llm_file_kb"] * 40))
+    # Elements for every #id the brief asks for, as a real model would add
+    ids = sorted(set(re.findall(r"(?:(?<![\w&])#|\bwith id |id ')([A-Za-z][\w-]*)", prompt)) - {"title"})
+    elements = "".join(f'<div id="{i}"></div>\n' for i in ids)
+    html = (
+        f"<!DOCTYPE html>\n<html>\n<head><title>{tag}</title>"
+        '<link rel="stylesheet" href="style.css"></head>\n'
+        f'<body>\n<h1 id="title">{tag}</h1>\n{elements}{filler}<script src="app.js"></script>\n</body>\n</html>\n'
+    )
+    return [
+        {"path": "index.html", "content": html},
+        {"path": "style.css", "content": "body { font-family: sans-serif; }\n"},
+        {"path": "app.js", "content": f'document.getElementById("title").dataset.build = "{tag}";\n'},
+    ]
+
+
+def _fake_reply(prompt: str) -> str:
+    if "Do NOT write any code yet" in prompt:
+        return json.dumps({
+            "files": [
+                {"path": f["path"], "purpose": "fixture", "interfaces": "#title, app.js sets data-build"}
+                for f in _fake_files(prompt)
+            ],
+            "notes": "vanilla JS, no build step",
+        })
+    if "Write the complete content of `" in prompt:
+        path = prompt.split("Write the complete content of `", 1)[1].split("`", 1)[0]
+        brief = prompt.split("Project plan", 1)[0]
+        return next((f["content"] for f in _fake_files(brief) if f["path"] == path), f"/* {path} */\n")
+    if "Local verification of the generated site found these problems" in prompt:
+        problems = prompt.split("found these problems", 1)[1].split("Current repository files", 1)[0]
+        return json.dumps([f for f in _fake_files(prompt) if f"- {f['path']}:" in problems])
+    if "one edit per file" in prompt:
+        # A small, realistic Round 2 change: rewrite the script only
+        return json.dumps([_fake_files(prompt)[2]])
+    if "JSON array of files" in prompt:
+        files = _fake_files(prompt)
+        skip = prompt.split("do NOT include them again:")[-1] if "do NOT include" in prompt else ""
+        return json.dumps([f for f in files if f["path"] not in skip])
+    return "# Generated App\n\nA benchmark fixture README.\n\n## License\n\nMIT\n"
+
+
+def _usage(prompt: str, text: str) -> dict:
+    p, c = len(prompt) // 4, len(text) // 4
+    return {"prompt_tokens": p, "completion_tokens": c, "total_tokens": p + c}
+
+
+def _quota_headers() -> tuple[dict, bool]:
+    """x-ratelimit-* headers for one more request, and whether it fits the RPM quota."""
+    rpm = SETTINGS["llm_rpm"]
+    if not rpm:
+        return {}, True
+    now = time.time()
+    with _lock:
+        while _llm_calls and _llm_calls[0] <= now - 60:
+            _llm_calls.pop(0)
+        allowed = len(_llm_calls) < rpm
+        if allowed:
+            _llm_calls.append(now)
+        reset = 60 - (now - _llm_calls[0]) if _llm_calls else 0
+        remaining = rpm - len(_llm_calls)
+    headers = {
+        "x-ratelimit-limit-requests": str(rpm),
+        "x-ratelimit-remaining-requests": str(remaining),
+        "x-ratelimit-reset-requests": f"{reset:.3f}s",
+    }
+    if not allowed:
+        headers["retry-after"] = f"{max(reset, 0.001):.3f}"
+    return headers, allowed
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    headers, allowed = _quota_headers()
+    if not allowed:
+        return JSONResponse(
+            {"error": {"message": "Rate limit reached for requests", "type": "requests", "code": "rate_limit_exceeded"}},
+            status_code=429, headers=headers,
+        )
+    prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+    text = _fake_reply(prompt)
+    finish_reason = "stop"
+    max_chars = 4 * (body.get("max_tokens") or 1 << 30)
+    if len(text) > max_chars:
+        text, finish_reason = text[:max_chars], "length"
+    created = int(time.time())
+    base = {"id": "chatcmpl-bench", "created": created, "model": body.get("model", "fake")}
+    stall = SETTINGS["llm_slow_latency"] if random.random() < SETTINGS["llm_slow_rate"] else 0
+    await asyncio.sleep(SETTINGS["llm_latency"] + stall)
+
+    if not body.get("stream"):
+        if SETTINGS["llm_tps"]:
+            await asyncio.sleep(len(text) / 4 / SETTINGS["llm_tps"])
+        return JSONResponse({
+            **base, "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": finish_reason}],
+            "usage": _usage(prompt, text),
+        }, headers=headers)
+
+    async def events():
+        chunk_chars = 64
+        for i in range(0, len(text), chunk_chars):
+            piece = text[i:i + chunk_chars]
+            if SETTINGS["llm_tps"]:
+                await asyncio.sleep(len(piece) / 4 / SETTINGS["llm_tps"])
+            yield "data: " + json.dumps({
+                **base, "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }) + "\n\n"
+        yield "data: " + json.dumps({
+            **base, "object": "chat.completion.chunk",
+            "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}],
+        }) + "\n\n"
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield "data: " + json.dumps({
+                **base, "object": "chat.completion.chunk", "choices": [], "usage": _usage(prompt, text),
+            }) + "\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+
+# ---------------------------------------------------------------------
+# Fake GitHub (REST + Git Data API over local bare repos)
+# ---------------------------------------------------------------------
+def _remote(repo: str) -> Path:
+    return SETTINGS["root"] / "remotes" / f"{repo}.git"
+
+
+def _git(repo: str, *args, input: bytes | None = None, env: dict | None = None) -> str:
+    result = subprocess.run(
+        ["git", *args], cwd=_remote(repo), input=input, capture_output=True,
+        env={**os.environ, **(env or {})},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode())
+    return result.stdout.decode().strip()
+
+
+_AUTHOR = {
+    "GIT_AUTHOR_NAME": "bench", "GIT_AUTHOR_EMAIL": "bench@localhost",
+    "GIT_COMMITTER_NAME": "bench", "GIT_COMMITTER_EMAIL": "bench@localhost",
+}
+
+
+def _head(repo: str) -> str | None:
+    try:
+        return _git(repo, "rev-parse", "refs/heads/main")
+    except RuntimeError:
+        return None
+
+
+@app.post("/github/user/repos")
+def create_repo(body: dict):
+    repo = body["name"]
+    path = _remote(repo)
+    if path.exists():
+        return JSONResponse({"message": "name already exists on this account"}, status_code=422)
+    path.mkdir(parents=True)
+    _git(repo, "init", "--bare", "-q", "-b", "main")
+    if body.get("auto_init"):
+        blob = _git(repo, "hash-object", "-w", "--stdin", input=f"# {repo}\n".encode())
+        tree = _git(repo, "mktree", input=f"100644 blob {blob}\tREADME.md\n".encode())
+        commit = _git(repo, "commit-tree", tree, "-m", "Initial commit", env=_AUTHOR)
+        _git(repo, "update-ref", "refs/heads/main", commit)
+    return JSONResponse({"name": repo, "default_branch": "main"}, status_code=201)
+
+
+@app.get("/github/repos/{owner}/{repo}")
+def get_repo(owner: str, repo: str):
+    if not _remote(repo).exists():
+        return JSONResponse({"message": "Not Found"}, status_code=404)
+    return {"name": repo, "default_branch": "main"}
+
+
+@app.get("/github/repos/{owner}/{repo}/git/ref/heads/{branch}")
+def get_ref(owner: str, repo: str, branch: str):
+    return {"ref": f"refs/heads/{branch}", "object": {"sha": _git(repo, "rev-parse", f"refs/heads/{branch}")}}
+
+
+@app.post("/github/repos/{owner}/{repo}/git/blobs")
+def create_blob(owner: str, repo: str, body: dict):
+    data = base64.b64decode(body["content"]) if body.get("encoding") == "base64" else body["content"].encode()
+    return JSONResponse({"sha": _git(repo, "hash-object", "-w", "--stdin", input=data)}, status_code=201)
+
+
+@app.post("/github/repos/{owner}/{repo}/git/trees")
+def create_tree(owner: str, repo: str, body: dict):
+    lines = []
+    for entry in body["tree"]:
+        sha = entry.get("sha") or _git(repo, "hash-object", "-w", "--stdin", input=entry["content"].encode())
+        lines.append(f"{entry['mode']} {sha}\t{entry['path']}\n")
+    # A throwaway index turns flat paths into nested trees
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {"GIT_INDEX_FILE": str(Path(tmp) / "index")}
+        _git(repo, "update-index", "--index-info", input="".join(lines).encode(), env=env)
+        tree = _git(repo, "write-tree", env=env)
+    return JSONResponse({"sha": tree}, status_code=201)
+
+
+@app.post("/github/repos/{owner}/{repo}/git/commits")
+def create_commit(owner: str, repo: str, body: dict):
+    args = ["commit-tree", body["tree"], "-m", body["message"]]
+    for parent in body.get("parents", []):
+        args += ["-p", parent]
+    return JSONResponse({"sha": _git(repo, *args, env=_AUTHOR)}, status_code=201)
+
+
+@app.patch("/github/repos/{owner}/{repo}/git/refs/heads/{branch}")
+def update_ref(owner: str, repo: str, branch: str, body: dict):
+    _git(repo, "update-ref", f"refs/heads/{branch}", body["sha"])
+    return {"ref": f"refs/heads/{branch}", "object": {"sha": body["sha"]}}
+
+
+@app.post("/github/repos/{owner}/{repo}/pages")
+def enable_pages(owner: str, repo: str):
+    return JSONResponse({"status": "building"}, status_code=201)
+
+
+def _deployed(repo: str) -> tuple[str | None, bool]:
+    """Head of main and whether it has been "deployed" for PAGES_DELAY seconds."""
+    head = _head(repo)
+    if head is None:
+        return None, False
+    now = time.time()
+    with _lock:
+        sha, seen = _deploys.get(repo, (None, 0.0))
+        if sha != head:
+            _deploys[repo] = (head, now)
+            seen = now
+    return head, now - seen >= SETTINGS["pages_delay"]
+
+
+@app.get("/github/repos/{owner}/{repo}/pages/builds/latest")
+def latest_build(owner: str, repo: str):
+    head, live = _deployed(repo)
+    if head is None:
+        return JSONResponse({"message": "Not Found"}, status_code=404)
+    return {"status": "built" if live else "building", "commit": head}
+
+
+@app.get("/pages/{repo}/")
+def pages_site(repo: str):
+    head, live = _deployed(repo)
+    if not live:
+        return HTMLResponse("Not Found", status_code=404)
+    return HTMLResponse(_git(repo, "show", "refs/heads/main:index.html"))
+
+
+# ---------------------------------------------------------------------
+# Stub evaluator
+# ---------------------------------------------------------------------
+@app.post("/eval")
+async def evaluate(request: Request):
+    data = await request.json()
+    if random.random() < SETTINGS["eval_fail_rate"]:
+        return JSONResponse({"status": "unavailable"}, status_code=503)
+    with _lock:
+        _received.append({
+            "key": f"{data.get('email')}:{data.get('task')}:{int(data.get('round', 1))}",
+            "commit_sha": data.get("commit_sha"),
+            "received_at": time.time(),
+        })
+    return {"status": "received"}
+
+
+@app.get("/eval/received")
+def received(since: int = 0):
+    with _lock:
+        return {"count": len(_received), "items": _received[since:]}
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--root", type=Path, default=SETTINGS["root"])
+    parser.add_argument("--llm-latency", type=float, default=SETTINGS["llm_latency"])
+    parser.add_argument("--llm-tps", type=float, default=SETTINGS["llm_tps"])
+    parser.add_argument("--llm-file-kb", type=int, default=SETTINGS["llm_file_kb"])
+    parser.add_argument("--llm-rpm", type=int, default=SETTINGS["llm_rpm"])
+    parser.add_argument("--llm-slow-rate", type=float, default=SETTINGS["llm_slow_rate"])
+    parser.add_argument("--llm-slow-latency", type=float, default=SETTINGS["llm_slow_latency"])
+    parser.add_argument("--pages-delay", type=float, default=SETTINGS["pages_delay"])
+    parser.add_argument("--eval-fail-rate", type=float, default=SETTINGS["eval_fail_rate"])
+    args = parser.parse_args()
+    SETTINGS.update({k: v for k, v in vars(args).items() if k != "port"})
+    (SETTINGS["root"] / "remotes").mkdir(parents=True, exist_ok=True)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+loadgen.py
+----------
+Replays task payloads (one JSON object per line, the body POSTed to
+/api-endpoint) against a running app at a controlled rate, waits for the
+stub evaluator to receive every notification and reports:
+
+- throughput (completed tasks per second of wall-clock time)
+- end-to-end latency p50/p99 (request sent -> evaluator notified)
+- per-stage p50/p99 from the app's /metrics histograms
+- LLM tokens, retries and 429s, and the app's peak RSS
+
+Round 2+ payloads are held back until the evaluator has seen the previous
+round of the same task, as the real evaluator would.
+
+    python benchmarks/loadgen.py --target http://127.0.0.1:8000 \\
+        --services http://127.0.0.1:9100 --tasks benchmarks/tasks.jsonl --rate 2 --repeat 20
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from pathlib import Path
+
+import httpx
+
+
+def load_payloads(path: Path, repeat: int = 1) -> list[dict]:
+    """Payloads from a JSONL file, duplicated `repeat` times under distinct task ids."""
+    base = [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+    payloads = []
+    for i in range(repeat):
+        for p in base:
+            p = dict(p)
+            if repeat > 1:
+                p["task"] = f"{p['task']}-{i}"
+            payloads.append(p)
+    # Keep each task's rounds in order, interleaving tasks
+    return sorted(payloads, key=lambda p: int(p.get("round", 1)))
+
+
+def task_key(p: dict) -> str:
+    return f"{p['email']}:{p['task']}:{int(p.get('round', 1))}"
+
+
+# ---------------------------------------------------------------------
+# /metrics parsing
+# ---------------------------------------------------------------------
+_SAMPLE = re.compile(r'^(\w+)(?:\{(.*)\})?\s+(\S+)$')
+
+
+def parse_metrics(text: str) -> list[tuple[str, dict, float]]:
+    samples = []
+    for line in text.splitlines():
+        m = _SAMPLE.match(line)
+        if not m or line.startswith("#"):
+            continue
+        labels = dict(re.findall(r'(\w+)="([^"]*)"', m.group(2) or ""))
+        samples.append((m.group(1), labels, float(m.group(3))))
+    return samples
+
+
+def histogram_quantile(q: float, buckets: list[tuple[float, float]]) -> float | None:
+    """Prometheus-style quantile from cumulative (upper bound, count) buckets."""
+    buckets = sorted(buckets)
+    if not buckets or buckets[-1][1] == 0:
+        return None
+    rank = q * buckets[-1][1]
+    prev_bound, prev_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if bound == float("inf"):
+                return prev_bound
+            if count == prev_count:
+                return bound
+            return prev_bound + (bound - prev_bound) * (rank - prev_count) / (count - prev_count)
+        prev_bound, prev_count = bound, count
+    return prev_bound
+
+
+def stage_quantiles(samples) -> dict:
+    buckets: dict[str, list] = {}
+    for name, labels, value in samples:
+        if name == "pipeline_stage_duration_seconds_bucket":
+            buckets.setdefault(labels["stage"], []).append((float(labels["le"]), value))
+    return {
+        stage: {
+            "count": int(max(c for _, c in b)),
+            "p50": histogram_quantile(0.5, b),
+            "p99": histogram_quantile(0.99, b),
+        }
+        for stage, b in buckets.items()
+    }
+
+
+def _percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+# ---------------------------------------------------------------------
+# Load generation
+# ---------------------------------------------------------------------
+async def run_load(
+    target: str,
+    services: str,
+    payloads: list[dict],
+    rate: float,
+    secret: str,
+    poisson: bool = False,
+    timeout: float = 600
+) -> dict:
+    sent_at: dict[str, float] = {}
+    done_at: dict[str, float] = {}
+    rejected: list[str] = []
+    skipped: list[str] = []  # later rounds whose previous round never completed
+    deadline = time.time() + timeout
+    evaluation_url = f"{services}/eval"
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        seen = (await client.get(f"{services}/eval/received")).json()["count"]
+
+        async def poll_evaluator():
+            nonlocal seen
+            while True:
+                r = (await client.get(f"{services}/eval/received", params={"since": seen})).json()
+                for item in r["items"]:
+                    done_at.setdefault(item["key"], item["received_at"])
+                seen += len(r["items"])
+                await asyncio.sleep(0.2)
+
+        async def send(p: dict):
+            key = task_key(p)
+            round_num = int(p.get("round", 1))
+            previous = f"{p['email']}:{p['task']}:{round_num - 1}"
+            while round_num > 1 and previous not in done_at:
+                if previous in rejected or previous in skipped or time.time() > deadline:
+                    skipped.append(key)
+                    return
+                await asyncio.sleep(0.1)
+            body = {**p, "secret": secret, "evaluation_url": evaluation_url}
+            sent_at[key] = time.time()
+            r = await client.post(f"{target}/api-endpoint", json=body)
+            if r.status_code != 200:
+                rejected.append(key)
+
+        poller = asyncio.create_task(poll_evaluator())
+        started = time.time()
+        senders = []
+        for p in payloads:
+            senders.append(asyncio.create_task(send(p)))
+            if rate > 0:
+                await asyncio.sleep(random.expovariate(rate) if poisson else 1 / rate)
+        await asyncio.gather(*senders)
+
+        expected = {task_key(p) for p in payloads} - set(rejected) - set(skipped)
+        while not expected <= done_at.keys() and time.time() < deadline:
+            await asyncio.sleep(0.2)
+        poller.cancel()
+        metrics_text = (await client.get(f"{target}/metrics")).text
+
+    completed = [k for k in expected if k in done_at]
+    elapsed = (max(done_at[k] for k in completed) - started) if completed else 0.0
+    latencies = [done_at[k] - sent_at[k] for k in completed]
+    samples = parse_metrics(metrics_text)
+    return {
+        "sent": len(payloads),
+        "rejected": len(rejected),
+        "completed": len(completed),
+        "timed_out": len(expected) - len(completed) + len(skipped),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_second": round(len(completed) / elapsed, 3) if elapsed else 0.0,
+        "end_to_end": {"p50": _percentile(latencies, 0.5), "p99": _percentile(latencies, 0.99)},
+        "stages": stage_quantiles(samples),
+        "llm_tokens": {
+            f"{labels['call']}/{labels['kind']}": int(v)
+            for name, labels, v in samples if name == "llm_tokens_total"
+        },
+        "llm_rate_limited": int(sum(v for name, _, v in samples if name == "llm_rate_limited_total")),
+        "llm_retries": int(sum(v for name, _, v in samples if name == "llm_retries_total")),
+        "llm_hedges": int(sum(v for name, _, v in samples if name == "llm_hedges_total")),
+        "peak_rss_mb": next(
+            (round(v / 2 ** 20, 1) for name, _, v in samples if name == "process_peak_rss_bytes"), None
+        ),
+    }
+
+
+def format_report(report: dict) -> str:
+    def s(v):
+        return "-" if v is None else f"{v:.3f}s"
+
+    lines = [
+        f"Tasks: {report['completed']}/{report['sent']} completed "
+        f"({report['rejected']} rejected, {report['timed_out']} timed out)",
+        f"Throughput: {report['throughput_per_second']} tasks/s over {report['elapsed_seconds']}s",
+        f"End-to-end: p50 {s(report['end_to_end']['p50'])}  p99 {s(report['end_to_end']['p99'])}",
+        f"Peak RSS (app): {report['peak_rss_mb']} MB",
+        f"LLM: {report['llm_retries']} retries, {report['llm_rate_limited']} rate limited (429), "
+        f"{report['llm_hedges']} hedged",
+        "",
+        f"{'stage':<16}{'count':>7}{'p50':>11}{'p99':>11}",
+    ]
+    for stage, q in sorted(report["stages"].items()):
+        lines.append(f"{stage:<16}{q['count']:>7}{s(q['p50']):>11}{s(q['p99']):>11}")
+    if report["llm_tokens"]:
+        lines += ["", "LLM tokens: " + ", ".join(f"{k}={v}" for k, v in sorted(report["llm_tokens"].items()))]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="http://127.0.0.1:8000", help="app base URL")
+    parser.add_argument("--services", default="http://127.0.0.1:9100", help="fake_services base URL")
+    parser.add_argument("--tasks", type=Path, default=Path(__file__).with_name("tasks.jsonl"))
+    parser.add_argument("--repeat", type=int, default=1, help="replay the file N times with distinct task ids")
+    parser.add_argument("--rate", type=float, default=1.0, help="requests per second (0 = all at once)")
+    parser.add_argument("--poisson", action="store_true", help="exponential inter-arrival times")
+    parser.add_argument("--secret", default="bench-secret")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--json", type=Path, help="also write the report here")
+    args = parser.parse_args()
+
+    payloads = load_payloads(args.tasks, args.repeat)
+    report = asyncio.run(run_load(
+        args.target, args.services, payloads, args.rate, args.secret, args.poisson, args.timeout
+    ))
+    print(format_report(report))
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
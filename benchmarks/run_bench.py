@@ -0,0 +1,147 @@
+"""
+run_bench.py
+------------
+One-command offline benchmark: starts fake_services.py and the app (uvicorn)
+in a scratch directory with every external endpoint pointed at the stubs,
+replays the task file through loadgen.py and prints the report.
+
+    python benchmarks/run_bench.py --repeat 20 --rate 4
+    python benchmarks/run_bench.py --llm-latency 2 --env LLM_STREAMING=false --json out.json
+
+Anything passed with --env is set in the app's environment, so a change can
+be measured with and without its config switch.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from loadgen import load_payloads, run_load, format_report
+
+ROOT = Path(__file__).resolve().parent.parent
+SECRET = "bench-secret"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {proc.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def app_env(workdir: Path, services: str, overrides: dict) -> dict:
+    env = {
+        **os.environ,
+        "STUDENT_SECRET": SECRET,
+        "GITHUB_USERNAME": "bench",
+        "GITHUB_TOKEN": "bench-token",
+        "OPENAI_API_KEY": "bench-key",
+        "OPENAI_BASE_URL": f"{services}/v1",
+        "GITHUB_API_URL": f"{services}/github",
+        "GIT_REMOTE_URL_TEMPLATE": f"file://{workdir / 'remotes'}/{{repo}}.git",
+        "PAGES_URL_TEMPLATE": f"{services}/pages/{{repo}}/",
+        "BASE_REPO_DIR": str(workdir / "repos"),
+        "PAGES_POLL_MIN": "0.25",
+        "PAGES_POLL_MAX": "2",
+        "DEBUG_MODE": "false",
+        "PYTHONUNBUFFERED": "1",
+    }
+    env.update(overrides)
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=Path, default=Path(__file__).with_name("tasks.jsonl"))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--rate", type=float, default=2.0, help="requests per second (0 = all at once)")
+    parser.add_argument("--poisson", action="store_true")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-tps", type=float, default=400)
+    parser.add_argument("--llm-file-kb", type=int, default=2)
+    parser.add_argument("--llm-rpm", type=int, default=0, help="fake OpenAI requests-per-minute quota (0 = none)")
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0, help="fraction of LLM requests that stall")
+    parser.add_argument("--llm-slow-latency", type=float, default=10.0, help="seconds a stalled LLM request adds")
+    parser.add_argument("--pages-delay", type=float, default=1.0)
+    parser.add_argument("--eval-fail-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="uvicorn worker processes (per-stage numbers then cover one worker)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="app environment override")
+    parser.add_argument("--workdir", type=Path, help="keep repos/remotes/logs here instead of a temp dir")
+    parser.add_argument("--json", type=Path, help="also write the report here")
+    args = parser.parse_args()
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="llm-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    overrides = dict(kv.split("=", 1) for kv in args.env)
+    services_port, app_port = _free_port(), _free_port()
+    services = f"http://127.0.0.1:{services_port}"
+    target = f"http://127.0.0.1:{app_port}"
+
+    procs = []
+    try:
+        with open(workdir / "services.log", "w") as log:
+            procs.append(subprocess.Popen([
+                sys.executable, str(Path(__file__).with_name("fake_services.py")),
+                "--port", str(services_port), "--root", str(workdir),
+                "--llm-latency", str(args.llm_latency), "--llm-tps", str(args.llm_tps),
+                "--llm-file-kb", str(args.llm_file_kb), "--llm-rpm", str(args.llm_rpm),
+                "--llm-slow-rate", str(args.llm_slow_rate), "--llm-slow-latency", str(args.llm_slow_latency),
+                "--pages-delay", str(args.pages_delay),
+                "--eval-fail-rate", str(args.eval_fail_rate),
+            ], stdout=log, stderr=subprocess.STDOUT))
+        _wait_ready(f"{services}/eval/received", procs[-1])
+
+        with open(workdir / "app.log", "w") as log:
+            procs.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app:app", "--port", str(app_port),
+                 "--workers", str(args.workers), "--log-level", "warning"],
+                cwd=ROOT, env=app_env(workdir, services, overrides), stdout=log, stderr=subprocess.STDOUT,
+            ))
+        _wait_ready(f"{target}/health", procs[-1])
+
+        payloads = load_payloads(args.tasks, args.repeat)
+        print(f"▶️ Replaying {len(payloads)} request(s) at {args.rate or 'max'}/s (workdir: {workdir})")
+        report = asyncio.run(run_load(
+            target, services, payloads, args.rate, SECRET, args.poisson, args.timeout
+        ))
+        report["config"] = {k: v for k, v in vars(args).items() if k not in ("json", "tasks", "workdir")}
+        print(format_report(report))
+        if args.json:
+            args.json.write_text(json.dumps(report, indent=2, default=str))
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+startup_bench.py
+----------------
+Cold-start benchmark and regression guard. For each of --runs fresh
+processes it measures:
+
+- import: wall time of `import app` (and that none of the deferred SDKs
+  -- openai, requests, httpx, dotenv -- were imported by it);
+- ready: from launching uvicorn to the first 200 from /health;
+- ack: latency of the first /api-endpoint request, sent as soon as the
+  server is ready.
+
+    python benchmarks/startup_bench.py --runs 5
+    python benchmarks/startup_bench.py --max-import-ms 600 --max-ack-ms 300   # exits 1 on regression
+    python benchmarks/startup_bench.py --env WARMUP=true
+
+The posted task runs against fake_services.py, so nothing leaves the machine.
+"""
+
+import argparse
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from loadgen import load_payloads
+from run_bench import ROOT, SECRET, _free_port, _wait_ready, app_env
+
+# Must not be loaded by `import app`; they are imported on first use
+DEFERRED = ("openai", "requests", "httpx", "dotenv")
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+print(elapsed, ",".join(m for m in {deferred!r} if m in sys.modules))
+"""
+
+
+def measure_import(env: dict) -> tuple[float, list[str]]:
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(deferred=DEFERRED)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    ).stdout.split("\n")[-2].split(" ")
+    return float(out[0]), [m for m in out[1].split(",") if m]
+
+
+def measure_serve(env: dict, services: str, payload: dict, log) -> tuple[float, float]:
+    port = _free_port()
+    target = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    try:
+        with httpx.Client(timeout=30) as client:
+            deadline = start + 60
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"app exited with code {proc.returncode}")
+                try:
+                    if client.get(f"{target}/health").status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.perf_counter() > deadline:
+                    raise RuntimeError("app did not come up within 60s")
+                time.sleep(0.005)
+            ready = time.perf_counter() - start
+
+            sent = time.perf_counter()
+            r = client.post(f"{target}/api-endpoint", json=payload)
+            ack = time.perf_counter() - sent
+            r.raise_for_status()
+        return ready, ack
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def _summary(values: list[float]) -> dict:
+    return {"median_ms": round(statistics.median(values) * 1000, 1), "max_ms": round(max(values) * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--tasks", type=Path, default=Path(__file__).with_name("tasks.jsonl"))
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="app environment override")
+    parser.add_argument("--max-import-ms", type=float, help="fail if the median import time is above this")
+    parser.add_argument("--max-ready-ms", type=float, help="fail if the median time to first /health is above this")
+    parser.add_argument("--max-ack-ms", type=float, help="fail if the median first-request ack is above this")
+    parser.add_argument("--json", type=Path, help="also write the report here")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="llm-startup-"))
+    overrides = dict(kv.split("=", 1) for kv in args.env)
+    services_port = _free_port()
+    services = f"http://127.0.0.1:{services_port}"
+    first = load_payloads(args.tasks)[0]
+
+    imports, readies, acks, loaded = [], [], [], set()
+    with open(workdir / "services.log", "w") as log:
+        fake = subprocess.Popen(
+            [sys.executable, str(Path(__file__).with_name("fake_services.py")),
+             "--port", str(services_port), "--root", str(workdir)],
+            stdout=log, stderr=subprocess.STDOUT,
+        )
+    try:
+        _wait_ready(f"{services}/eval/received", fake)
+        with open(workdir / "app.log", "w") as log:
+            for i in range(args.runs):
+                # A fresh BASE_REPO_DIR each run: nothing on disk from the previous start
+                env = app_env(workdir / f"run{i}", services, overrides)
+                seconds, modules = measure_import(env)
+                imports.append(seconds)
+                loaded.update(modules)
+                payload = {**first, "task": f"{first['task']}-startup-{i}", "secret": SECRET,
+                           "evaluation_url": f"{services}/eval"}
+                ready, ack = measure_serve(env, services, payload, log)
+                readies.append(ready)
+                acks.append(ack)
+    finally:
+        fake.terminate()
+        fake.wait(timeout=10)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "runs": args.runs,
+        "import": _summary(imports),
+        "ready": _summary(readies),
+        "first_ack": _summary(acks),
+        "deferred_modules_imported": sorted(loaded),
+    }
+    print(f"import app      median {report['import']['median_ms']:>7} ms   max {report['import']['max_ms']:>7} ms")
+    print(f"ready (/health) median {report['ready']['median_ms']:>7} ms   max {report['ready']['max_ms']:>7} ms")
+    print(f"first ack       median {report['first_ack']['median_ms']:>7} ms   max {report['first_ack']['max_ms']:>7} ms")
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+
+    failures = []
+    if loaded:
+        failures.append(f"`import app` loaded deferred module(s): {', '.join(sorted(loaded))}")
+    for name, limit in (("import", args.max_import_ms), ("ready", args.max_ready_ms), ("first_ack", args.max_ack_ms)):
+        if limit is not None and report[name]["median_ms"] > limit:
+            failures.append(f"{name} median {report[name]['median_ms']} ms > {limit} ms")
+    for failure in failures:
+        print(f"❌ {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+events.py
+---------
+In-process progress events for tasks, streamed to clients by
+GET /tasks/{email}/{task}/{round}/events (server-sent events).
+
+- job_store publishes "stage" on every completed stage and "done"/"failed"
+  when a job ends; llm_generator publishes "file" for each file written;
+  the outbox publishes "notified" once the evaluator acknowledges a round.
+- publish() may be called from any thread; each subscriber gets the event
+  on its own event loop's queue.
+- The last events of recently active jobs are kept so a reconnecting client
+  (Last-Event-ID) gets what it missed. Event ids are per job and per
+  process; another worker's progress reaches a stream through the job store
+  instead (see app.task_events).
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+# Events kept per job for replay, and jobs kept
+HISTORY_PER_JOB = 200
+HISTORY_JOBS = 1000
+# A subscriber that falls this far behind loses events (it can reconnect and replay)
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+# Artifacts that are safe and useful to show to clients (no payloads or paths)
+PUBLIC_ARTIFACTS = ("nonce", "generated_files", "repo_name", "commit_sha", "pages_url", "pages_live", "timings")
+
+_lock = threading.Lock()
+_history: OrderedDict[str, deque] = OrderedDict()
+_next_id: dict[str, int] = {}
+_subscribers: dict[str, set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+_current: contextvars.ContextVar[str | None] = contextvars.ContextVar("event_job", default=None)
+
+
+def public_artifacts(artifacts: dict) -> dict:
+    """The client-facing subset of a job's artifacts."""
+    view = {k: artifacts[k] for k in PUBLIC_ARTIFACTS if k in artifacts}
+    if "attachments" in artifacts:
+        view["attachments"] = [a.get("name") for a in artifacts["attachments"] if isinstance(a, dict)]
+    verification = artifacts.get("verification")
+    if isinstance(verification, dict):
+        view["verification"] = {
+            "ok": verification.get("ok"),
+            "problems": verification.get("problems", []),
+            "repaired": verification.get("repaired", []),
+        }
+    return view
+
+
+# ---------------------------------------------------------------------
+# Publishing
+# ---------------------------------------------------------------------
+def bind(key: str):
+    """Make `key` the job that publish_current() reports for (this task and its stage threads)."""
+    _current.set(key)
+
+
+def publish(key: str, event: str, **data):
+    """Record an event for job `key` and hand it to every subscriber."""
+    with _lock:
+        seq = _next_id.get(key, 0) + 1
+        _next_id[key] = seq
+        record = {"id": seq, "event": event, "ts": time.time(), "data": data}
+        history = _history.get(key)
+        if history is None:
+            history = _history[key] = deque(maxlen=HISTORY_PER_JOB)
+            while len(_history) > HISTORY_JOBS:
+                old, _ = _history.popitem(last=False)
+                _next_id.pop(old, None)
+        else:
+            _history.move_to_end(key)
+        history.append(record)
+        subscribers = list(_subscribers.get(key, ()))
+    for loop, queue in subscribers:
+        try:
+            loop.call_soon_threadsafe(_offer, queue, record)
+        except RuntimeError:
+            pass  # that loop is closed
+
+
+def publish_current(event: str, **data):
+    """publish() for the job bound to the current context, if any."""
+    key = _current.get()
+    if key is not None:
+        publish(key, event, **data)
+
+
+def _offer(queue: asyncio.Queue, record: dict):
+    try:
+        queue.put_nowait(record)
+    except asyncio.QueueFull:
+        pass
+
+
+# ---------------------------------------------------------------------
+# Subscribing
+# ---------------------------------------------------------------------
+@contextmanager
+def subscribe(key: str):
+    """Queue receiving job `key`'s events from now on (call from a running event loop)."""
+    entry = (asyncio.get_running_loop(), asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE))
+    with _lock:
+        _subscribers.setdefault(key, set()).add(entry)
+    try:
+        yield entry[1]
+    finally:
+        with _lock:
+            subscribers = _subscribers.get(key)
+            if subscribers is not None:
+                subscribers.discard(entry)
+                if not subscribers:
+                    del _subscribers[key]
+
+
+def history(key: str, after: int = 0) -> list[dict]:
+    """Kept events of job `key` with an id above `after`."""
+    with _lock:
+        return [r for r in _history.get(key, ()) if r["id"] > after]
@@ -0,0 +1,149 @@
+"""
+github_api.py — Clone-free publishing through the GitHub Git Data API.
+
+Round 1 builds the tree (and blobs for binary/large files) and the commit
+in-process and moves the branch ref with a handful of pooled HTTP calls,
+instead of running git init/add/commit/push in subprocesses. All calls go
+through one shared requests.Session so connections are kept alive.
+"""
+
+import base64
+import os
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from config import GITHUB_USERNAME, GITHUB_TOKEN, GITHUB_API_URL, GITHUB_POOL_SIZE, PAGES_URL_TEMPLATE
+import log
+
+# Files larger than this (or not valid UTF-8) are uploaded as separate blobs;
+# everything else is inlined into the tree request.
+INLINE_MAX_BYTES = 512 * 1024
+
+if TYPE_CHECKING:
+    import requests
+
+# requests is imported when the session is first built, not at app startup
+_session: "requests.Session | None" = None
+_session_lock = threading.Lock()
+
+
+class GitHubAPIError(RuntimeError):
+    """A GitHub REST call returned an unexpected status."""
+
+    def __init__(self, method: str, path: str, response: "requests.Response"):
+        self.status_code = response.status_code
+        super().__init__(f"{method} {path} failed: {response.status_code} {response.text[:300]}")
+
+
+def session() -> "requests.Session":
+    """Shared, connection-pooled session with GitHub auth headers (built on first use)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=GITHUB_POOL_SIZE)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            s.headers.update({
+                "Authorization": f"token {GITHUB_TOKEN}",
+                "Accept": "application/vnd.github+json",
+            })
+            _session = s
+    return _session
+
+
+def warm_up():
+    """Builds the session and opens a pooled connection to the GitHub API (blocking)."""
+    try:
+        session().head(GITHUB_API_URL, timeout=10)
+    except Exception as e:
+        log.warning("⚠️ GitHub warm-up request failed: %s", e)
+
+
+def pages_url_for(repo_name: str) -> str:
+    return PAGES_URL_TEMPLATE.format(username=GITHUB_USERNAME, repo=repo_name)
+
+
+def api(method: str, path: str, ok=(200, 201), **kwargs) -> "requests.Response":
+    """Call the GitHub REST API; raises GitHubAPIError unless the status is in `ok`."""
+    r = session().request(method, f"{GITHUB_API_URL}{path}", timeout=30, **kwargs)
+    if r.status_code not in ok:
+        raise GitHubAPIError(method, path, r)
+    return r
+
+
+def _tree_entries(repo: str, local_path: Path) -> list[dict]:
+    entries = []
+    for root, dirs, files in os.walk(local_path):
+        dirs[:] = sorted(d for d in dirs if d != ".git")
+        for name in sorted(files):
+            path = Path(root) / name
+            rel = path.relative_to(local_path).as_posix()
+            mode = "100755" if os.access(path, os.X_OK) else "100644"
+            data = path.read_bytes()
+            entry = {"path": rel, "mode": mode, "type": "blob"}
+            text = None
+            if len(data) <= INLINE_MAX_BYTES:
+                try:
+                    text = data.decode("utf-8")
+                except UnicodeDecodeError:
+                    pass
+            if text is not None:
+                entry["content"] = text
+            else:
+                blob = api("POST", f"/repos/{repo}/git/blobs", json={
+                    "content": base64.b64encode(data).decode(),
+                    "encoding": "base64",
+                }).json()
+                entry["sha"] = blob["sha"]
+            entries.append(entry)
+    return entries
+
+
+def publish_round1(repo_name: str, local_path: Path) -> tuple[str, str, str]:
+    """
+    Round 1 — create the repo, commit local_path as a single tree, enable Pages.
+    Returns: (repo_name, commit_sha, pages_url)
+    """
+    log.info("🚀 Round 1: Publishing `%s` via the Git Data API...", repo_name)
+    repo = f"{GITHUB_USERNAME}/{repo_name}"
+    pages_url = pages_url_for(repo_name)
+
+    # --- Create repository (auto_init gives us a branch to commit on) ---
+    r = api("POST", "/user/repos", ok=(201, 422), json={
+        "name": repo_name, "private": False, "auto_init": True,
+    })
+    if r.status_code == 422:
+        if "already exists" not in r.text.lower():
+            raise GitHubAPIError("POST", "/user/repos", r)
+        log.info("ℹ️ Repo `%s` already exists, committing on top of it...", repo_name)
+        branch = api("GET", f"/repos/{repo}").json()["default_branch"]
+    else:
+        branch = r.json().get("default_branch") or "main"
+
+    parent = api("GET", f"/repos/{repo}/git/ref/heads/{branch}").json()["object"]["sha"]
+
+    # --- Tree + commit + ref update ---
+    tree = api("POST", f"/repos/{repo}/git/trees", json={
+        "tree": _tree_entries(repo, local_path),
+    }).json()["sha"]
+    commit_sha = api("POST", f"/repos/{repo}/git/commits", json={
+        "message": "Initial commit", "tree": tree, "parents": [parent],
+    }).json()["sha"]
+    api("PATCH", f"/repos/{repo}/git/refs/heads/{branch}", json={"sha": commit_sha, "force": True})
+
+    # --- Enable GitHub Pages ---
+    r_pages = api("POST", f"/repos/{repo}/pages", ok=(201, 204, 409, 422), json={
+        "source": {"branch": branch, "path": "/"},
+    })
+    if r_pages.status_code not in (201, 204):
+        log.warning("⚠️ Pages activation warning (%d)", r_pages.status_code, response=r_pages.text)
+    else:
+        log.info("🌍 GitHub Pages activated.")
+
+    log.info("✅ Round 1 completed — Commit: %s", commit_sha)
+    return repo_name, commit_sha, pages_url
@@ -0,0 +1,255 @@
+"""
+ingest.py
+---------
+Bounded-memory ingestion of /api-endpoint request bodies.
+
+1. spool_body() streams the body into memory (small requests) or a temp file,
+   enforcing MAX_REQUEST_BYTES, without ever building one large string.
+2. scan_task_body() walks the top level of the JSON bytes (mmap for spooled
+   bodies) to find the attachments array. Everything else is parsed by
+   orjson (the attachments value replaced by null), while each attachment
+   `url` is only located, as a (start, end) span, so the secret and routing
+   fields can be validated before any attachment is touched.
+3. store_attachments() decodes each span straight from the buffer into the
+   attachment store in fixed-size chunks and returns AttachmentRefs.
+"""
+
+import json
+import mmap
+import re
+import tempfile
+
+import orjson
+
+from attachment_utils import store_data_url, guess_mime
+from config import MAX_REQUEST_BYTES, ATTACHMENT_STORE_DIR
+from models import AttachmentRef
+
+# Bodies up to this size stay in memory; larger ones go to a temp file
+SPOOL_MEMORY_BYTES = 1024 * 1024
+
+_WS = b" \t\r\n"
+_STRUCTURAL = re.compile(rb'["{}\[\]]')
+_SCALAR_END = re.compile(rb'[,}\]\s]')
+
+
+class RequestTooLarge(ValueError):
+    """The request body exceeds MAX_REQUEST_BYTES."""
+
+
+class SpooledBody:
+    """A request body held in memory or in a memory-mapped temp file."""
+
+    def __init__(self):
+        self._chunks: bytearray | None = bytearray()
+        self._file = None
+        self._map: mmap.mmap | None = None
+        self.size = 0
+        self.buf = b""
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self._file is None and self.size <= SPOOL_MEMORY_BYTES:
+            self._chunks += chunk
+            return
+        if self._file is None:
+            ATTACHMENT_STORE_DIR.mkdir(parents=True, exist_ok=True)
+            self._file = tempfile.TemporaryFile(dir=ATTACHMENT_STORE_DIR)
+            self._file.write(self._chunks)
+            self._chunks = None
+        self._file.write(chunk)
+
+    def finish(self):
+        if self._file is None:
+            self.buf = bytes(self._chunks)
+        elif self.size:
+            self._file.flush()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.buf = self._map
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        if self._file is not None:
+            self._file.close()
+        self.buf = b""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+async def spool_body(request, limit: int = MAX_REQUEST_BYTES) -> SpooledBody:
+    """Read the request body chunk by chunk; raises RequestTooLarge past `limit`."""
+    body = SpooledBody()
+    try:
+        async for chunk in request.stream():
+            if body.size + len(chunk) > limit:
+                raise RequestTooLarge(f"Request body exceeds {limit} bytes")
+            body.write(chunk)
+        body.finish()
+    except BaseException:
+        body.close()
+        raise
+    return body
+
+
+# ---------------------------------------------------------------------
+# JSON scanning
+# ---------------------------------------------------------------------
+def _skip_ws(buf, i: int) -> int:
+    n = len(buf)
+    while i < n and buf[i] in _WS:
+        i += 1
+    return i
+
+
+def _string_end(buf, i: int) -> int:
+    """`i` is at an opening quote; returns the index just past the closing one."""
+    j = i + 1
+    while True:
+        q = buf.find(b'"', j)
+        if q == -1:
+            raise ValueError("Unterminated JSON string")
+        k = q - 1
+        while buf[k] == 0x5C:  # backslash
+            k -= 1
+        if (q - 1 - k) % 2 == 0:
+            return q + 1
+        j = q + 1
+
+
+def _value_end(buf, i: int) -> int:
+    """Index just past the JSON value starting at `i` (not decoded)."""
+    c = buf[i:i + 1]
+    if c == b'"':
+        return _string_end(buf, i)
+    if c in (b"{", b"["):
+        depth, j = 0, i
+        while True:
+            m = _STRUCTURAL.search(buf, j)
+            if m is None:
+                raise ValueError("Unterminated JSON container")
+            tok, j = buf[m.start():m.start() + 1], m.start()
+            if tok == b'"':
+                j = _string_end(buf, j)
+                continue
+            depth += 1 if tok in (b"{", b"[") else -1
+            j += 1
+            if depth == 0:
+                return j
+    m = _SCALAR_END.search(buf, i)
+    end = m.start() if m else len(buf)
+    if end == i:
+        raise ValueError(f"Expected a JSON value at offset {i}")
+    return end
+
+
+def _members(buf, i: int):
+    """Yields (key, value_start, value_end) for the JSON object starting at `i`."""
+    i = _skip_ws(buf, i)
+    if buf[i:i + 1] != b"{":
+        raise ValueError("Expected a JSON object")
+    i = _skip_ws(buf, i + 1)
+    if buf[i:i + 1] == b"}":
+        return
+    while True:
+        if buf[i:i + 1] != b'"':
+            raise ValueError(f"Expected an object key at offset {i}")
+        key_end = _string_end(buf, i)
+        key = json.loads(buf[i:key_end])
+        i = _skip_ws(buf, key_end)
+        if buf[i:i + 1] != b":":
+            raise ValueError(f"Expected ':' at offset {i}")
+        start = _skip_ws(buf, i + 1)
+        end = _value_end(buf, start)
+        yield key, start, end
+        i = _skip_ws(buf, end)
+        sep = buf[i:i + 1]
+        if sep == b"}":
+            return
+        if sep != b",":
+            raise ValueError(f"Expected ',' or '}}' at offset {i}")
+        i = _skip_ws(buf, i + 1)
+
+
+def _elements(buf, i: int):
+    """Yields (value_start, value_end) for the JSON array starting at `i`."""
+    if buf[i:i + 1] != b"[":
+        raise ValueError("Expected a JSON array")
+    i = _skip_ws(buf, i + 1)
+    if buf[i:i + 1] == b"]":
+        return
+    while True:
+        end = _value_end(buf, i)
+        yield i, end
+        i = _skip_ws(buf, end)
+        sep = buf[i:i + 1]
+        if sep == b"]":
+            return
+        if sep != b",":
+            raise ValueError(f"Expected ',' or ']' at offset {i}")
+        i = _skip_ws(buf, i + 1)
+
+
+def scan_task_body(buf) -> tuple[dict, list[dict]]:
+    """
+    Splits a task body into its decoded scalar fields and attachment specs.
+    Each spec is {"name", "url_span": (start, end)} (the URL's characters,
+    without quotes) or {"name", "url"} for the rare URL containing JSON escapes.
+    Raises ValueError on malformed JSON, including anything but whitespace
+    after the top-level object.
+    """
+    i = _skip_ws(buf, 0)
+    last, attachments = i + 1, None
+    for key, start, end in _members(buf, i):
+        last = end
+        if key == "attachments":
+            attachments = (start, end)
+    # _members has checked that "}" follows the last member
+    if _skip_ws(buf, _skip_ws(buf, last) + 1) != len(buf):
+        raise ValueError("Unexpected data after the JSON object")
+
+    # The body without the attachment data is small; a real parser checks all of it
+    if attachments is None:
+        rest = bytes(buf)
+    else:
+        rest = bytes(buf[:attachments[0]]) + b"null" + bytes(buf[attachments[1]:])
+    fields = orjson.loads(rest)  # orjson.JSONDecodeError is a ValueError
+    fields.pop("attachments", None)
+
+    specs = []
+    if attachments is not None and buf[attachments[0]:attachments[0] + 4] != b"null":
+        for item_start, _ in _elements(buf, attachments[0]):
+            spec = {}
+            for k, vs, ve in _members(buf, item_start):
+                is_string = buf[vs:vs + 1] == b'"'
+                if k == "url" and is_string and buf.find(b"\\", vs, ve) == -1:
+                    spec["url_span"] = (vs + 1, ve - 1)
+                else:
+                    spec[k] = orjson.loads(buf[vs:ve])
+            specs.append(spec)
+    return fields, specs
+
+
+def store_attachments(buf, specs: list[dict]) -> list[AttachmentRef]:
+    """Decode every data-URL attachment into the blob store; others are skipped."""
+    refs = []
+    for spec in specs:
+        name = spec.get("name")
+        if not isinstance(name, str) or not name:
+            continue
+        if "url_span" in spec:
+            start, end = spec["url_span"]
+            if buf[start:start + 5] != b"data:":
+                continue
+            _, mime, sha, size = store_data_url(buf, start, end)
+        elif isinstance(spec.get("url"), str) and spec["url"].startswith("data:"):
+            _, mime, sha, size = store_data_url(spec["url"])
+        else:
+            continue
+        refs.append(AttachmentRef(name=name, sha256=sha, mime=guess_mime(name, mime), size=size))
+    return refs
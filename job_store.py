@@ -0,0 +1,168 @@
+"""
+job_store.py
+------------
+Durable SQLite-backed record of every /api-endpoint task.
+
+Each job stores its request payload, the last pipeline stage it completed and
+the intermediate artifacts produced so far (saved attachments, generated
+files, commit SHA, ...). After a restart, unfinished jobs are resumed from
+their last completed stage instead of paying the LLM and git cost again.
+Finished jobs are evicted once they are older than JOB_TTL_SECONDS.
+Every state change is also published as a progress event (events.py).
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+from config import JOB_DB_PATH, JOB_TTL_SECONDS
+import events
+
+# Pipeline stages in execution order; a job's `stage` is the last one completed.
+STAGES = ["received", "attachments", "generated", "readme", "verified", "pushed", "pages", "notified"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    key        TEXT PRIMARY KEY,
+    payload    TEXT NOT NULL,
+    stage      TEXT NOT NULL,
+    status     TEXT NOT NULL,
+    artifacts  TEXT NOT NULL DEFAULT '{}',
+    error      TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+_lock = threading.Lock()
+_conn: sqlite3.Connection | None = None
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        JOB_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        # Several worker processes share this file; wait out their write locks
+        conn = sqlite3.connect(JOB_DB_PATH, check_same_thread=False, isolation_level=None, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(_SCHEMA)
+        _conn = conn
+    return _conn
+
+
+def _row_to_job(row: sqlite3.Row | None) -> dict | None:
+    if row is None:
+        return None
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["artifacts"] = json.loads(job["artifacts"])
+    return job
+
+
+def stage_done(job: dict, stage: str) -> bool:
+    """True if `stage` was already completed for this job."""
+    return STAGES.index(job["stage"]) >= STAGES.index(stage)
+
+
+def create_job(key: str, payload: dict) -> dict:
+    """Insert (or reset) a job for a freshly received request."""
+    now = time.time()
+    payload = {k: v for k, v in payload.items() if k != "secret"}
+    with _lock:
+        _db().execute(
+            """
+            INSERT INTO jobs (key, payload, stage, status, artifacts, error, created_at, updated_at)
+            VALUES (?, ?, 'received', 'pending', '{}', NULL, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                payload = excluded.payload, stage = 'received', status = 'pending',
+                artifacts = '{}', error = NULL, created_at = excluded.created_at,
+                updated_at = excluded.updated_at
+            """,
+            (key, json.dumps(payload), now, now),
+        )
+    events.publish(key, "stage", stage="received", status="pending")
+    return get_job(key)
+
+
+def get_job(key: str) -> dict | None:
+    with _lock:
+        row = _db().execute("SELECT * FROM jobs WHERE key = ?", (key,)).fetchone()
+    return _row_to_job(row)
+
+
+def advance(key: str, stage: str, payload: dict | None = None, **artifacts) -> dict:
+    """
+    Mark `stage` as completed and merge `artifacts` into the job's artifacts.
+    `payload` optionally replaces the stored payload (e.g. to drop attachment blobs).
+    """
+    if stage not in STAGES:
+        raise ValueError(f"Unknown job stage: {stage}")
+    with _lock:
+        db = _db()
+        row = db.execute("SELECT artifacts, payload FROM jobs WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        merged = {**json.loads(row["artifacts"]), **artifacts}
+        db.execute(
+            "UPDATE jobs SET stage = ?, status = 'running', artifacts = ?, payload = ?, updated_at = ? WHERE key = ?",
+            (
+                stage,
+                json.dumps(merged),
+                json.dumps(payload) if payload is not None else row["payload"],
+                time.time(),
+                key,
+            ),
+        )
+    events.publish(key, "stage", stage=stage, status="running", **events.public_artifacts(artifacts))
+    return get_job(key)
+
+
+def reset(key: str):
+    """Send a job back to the first stage (its artifacts are no longer usable)."""
+    with _lock:
+        _db().execute(
+            "UPDATE jobs SET stage = 'received', artifacts = '{}', updated_at = ? WHERE key = ?",
+            (time.time(), key),
+        )
+    events.publish(key, "stage", stage="received", status="running", reset=True)
+
+
+def finish(key: str):
+    with _lock:
+        _db().execute(
+            "UPDATE jobs SET status = 'done', error = NULL, updated_at = ? WHERE key = ?",
+            (time.time(), key),
+        )
+    events.publish(key, "done", status="done")
+
+
+def fail(key: str, error: str):
+    with _lock:
+        _db().execute(
+            "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE key = ?",
+            (error, time.time(), key),
+        )
+    events.publish(key, "failed", status="failed", error=error)
+
+
+def unfinished_jobs() -> list[dict]:
+    """Jobs that were pending or running when the process last stopped."""
+    with _lock:
+        rows = _db().execute(
+            "SELECT * FROM jobs WHERE status IN ('pending', 'running') ORDER BY created_at"
+        ).fetchall()
+    return [_row_to_job(r) for r in rows]
+
+
+def evict_expired(ttl: float = JOB_TTL_SECONDS) -> int:
+    """Delete finished (done or failed) jobs older than `ttl` seconds. Returns the count."""
+    cutoff = time.time() - ttl
+    with _lock:
+        cur = _db().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+            (cutoff,),
+        )
+    return cur.rowcount
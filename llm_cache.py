@@ -0,0 +1,152 @@
+"""
+llm_cache.py
+------------
+Content-addressed cache for LLM responses.
+
+Keys are a SHA-256 of the model, prompt (which embeds the brief, attachments
+and round context) and sampling parameters, so a repeated request (evaluator
+retry, duplicate nonce, re-sent round) is answered without another LLM call.
+
+Two tiers:
+- an in-memory LRU of the most recent entries
+- an on-disk tier under LLM_CACHE_DIR, capped at LLM_CACHE_DISK_MB and
+  evicted least-recently-used first (file mtime is bumped on every hit)
+
+get() and put() are awaited from the LLM client: memory hits are answered
+inline, and disk reads, writes and eviction run on the io stage's executor,
+never on the event loop.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from config import LLM_CACHE_ENABLED, LLM_CACHE_DIR, LLM_CACHE_MEMORY_ITEMS, LLM_CACHE_DISK_MB
+import scheduler
+
+_lock = threading.Lock()       # memory tier and stats (held briefly; also taken on the event loop)
+_disk_lock = threading.Lock()  # disk size accounting and eviction (io threads only)
+_memory: "OrderedDict[str, str]" = OrderedDict()
+_disk_bytes: int | None = None  # computed lazily on first disk write
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def cache_key(model: str, prompt: str, **params) -> str:
+    """Stable hash of everything that determines an LLM response."""
+    blob = json.dumps({"model": model, "prompt": prompt, "params": params}, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _path(key: str) -> Path:
+    return LLM_CACHE_DIR / key[:2] / f"{key}.txt"
+
+
+async def get(key: str) -> str | None:
+    """Returns the cached response text for `key`, or None on a miss."""
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            _stats["memory_hits"] += 1
+            return _memory[key]
+    return await scheduler.stage("io").submit(_read_disk, key)
+
+
+def _read_disk(key: str) -> str | None:
+    path = _path(key)
+    try:
+        text = path.read_text(encoding="utf-8")
+        os.utime(path)  # mark as recently used for disk LRU
+    except OSError:
+        with _lock:
+            _stats["misses"] += 1
+        return None
+
+    with _lock:
+        _stats["disk_hits"] += 1
+        _remember(key, text)
+    return text
+
+
+async def put(key: str, text: str):
+    """Stores a validated response in both tiers."""
+    if not LLM_CACHE_ENABLED:
+        return
+    with _lock:
+        _stats["stores"] += 1
+        _remember(key, text)
+    await scheduler.stage("io").submit(_write_disk, key, text)
+
+
+def _write_disk(key: str, text: str):
+    global _disk_bytes
+    path = _path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+
+    with _disk_lock:
+        if _disk_bytes is None:
+            _disk_bytes = sum(f.stat().st_size for f in LLM_CACHE_DIR.glob("*/*.txt"))
+        try:
+            replaced = path.stat().st_size  # re-storing a key replaces its file
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp, path)
+        _disk_bytes += path.stat().st_size - replaced
+        if _disk_bytes > LLM_CACHE_DISK_MB * 1024 * 1024:
+            _evict_disk()
+
+
+def _remember(key: str, text: str):
+    # Caller holds _lock
+    _memory[key] = text
+    _memory.move_to_end(key)
+    while len(_memory) > LLM_CACHE_MEMORY_ITEMS:
+        _memory.popitem(last=False)
+
+
+def _evict_disk():
+    """Delete least-recently-used disk entries until under 90% of the cap."""
+    # Caller holds _disk_lock
+    global _disk_bytes
+    target = LLM_CACHE_DISK_MB * 1024 * 1024 * 0.9
+    entries = []
+    for f in LLM_CACHE_DIR.glob("*/*.txt"):
+        try:
+            st = f.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, f))
+    entries.sort()
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, f in entries:
+        if total <= target:
+            break
+        try:
+            f.unlink()
+        except OSError:
+            continue
+        with _lock:
+            _memory.pop(f.stem, None)
+            _stats["evictions"] += 1
+        total -= size
+    _disk_bytes = total
+
+
+def stats() -> dict:
+    """Hit/miss counters plus current tier sizes."""
+    with _lock:
+        hits = _stats["memory_hits"] + _stats["disk_hits"]
+        lookups = hits + _stats["misses"]
+        return {
+            **_stats,
+            "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+            "memory_items": len(_memory),
+            "disk_bytes": _disk_bytes,
+        }
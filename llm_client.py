@@ -1,25 +1,184 @@
-import os
 import json
-import time
-from openai import OpenAI
-from typing import List, Dict
+import asyncio
+import importlib
+from dataclasses import replace
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, List, Dict
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
+from config import (
+    OPENAI_API_KEY, OPENAI_BASE_URL, LLM_MAX_CONNECTIONS, LLM_TIMEOUT, LLM_PLAN_MAX_FILES,
+    LLM_RATE_LIMIT_RETRIES,
+)
+from utils import FileArrayStreamParser, StreamParseError
+import llm_cache
+import llm_router
+import log
+import metrics
+import rate_limiter
 
-def generate_files_from_brief(
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+# The openai SDK (and httpx) are imported on first use: they are the bulk of
+# the app's import time, and nothing needs them until the first LLM call.
+_client: "AsyncOpenAI | None" = None
+_http = None  # the client's httpx.AsyncClient
+
+
+class TruncatedCompletion(ValueError):
+    """The completion stopped at max_tokens, so its content is incomplete."""
+
+    def __init__(self, message: str, max_tokens: int):
+        super().__init__(message)
+        self.max_tokens = max_tokens
+
+
+def get_client() -> "AsyncOpenAI":
+    """
+    Returns the shared async OpenAI client (built on first use).
+    All LLM calls go through one httpx connection pool so keep-alive
+    connections are reused across tasks.
+    """
+    global _client, _http
+    if _client is None:
+        import httpx
+        from openai import AsyncOpenAI
+
+        _http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+            ),
+            timeout=LLM_TIMEOUT,
+        )
+        # Retries are handled here (with non-blocking backoff), not inside the SDK
+        _client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, http_client=_http, max_retries=0
+        )
+    return _client
+
+
+async def warm_up():
+    """
+    Builds the client and opens a connection to the API ahead of the first
+    call. Any response (even a 401) leaves a keep-alive connection in the pool.
+    """
+    # The SDK import is slow; do it off the event loop
+    await asyncio.to_thread(importlib.import_module, "openai")
+    client = get_client()
+    try:
+        await _http.get(str(client.base_url), timeout=10)
+    except Exception as e:
+        log.warning("⚠️ LLM warm-up request failed: %s", e)
+
+
+async def aclose():
+    """Close the shared client and its connection pool."""
+    global _client, _http
+    if _client is not None:
+        await _client.close()
+        _client = _http = None
+
+
+async def complete(
+    prompt: str,
+    model: str | None = None,
+    temperature: float = 0.2,
+    max_tokens: int | None = None,
+    max_retries: int = 3,
+    use_cache: bool = True,
+    call: str = "complete",
+    reject_truncated: bool = False,
+    parse: Callable[[str], Any] | None = None
+) -> Any:
+    """
+    Single-prompt chat completion with exponential backoff between attempts.
+    The model and max_tokens come from the call's route (llm_router) unless
+    given explicitly; slow calls are hedged with a second request.
+    Every request goes through the shared rate limiter; a 429 waits for the
+    limiter's pause and does not count against max_retries.
+    Identical requests are served from llm_cache when use_cache is set.
+    `call` labels the request in metrics and selects its route (e.g. "readme", "files").
+    reject_truncated: raise TruncatedCompletion (without retrying at the same
+    max_tokens) when the model hit the token limit.
+    parse: turns the text into the return value; a ValueError marks the reply
+    invalid, so a hedge request can still win (or the attempt is retried).
+    Returns the stripped message content, or parse() of it.
+    """
+    route = llm_router.route_for(call, prompt)
+    if model or max_tokens:
+        route = replace(route, model=model or route.model, max_tokens=max_tokens or route.max_tokens)
+    parse = parse or (lambda text: text)
+
+    key = llm_cache.cache_key(route.model, prompt, temperature=temperature, max_tokens=route.max_tokens)
+    if use_cache:
+        cached = await llm_cache.get(key)
+        if cached is not None:
+            return parse(cached)
+
+    async def request(model_name: str) -> tuple[str, Any]:
+        async with rate_limiter.limiter.slot(call, prompt, route.max_tokens) as report:
+            raw = await get_client().chat.completions.with_raw_response.create(
+                model=model_name,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+                max_tokens=route.max_tokens
+            )
+            report.headers(raw.headers)
+            response = raw.parse()
+            report.usage(response.usage)
+        metrics.record_llm_usage(call, response.usage)
+        choice = response.choices[0]
+        if reject_truncated and choice.finish_reason == "length":
+            raise TruncatedCompletion(f"{call} completion hit max_tokens={route.max_tokens}", route.max_tokens)
+        text = (choice.message.content or "").strip()
+        return text, parse(text)
+
+    delay = 1
+    attempt = 0
+    rate_limited = 0
+    while True:
+        try:
+            text, result = await llm_router.run_hedged(route, request)
+            if use_cache:
+                await llm_cache.put(key, text)
+            return result
+        except TruncatedCompletion:
+            raise
+        except Exception as e:
+            # The limiter has already paused every caller; retry once it lets us in
+            if rate_limiter.is_rate_limited(e) and rate_limited < LLM_RATE_LIMIT_RETRIES:
+                rate_limited += 1
+                metrics.record_llm_retry(call)
+                continue
+            attempt += 1
+            if attempt < max_retries:
+                metrics.record_llm_retry(call)
+                await asyncio.sleep(delay)
+                delay *= 2
+            else:
+                raise
+
+
+def build_files_prompt(
     brief: str,
     attachments: List[Dict] = None,
     previous_repo_dir: str = None,
-    max_retries: int = 3
-) -> List[Dict]:
+    skip_paths: List[str] = None,
+    attachment_context: str = None
+) -> str:
     """
-    Generates project files from a brief using OpenAI.
-    attachments: [{"name": "...", "url": "..."}]
-    previous_repo_dir: If set, include current repo files for R2 modifications.
-    Returns a list of {"path": "...", "content": "..."} dicts.
+    Builds the prompt asking for the project as a JSON array of files.
+    attachment_context: pre-built attachment summaries (see prompt_builder);
+    when given it replaces the raw `attachments` data URLs.
     """
-    attachments = attachments or []
+    if attachment_context is not None:
+        attachments_text = (
+            f"{attachment_context}\n\n"
+            "The full files are committed under attachments/ in the repo; "
+            "load them from there at runtime instead of inlining their data."
+        )
+    else:
+        attachments_text = json.dumps(attachments or [])
     prompt = f"""
 You are a software engineer LLM. Generate a project as requested:
 
@@ -27,51 +186,430 @@ Brief:
 {brief}
 
 Attachments:
-{json.dumps(attachments)}
+{attachments_text}
 
 """
     if previous_repo_dir:
         prompt += f"\nExisting repo files: {previous_repo_dir}\nModify them as needed.\n"
 
+    if skip_paths:
+        prompt += (
+            "\nThese files were already generated; do NOT include them again: "
+            f"{', '.join(skip_paths)}\n"
+        )
+
     prompt += "\nReturn ONLY JSON array of files: [{'path': 'file', 'content': '...'}, ...]"
+    return prompt
+
+
+def files_cache_key(prompt: str, call: str = "files") -> str:
+    """Cache key for a parsed file list generated from `prompt`."""
+    route = llm_router.route_for(call, prompt)
+    return llm_cache.cache_key(route.model, prompt, temperature=0.2, max_tokens=route.max_tokens, kind="files")
+
+
+def _parse_json_reply(text: str, opening: str, closing: str):
+    """json.loads the reply, falling back to its outermost opening..closing span."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json.loads(text[text.find(opening):text.rfind(closing)+1])
+
+
+def _parse_files(text: str) -> List[Dict]:
+    files = _parse_json_reply(text, "[", "]")
+    # Ensure it's a list of dicts with required keys
+    if not isinstance(files, list) or not all(isinstance(f, dict) and "path" in f and "content" in f for f in files):
+        raise ValueError("Expected a JSON array of {path, content} objects")
+    return files
+
+
+async def generate_files_from_brief(
+    brief: str,
+    attachments: List[Dict] = None,
+    previous_repo_dir: str = None,
+    max_retries: int = 3,
+    attachment_context: str = None
+) -> List[Dict]:
+    """
+    Generates project files from a brief using OpenAI.
+    attachments: [{"name": "...", "url": "..."}]
+    previous_repo_dir: If set, include current repo files for R2 modifications.
+    attachment_context: Summaries to use instead of raw attachment data URLs.
+    Returns a list of {"path": "...", "content": "..."} dicts.
+    """
+    prompt = build_files_prompt(
+        brief, attachments, previous_repo_dir, attachment_context=attachment_context
+    )
+
+    # Only parsed, validated file lists are cached (never raw unparseable text)
+    key = files_cache_key(prompt)
+    cached = await llm_cache.get(key)
+    if cached is not None:
+        return json.loads(cached)
 
     delay = 1
     for attempt in range(max_retries):
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.2,
-                max_tokens=2500
-            )
+            files = await complete(prompt, max_retries=1, use_cache=False, call="files", parse=_parse_files)
+            await llm_cache.put(key, json.dumps(files))
+            return files
 
-            text = response.choices[0].message.content.strip()
+        except Exception as e:
+            if attempt < max_retries - 1:
+                metrics.record_llm_retry("files")
+                await asyncio.sleep(delay)
+                delay *= 2
+            elif isinstance(e, ValueError):
+                raise ValueError(f"LLM response could not be parsed as JSON: {e}") from e
+            else:
+                raise e
 
-            # Parse JSON safely
-            files = json.loads(text)
-            # Ensure it's a list of dicts with required keys
-            for f in files:
-                assert "path" in f and "content" in f
-            return files
 
-        except (json.JSONDecodeError, AssertionError) as e:
-            # Try to clean LLM output
-            try:
-                text_clean = text[text.find("["):text.rfind("]")+1]
-                files = json.loads(text_clean)
-                return files
-            except Exception:
-                pass
+async def stream_files_from_brief(
+    brief: str,
+    attachments: List[Dict] = None,
+    previous_repo_dir: str = None,
+    max_retries: int = 3,
+    attachment_context: str = None
+) -> AsyncIterator[Dict]:
+    """
+    Streaming variant of generate_files_from_brief.
+    Yields each {"path": "...", "content": "..."} dict as soon as its JSON object
+    closes in the token stream. Malformed or truncated output aborts the stream
+    immediately; the retry only asks for the files that are still missing.
+    """
+    key = files_cache_key(build_files_prompt(
+        brief, attachments, previous_repo_dir, attachment_context=attachment_context
+    ), call="files_stream")
+    cached = await llm_cache.get(key)
+    if cached is not None:
+        for f in json.loads(cached):
+            yield f
+        return
+
+    done_paths: List[str] = []
+    done_files: List[Dict] = []
+    delay = 1
+    attempt = 0
+    rate_limited = 0
+    while True:
+        prompt = build_files_prompt(
+            brief, attachments, previous_repo_dir,
+            skip_paths=done_paths, attachment_context=attachment_context
+        )
+        # Streams are routed but not hedged: files are written as they arrive
+        route = llm_router.route_for("files_stream", prompt)
+        parser = FileArrayStreamParser()
+        stream = None
+        usage = None
+        try:
+            async with rate_limiter.limiter.slot("files_stream", prompt, route.max_tokens) as report:
+                raw = await get_client().chat.completions.with_raw_response.create(
+                    model=route.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.2,
+                    max_tokens=route.max_tokens,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+                report.headers(raw.headers)
+                stream = raw.parse()
+                async for chunk in stream:
+                    if chunk.usage is not None:
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    # Once the array is closed only the finish and usage chunks remain
+                    if delta and not parser.finished:
+                        for f in parser.feed(delta):
+                            if f["path"] not in done_paths:
+                                done_paths.append(f["path"])
+                                done_files.append(f)
+                                yield f
+                report.usage(usage)
+            parser.close()
+            await llm_cache.put(key, json.dumps(done_files))
+            return
+
+        except Exception as e:
+            if rate_limiter.is_rate_limited(e) and rate_limited < LLM_RATE_LIMIT_RETRIES:
+                rate_limited += 1
+                metrics.record_llm_retry("files_stream")
+                continue
+            attempt += 1
+            if attempt < max_retries:
+                metrics.record_llm_retry("files_stream")
+                await asyncio.sleep(delay)
+                delay *= 2
+            elif isinstance(e, StreamParseError):
+                raise ValueError(f"LLM stream could not be parsed as JSON: {e}") from e
+            else:
+                raise e
+        finally:
+            if stream is not None:
+                metrics.record_llm_usage("files_stream", usage)
+                await stream.close()
+
 
+def build_plan_prompt(
+    brief: str,
+    attachment_context: str = None,
+    previous_repo_dir: str = None
+) -> str:
+    """Builds the short planning prompt: file manifest plus cross-file interfaces."""
+    prompt = f"""
+You are a software architect LLM planning a static web project (GitHub Pages).
+
+Brief:
+{brief}
+
+Attachments (committed under attachments/ in the repo):
+{attachment_context or "(none)"}
+"""
+    if previous_repo_dir:
+        prompt += f"\nExisting repo files: {previous_repo_dir}\nPlan the updated project.\n"
+    prompt += f"""
+Do NOT write any code yet. Return ONLY a JSON object:
+{{"files": [{{"path": "index.html", "purpose": "...", "interfaces": "element ids, functions, events or data shapes this file defines or uses from other files"}}],
+ "notes": "shared conventions every file must follow"}}
+Use at most {LLM_PLAN_MAX_FILES} files. Do not plan README.md, LICENSE or anything under attachments/.
+"""
+    return prompt
+
+
+# Written by the pipeline, never by a planned file call
+RESERVED_FILES = {"readme.md", "license"}
+RESERVED_DIRS = {"attachments", ".git"}
+
+
+def _is_reserved(path: str) -> bool:
+    parts = [p for p in path.replace("\\", "/").split("/") if p not in ("", ".")]
+    return not parts or parts[0].lower() in RESERVED_DIRS or (len(parts) == 1 and parts[0].lower() in RESERVED_FILES)
+
+
+def _escapes_repo(path: str) -> bool:
+    norm = path.replace("\\", "/")
+    return norm.startswith("/") or (len(norm) > 1 and norm[1] == ":") or ".." in norm.split("/")
+
+
+def _validate_plan(plan) -> Dict:
+    if not isinstance(plan, dict) or not isinstance(plan.get("files"), list) or not plan["files"]:
+        raise ValueError("Plan must be an object with a non-empty 'files' array")
+    seen, files = set(), []
+    for f in plan["files"]:
+        if not isinstance(f, dict) or not isinstance(f.get("path"), str) or not f["path"]:
+            raise ValueError(f"Invalid plan entry: {f!r}")
+        if f["path"] in seen:
+            raise ValueError(f"Duplicate path in plan: {f['path']}")
+        seen.add(f["path"])
+        # The user's attachments, README.md and LICENSE must not be regenerated
+        if _is_reserved(f["path"]):
+            log.debug("🗺️ Dropping reserved path from the plan: %s", f["path"])
+            continue
+        # safe_repo_path would refuse these when the file is written, failing the generation
+        if _escapes_repo(f["path"]):
+            log.warning("⚠️ Dropping path outside the repo from the plan: %s", f["path"])
+            continue
+        files.append(f)
+    if not files:
+        raise ValueError("Plan contains no generatable files")
+    plan["files"] = files[:LLM_PLAN_MAX_FILES]
+    return plan
+
+
+async def plan_files_from_brief(
+    brief: str,
+    attachment_context: str = None,
+    previous_repo_dir: str = None,
+    max_retries: int = 3
+) -> Dict:
+    """
+    Phase 1 of plan-then-generate: asks for the file manifest and interfaces.
+    Returns {"files": [{"path", "purpose", "interfaces"}], "notes": "..."}.
+    """
+    prompt = build_plan_prompt(brief, attachment_context, previous_repo_dir)
+
+    route = llm_router.route_for("plan", prompt)
+    key = llm_cache.cache_key(route.model, prompt, temperature=0.2, max_tokens=route.max_tokens, kind="plan")
+    cached = await llm_cache.get(key)
+    if cached is not None:
+        return json.loads(cached)
+
+    delay = 1
+    for attempt in range(max_retries):
+        try:
+            plan = await complete(
+                prompt, max_retries=1, use_cache=False, call="plan",
+                parse=lambda text: _validate_plan(_parse_json_reply(text, "{", "}"))
+            )
+            await llm_cache.put(key, json.dumps(plan))
+            return plan
+
+        except Exception as e:
             if attempt < max_retries - 1:
-                time.sleep(delay)
+                metrics.record_llm_retry("plan")
+                await asyncio.sleep(delay)
                 delay *= 2
             else:
-                raise ValueError(f"LLM response could not be parsed as JSON:\n{text}") from e
+                raise ValueError(f"LLM plan could not be parsed: {e}") from e
+
+
+def build_file_prompt(
+    brief: str,
+    plan: Dict,
+    path: str,
+    attachment_context: str = None
+) -> str:
+    """Builds the phase 2 prompt for one planned file (raw content, no JSON wrapping)."""
+    return f"""
+You are a software engineer LLM writing ONE file of a static web project.
+
+Brief:
+{brief}
+
+Attachments (committed under attachments/ in the repo; load them at runtime):
+{attachment_context or "(none)"}
+
+Project plan (every file and the interfaces between them):
+{json.dumps(plan, indent=1)}
+
+Write the complete content of `{path}`. Follow the plan's interfaces exactly,
+since the other files are written separately against the same plan.
+Return ONLY the file content: no JSON, no markdown code fences, no explanations.
+"""
+
+
+def _strip_code_fence(text: str) -> str:
+    if text.startswith("```"):
+        first_newline = text.find("\n")
+        text = text[first_newline + 1:] if first_newline != -1 else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text
+
+
+def _file_content(path: str):
+    def parse(text: str) -> str:
+        content = _strip_code_fence(text)
+        if not content.strip():
+            raise ValueError(f"LLM returned an empty file for {path}")
+        return content if content.endswith("\n") else content + "\n"
+    return parse
+
+
+async def generate_planned_file(
+    brief: str,
+    plan: Dict,
+    path: str,
+    attachment_context: str = None,
+    max_tokens: int | None = None
+) -> Dict:
+    """
+    Phase 2 of plan-then-generate: one file's content in its own completion.
+    max_tokens defaults to the "file" route's limit.
+    Raises TruncatedCompletion if the file did not fit in max_tokens.
+    Returns {"path": "...", "content": "..."}.
+    """
+    prompt = build_file_prompt(brief, plan, path, attachment_context)
+    route = llm_router.route_for("file", prompt)
+    max_tokens = max_tokens or route.max_tokens
+
+    key = llm_cache.cache_key(route.model, prompt, temperature=0.2, max_tokens=max_tokens, kind="file")
+    cached = await llm_cache.get(key)
+    if cached is not None:
+        return {"path": path, "content": cached}
+
+    content = await complete(
+        prompt, max_tokens=max_tokens, max_retries=2, use_cache=False, call="file",
+        reject_truncated=True, parse=_file_content(path)
+    )
+    await llm_cache.put(key, content)
+    return {"path": path, "content": content}
+
+
+def build_edit_prompt(
+    brief: str,
+    repo_context: str,
+    attachment_context: str = None,
+    round_num: int = 2,
+    full_content_paths: List[str] = None
+) -> str:
+    """Builds the Round 2+ prompt asking for per-file edits to the existing repo."""
+    prompt = f"""
+You are a software engineer LLM updating an existing project (round {round_num}).
+
+Requested changes:
+{brief}
+
+Attachments:
+{attachment_context or "(none)"}
+
+Current repository files:
+{repo_context}
+
+Return ONLY a JSON array with one edit per file you change:
+- {{"path": "file", "diff": "<unified diff against the file shown above>"}} for changes to a shown file
+- {{"path": "file", "content": "<full new content>"}} for new files or complete rewrites
+- {{"path": "file", "delete": true}} to remove a file
+Keep diffs minimal with 3 lines of context. Do not include unchanged files.
+"""
+    if full_content_paths:
+        prompt += (
+            "\nPrevious diffs for these files did not apply; return their full "
+            f"updated 'content' instead of a diff: {', '.join(full_content_paths)}\n"
+        )
+    return prompt
+
+
+def _validate_edits(edits) -> List[Dict]:
+    if not isinstance(edits, list):
+        raise ValueError("Edits must be a JSON array")
+    for e in edits:
+        if not isinstance(e, dict) or not isinstance(e.get("path"), str):
+            raise ValueError(f"Edit is missing 'path': {e!r}")
+        if sum(k in e for k in ("diff", "content", "delete")) != 1:
+            raise ValueError(f"Edit for {e['path']} needs exactly one of diff/content/delete")
+    return edits
+
+
+async def generate_edits_from_brief(
+    brief: str,
+    repo_context: str,
+    attachment_context: str = None,
+    round_num: int = 2,
+    full_content_paths: List[str] = None,
+    max_retries: int = 3,
+    call: str = "edits"
+) -> List[Dict]:
+    """
+    Asks the LLM for edits to an existing repo instead of a full regeneration.
+    `call` labels (and routes) the request, e.g. "repair" for verification fixes.
+    Returns a list of {"path", "diff" | "content" | "delete"} dicts.
+    """
+    prompt = build_edit_prompt(brief, repo_context, attachment_context, round_num, full_content_paths)
+
+    route = llm_router.route_for(call, prompt)
+    key = llm_cache.cache_key(route.model, prompt, temperature=0.2, max_tokens=route.max_tokens, kind="edits")
+    cached = await llm_cache.get(key)
+    if cached is not None:
+        return json.loads(cached)
+
+    delay = 1
+    for attempt in range(max_retries):
+        try:
+            edits = await complete(
+                prompt, max_retries=1, use_cache=False, call=call,
+                parse=lambda text: _validate_edits(_parse_json_reply(text, "[", "]"))
+            )
+            await llm_cache.put(key, json.dumps(edits))
+            return edits
 
         except Exception as e:
             if attempt < max_retries - 1:
-                time.sleep(delay)
+                metrics.record_llm_retry(call)
+                await asyncio.sleep(delay)
                 delay *= 2
             else:
-                raise e
+                raise ValueError(f"LLM edits could not be parsed: {e}") from e
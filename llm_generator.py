@@ -4,64 +4,306 @@ llm_generator.py
 Handles project generation and professional README creation using LLM.
 """
 
-from llm_client import generate_files_from_brief
+from llm_client import (
+    generate_files_from_brief, stream_files_from_brief, generate_edits_from_brief, complete,
+    plan_files_from_brief, generate_planned_file, TruncatedCompletion
+)
+from attachment_utils import StoredAttachment, load_attachments
+from prompt_builder import build_attachment_context, build_repo_context, list_repo_files
+from utils import apply_unified_diff, PatchError
+from verifier import verify_repo
+import events
+import log
+import scheduler
 from pathlib import Path
-import base64
-import os
-from config import DEBUG_MODE
+from config import (
+    LLM_STREAMING, ROUND2_EDIT_MODE,
+    LLM_GENERATION_MODE, LLM_FILE_CONCURRENCY, VERIFY_MAX_REPAIRS,
+)
+import asyncio
 import json
 
-def generate_app_from_brief(
+async def generate_app_from_brief(
     brief: str,
     attachments_dir: Path,
     repo_dir: Path,
-    round_num: int = 1
+    round_num: int = 1,
+    attachments: list[StoredAttachment] | None = None
 ):
     """
     Generates or updates project files from a brief:
-    - Converts attachments to base64 URLs
+    - Summarizes attachments by type within ATTACHMENT_TOKEN_BUDGET
     - Calls LLM client to generate code files
-    - Writes files to repo_dir
+    - Writes files to repo_dir (each one as soon as it is streamed, if LLM_STREAMING)
+    - With LLM_GENERATION_MODE="plan", plans the files first and generates
+      each one in its own concurrent call (see generate_app_from_plan)
+    - For round_num > 1 with existing files in repo_dir (and ROUND2_EDIT_MODE),
+      asks for per-file edits and applies them instead of regenerating everything
+    Returns: list of written file paths, relative to repo_dir.
     """
 
-    # Convert attachments to base64 URLs
-    attachments = []
-    if attachments_dir.exists():
-        for f in attachments_dir.iterdir():
-            if f.is_file():
-                with open(f, "rb") as fp:
-                    b64 = base64.b64encode(fp.read()).decode()
-                mime = "application/octet-stream"
-                if f.suffix == ".csv":
-                    mime = "text/csv"
-                elif f.suffix == ".json":
-                    mime = "application/json"
-                elif f.suffix == ".md":
-                    mime = "text/markdown"
-                attachments.append({"name": f.name, "url": f"data:{mime};base64,{b64}"})
+    if attachments is None:
+        attachments = load_attachments(attachments_dir)
+    # Type-aware summaries (CSV sampling, JSON outline, ...) read from disk off the loop
+    attachment_context = await scheduler.stage("io").submit(build_attachment_context, attachments)
+
+    # Round 2+: edit the existing code instead of regenerating it
+    if round_num > 1 and ROUND2_EDIT_MODE and list_repo_files(repo_dir):
+        return await edit_app_from_brief(brief, repo_dir, attachment_context, round_num)
 
     # Previous repo for Round 2
     previous_repo_dir = repo_dir if round_num > 1 else None
 
-    # Generate project files via LLM
-    files = generate_files_from_brief(
-        brief,
-        attachments=attachments,
-        previous_repo_dir=previous_repo_dir
+    # Generate project files via LLM and write them to repo_dir
+    written = []
+    if LLM_GENERATION_MODE == "plan":
+        written = await generate_app_from_plan(brief, repo_dir, attachment_context, previous_repo_dir)
+    elif LLM_STREAMING:
+        async for file in stream_files_from_brief(
+            brief,
+            previous_repo_dir=previous_repo_dir,
+            attachment_context=attachment_context
+        ):
+            write_generated_file(repo_dir, file)
+            written.append(file["path"])
+    else:
+        files = await generate_files_from_brief(
+            brief,
+            previous_repo_dir=previous_repo_dir,
+            attachment_context=attachment_context
+        )
+        for file in files:
+            write_generated_file(repo_dir, file)
+            written.append(file["path"])
+
+    log.debug("📝 Generated %d file(s) from LLM for round %d", len(written), round_num)
+
+    return written
+
+
+async def generate_app_from_plan(
+    brief: str,
+    repo_dir: Path,
+    attachment_context: str,
+    previous_repo_dir: Path | None = None,
+    max_attempts: int = 3
+) -> list[str]:
+    """
+    Plan-then-generate:
+    - One short call returns the file manifest and the interfaces between files
+    - Every planned file is then generated concurrently in its own call and
+      written as soon as it arrives, so wall-clock time tracks the slowest file
+    - Only the files that failed are retried; a file that hit the token limit
+      is retried with twice the budget
+    Returns: list of written file paths, relative to repo_dir.
+    """
+    plan = await plan_files_from_brief(
+        brief, attachment_context=attachment_context, previous_repo_dir=previous_repo_dir
+    )
+    log.debug("🗺️ Planned %d file(s)", len(plan["files"]), files=[f["path"] for f in plan["files"]])
+
+    limit = asyncio.Semaphore(LLM_FILE_CONCURRENCY)
+    budgets = {f["path"]: None for f in plan["files"]}  # None: the "file" route's max_tokens
+
+    async def generate(path: str) -> str:
+        async with limit:
+            file = await generate_planned_file(
+                brief, plan, path, attachment_context=attachment_context, max_tokens=budgets[path]
+            )
+        write_generated_file(repo_dir, file)
+        return path
+
+    written, pending, errors = [], list(budgets), {}
+    for attempt in range(max_attempts):
+        results = await asyncio.gather(*(generate(p) for p in pending), return_exceptions=True)
+        failed = []
+        for path, result in zip(pending, results):
+            if isinstance(result, BaseException):
+                if isinstance(result, asyncio.CancelledError):
+                    raise result
+                if isinstance(result, TruncatedCompletion):
+                    budgets[path] = result.max_tokens * 2
+                errors[path] = result
+                failed.append(path)
+            else:
+                written.append(result)
+        if not failed:
+            return written
+        log.warning("⚠️ Generation failed for %s (attempt %d); retrying only those.", ", ".join(failed), attempt + 1)
+        pending = failed
+
+    raise ValueError(
+        "Could not generate: " + "; ".join(f"{p}: {errors[p]}" for p in pending)
+    )
+
+
+async def edit_app_from_brief(
+    brief: str,
+    repo_dir: Path,
+    attachment_context: str,
+    round_num: int
+) -> list[str]:
+    """
+    Round 2 edit mode:
+    - Sends the most relevant existing files (within REPO_CONTEXT_TOKEN_BUDGET)
+    - Applies the returned diffs / full contents / deletions locally
+    - Files whose diff does not apply are requested once more as full content
+    Returns: list of changed file paths, relative to repo_dir.
+    """
+    io_stage = scheduler.stage("io")
+    repo_context, _ = await io_stage.submit(build_repo_context, repo_dir, brief)
+    edits = await generate_edits_from_brief(
+        brief, repo_context, attachment_context=attachment_context, round_num=round_num
+    )
+    changed, failed = apply_edits(repo_dir, edits)
+
+    if failed:
+        log.warning("⚠️ Diffs did not apply for %s; requesting full content.", ", ".join(failed))
+        repo_context, _ = await io_stage.submit(build_repo_context, repo_dir, brief, only=failed)
+        edits = await generate_edits_from_brief(
+            brief, repo_context, attachment_context=attachment_context,
+            round_num=round_num, full_content_paths=failed
+        )
+        retried, still_failed = apply_edits(repo_dir, edits)
+        changed += [p for p in retried if p not in changed]
+        if still_failed:
+            raise ValueError(f"Could not apply LLM edits to: {', '.join(still_failed)}")
+
+    log.debug("📝 Applied LLM edits to %d file(s) for round %d", len(changed), round_num)
+    return changed
+
+
+async def verify_and_repair(
+    brief: str,
+    repo_dir: Path,
+    attachments_dir: Path,
+    checks: list | None = None,
+    round_num: int = 1,
+    attachments: list[StoredAttachment] | None = None,
+    max_repairs: int = VERIFY_MAX_REPAIRS
+) -> dict:
+    """
+    Pre-push verification:
+    - Checks the repo on a local static server (verifier.verify_repo, off the loop)
+    - Regenerates only the files with problems, telling the LLM what is wrong
+    - Repeats up to max_repairs times; problems that remain are returned, not raised
+    Returns: the last verification report as a dict, plus the repaired paths.
+    """
+    io_stage = scheduler.stage("io")
+    report = await io_stage.submit(verify_repo, repo_dir, checks)
+    repaired = []
+    for attempt in range(max_repairs):
+        if report.ok:
+            break
+        failing = report.failing_files()
+        log.info("🔎 Verification found problems in %s; regenerating those files.", ", ".join(failing))
+        try:
+            changed = await scheduler.run_async_in_stage(
+                "llm", repair_files(brief, repo_dir, attachments_dir, failing, round_num, attachments)
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("⚠️ Repair attempt %d failed: %s", attempt + 1, e)
+            break
+        repaired += [p for p in changed if p not in repaired]
+        report = await io_stage.submit(verify_repo, repo_dir, checks)
+
+    if not report.ok:
+        log.warning("⚠️ Pushing with %d unresolved verification problem(s).", len(report.problems))
+    result = report.to_dict()
+    result["repaired"] = repaired
+    return result
+
+
+async def repair_files(
+    brief: str,
+    repo_dir: Path,
+    attachments_dir: Path,
+    failing: dict[str, list[str]],
+    round_num: int = 1,
+    attachments: list[StoredAttachment] | None = None
+) -> list[str]:
+    """
+    Asks for edits that fix the given {path: [problems]} and applies only
+    those to the failing files (or to files that do not exist yet, such as a
+    referenced asset the first pass forgot).
+    Returns: list of changed file paths, relative to repo_dir.
+    """
+    if attachments is None:
+        attachments = load_attachments(attachments_dir)
+    io_stage = scheduler.stage("io")
+    attachment_context = await io_stage.submit(build_attachment_context, attachments)
+    problems = "\n".join(f"- {path}: {message}" for path, messages in failing.items() for message in messages)
+    repair_brief = (
+        f"{brief}\n\nLocal verification of the generated site found these problems. "
+        f"Fix them, changing only the files listed:\n{problems}"
     )
+    repo_context, _ = await io_stage.submit(build_repo_context, repo_dir, repair_brief)
+    edits = await generate_edits_from_brief(
+        repair_brief, repo_context, attachment_context=attachment_context, round_num=round_num, call="repair"
+    )
+    allowed = [
+        e for e in edits
+        if e["path"] in failing
+        or not e.get("delete") and not e["path"].startswith("attachments/") and not (repo_dir / e["path"]).exists()
+    ]
+    changed, failed = apply_edits(repo_dir, allowed)
+    if failed:
+        log.debug("⚠️ Repair diffs did not apply for %s", ", ".join(failed))
+    return changed
 
-    # Write files to repo_dir
-    for file in files:
-        file_path = repo_dir / file["path"]
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(file_path, "w", encoding="utf-8") as fp:
-            fp.write(file["content"])
 
-    if DEBUG_MODE:
-        print(f"📝 Generated {len(files)} file(s) from LLM for round {round_num}")
+def apply_edits(repo_dir: Path, edits: list[dict]) -> tuple[list[str], list[str]]:
+    """
+    Applies {"path", "diff" | "content" | "delete"} edits under repo_dir.
+    Returns: (changed paths, paths whose diff failed to apply).
+    """
+    changed, failed = [], []
+    for edit in edits:
+        rel = edit["path"]
+        path = safe_repo_path(repo_dir, rel)
+        if edit.get("delete"):
+            if path.exists():
+                path.unlink()
+                changed.append(rel)
+        elif "content" in edit:
+            write_generated_file(repo_dir, edit)
+            changed.append(rel)
+        else:
+            try:
+                original = path.read_text(encoding="utf-8") if path.exists() else ""
+                patched = apply_unified_diff(original, edit["diff"])
+            except (PatchError, UnicodeDecodeError) as e:
+                log.debug("⚠️ Patch for %s failed: %s", rel, e)
+                failed.append(rel)
+                continue
+            write_generated_file(repo_dir, {"path": rel, "content": patched})
+            changed.append(rel)
+    return changed, failed
 
 
-def generate_readme_for_repo(
+def safe_repo_path(repo_dir: Path, rel: str) -> Path:
+    """Resolves an LLM-supplied path, refusing anything outside repo_dir."""
+    path = (repo_dir / rel).resolve()
+    if not path.is_relative_to(repo_dir.resolve()) or ".git" in Path(rel).parts:
+        raise ValueError(f"Refusing to write outside the repo: {rel}")
+    return path
+
+
+def write_generated_file(repo_dir: Path, file: dict):
+    """Writes one {"path", "content"} file produced by the LLM under repo_dir."""
+    file_path = safe_repo_path(repo_dir, file["path"])
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    # Attachments are hard links into the shared blob store: replace, never write through
+    if file_path.exists() and file_path.stat().st_nlink > 1:
+        file_path.unlink()
+    with open(file_path, "w", encoding="utf-8") as fp:
+        fp.write(file["content"])
+    events.publish_current("file", path=file["path"], bytes=len(file["content"]))
+
+
+async def generate_readme_for_repo(
     brief: str,
     attachments_dir: Path,
     round_num: int = 1,
@@ -103,18 +345,8 @@ Existing README content:
 """
 
     # Call LLM to generate README
-    from llm_client import client  # OpenAI client
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.2,
-        max_tokens=1500
-    )
-
-    readme_text = response.choices[0].message.content.strip()
+    readme_text = await complete(prompt, call="readme")
 
-    if DEBUG_MODE:
-        print("📝 LLM README output:")
-        print(readme_text[:1000] + ("..." if len(readme_text) > 1000 else ""))
+    log.debug("📝 LLM README output", text=readme_text)
 
     return readme_text
@@ -0,0 +1,175 @@
+"""
+llm_router.py
+-------------
+Chooses the model and max_tokens for each LLM call and hedges slow calls.
+
+route_for(call, prompt) looks up the call type ("plan", "file", "edits",
+"readme", ...) in the deployment's routes (LLM_ROUTES merged over
+DEFAULT_ROUTES) and, when the route has tiers, picks the largest tier whose
+min_prompt_tokens the prompt reaches.
+
+run_hedged(route, attempt) runs attempt(model); once the call has taken
+longer than the route's hedge percentile of recent latencies, a second
+attempt starts (on hedge_model, if set) and the first one to return
+without raising wins. Which route, model and attempt won is counted in
+metrics and on the current task's trace.
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, TypeVar
+
+from config import (
+    LLM_DEFAULT_MODEL, LLM_ROUTES, LLM_FILE_MAX_TOKENS, LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES,
+)
+from prompt_builder import estimate_tokens
+import metrics
+
+T = TypeVar("T")
+
+# Recent latencies kept per route for the hedge threshold
+LATENCY_WINDOW = 200
+
+DEFAULT_ROUTES = {
+    "default": {"max_tokens": 1500},
+    "files": {"max_tokens": 2500},
+    "files_stream": {"max_tokens": 2500},
+    "edits": {"max_tokens": 2500},
+    "repair": {"max_tokens": 4000},
+    "plan": {"max_tokens": 800},
+    "file": {"max_tokens": LLM_FILE_MAX_TOKENS},
+    "readme": {"max_tokens": 1500},
+}
+
+ROUTE_WINS = metrics.Counter(
+    "llm_route_wins_total", "Completed LLM calls by route, model and winning attempt.", ("route", "model", "via")
+)
+HEDGES = metrics.Counter("llm_hedges_total", "Hedge requests sent, by route.", ("route",))
+metrics.METRICS += [ROUTE_WINS, HEDGES]
+
+
+@dataclass(frozen=True)
+class Route:
+    name: str  # call type, plus "@<min_prompt_tokens>" for a size tier
+    model: str
+    max_tokens: int
+    hedge_percentile: float = LLM_HEDGE_PERCENTILE
+    hedge_model: str | None = None
+
+
+def _load_routes(spec: str) -> dict:
+    """LLM_ROUTES: inline JSON or a path to a JSON file; per-call fields merge over the defaults."""
+    routes = {call: dict(fields) for call, fields in DEFAULT_ROUTES.items()}
+    if not spec.strip():
+        return routes
+    text = spec if spec.lstrip().startswith("{") else Path(spec).read_text()
+    overrides = json.loads(text)
+    if not isinstance(overrides, dict):
+        raise ValueError("LLM_ROUTES must be a JSON object keyed by call type")
+    for call, fields in overrides.items():
+        if not isinstance(fields, dict):
+            raise ValueError(f"LLM_ROUTES[{call!r}] must be an object")
+        routes.setdefault(call, {}).update(fields)
+    return routes
+
+
+ROUTES = _load_routes(LLM_ROUTES)
+
+
+def _make_route(name: str, fields: dict) -> Route:
+    return Route(
+        name=name,
+        model=fields.get("model", LLM_DEFAULT_MODEL),
+        max_tokens=int(fields.get("max_tokens", DEFAULT_ROUTES["default"]["max_tokens"])),
+        hedge_percentile=float(fields.get("hedge_percentile", LLM_HEDGE_PERCENTILE)),
+        hedge_model=fields.get("hedge_model"),
+    )
+
+
+def route_for(call: str, prompt: str) -> Route:
+    """The route for one call: its call type's fields, overridden by the matching size tier."""
+    base = {**ROUTES["default"], **ROUTES.get(call, {})}
+    tiers = base.pop("tiers", None) or []
+    prompt_tokens = estimate_tokens(prompt)
+    eligible = [t for t in tiers if prompt_tokens >= int(t.get("min_prompt_tokens", 0))]
+    if not eligible:
+        return _make_route(call, base)
+    tier = max(eligible, key=lambda t: int(t.get("min_prompt_tokens", 0)))
+    fields = {**base, **{k: v for k, v in tier.items() if k != "min_prompt_tokens"}}
+    return _make_route(f"{call}@{int(tier.get('min_prompt_tokens', 0))}", fields)
+
+
+# ---------------------------------------------------------------------
+# Hedging
+# ---------------------------------------------------------------------
+_latencies: dict[str, deque] = {}
+
+
+def hedge_after(route: Route) -> float | None:
+    """Seconds after which a call on `route` is hedged, or None if it is not (yet)."""
+    if not 0 < route.hedge_percentile < 1:
+        return None
+    samples = _latencies.get(route.name)
+    if samples is None or len(samples) < LLM_HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(route.hedge_percentile * len(ordered)))]
+
+
+def _record_win(route: Route, model: str, via: str, elapsed: float):
+    _latencies.setdefault(route.name, deque(maxlen=LATENCY_WINDOW)).append(elapsed)
+    ROUTE_WINS.inc(route.name, model, via)
+    trace = metrics.current_trace()
+    if trace is not None:
+        routes = trace.llm.setdefault("routes", {})
+        label = f"{route.name}:{model}:{via}"
+        routes[label] = routes.get(label, 0) + 1
+
+
+async def run_hedged(route: Route, attempt: Callable[[str], Awaitable[T]]) -> T:
+    """
+    Runs attempt(route.model), adding attempt(hedge model) if it outlives the
+    route's hedge threshold. Returns the first result; raises only if every
+    attempt failed (the last error). The losing attempt is cancelled.
+    """
+    start = time.monotonic()
+    threshold = hedge_after(route)
+    if threshold is None:
+        result = await attempt(route.model)
+        _record_win(route, route.model, "primary", time.monotonic() - start)
+        return result
+
+    hedge_model = route.hedge_model or route.model
+    primary = asyncio.create_task(attempt(route.model))
+    attempts = {primary: (route.model, "primary")}
+    pending = {primary}
+    error = None
+    try:
+        done, pending = await asyncio.wait(pending, timeout=threshold)
+        if not done:
+            HEDGES.inc(route.name)
+            trace = metrics.current_trace()
+            if trace is not None:
+                trace.llm["hedges"] = trace.llm.get("hedges", 0) + 1
+            hedge = asyncio.create_task(attempt(hedge_model))
+            attempts[hedge] = (hedge_model, "hedge")
+            pending.add(hedge)
+        while True:
+            for task in done:
+                if task.exception() is None:
+                    model, via = attempts[task]
+                    _record_win(route, model, via, time.monotonic() - start)
+                    return task.result()
+                error = task.exception()
+            if not pending:
+                raise error
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
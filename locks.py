@@ -0,0 +1,136 @@
+"""
+locks.py
+--------
+Cross-process coordination for running several uvicorn workers.
+
+- Task leases: a row per `email:task:round` key in the job database says
+  which worker is processing it and until when. Only the lease holder runs
+  the pipeline; it renews the lease while working, and if it dies the lease
+  expires so another worker can take the job over.
+- Repo locks: an fcntl file lock per repo name serializes mirror/push git
+  operations across workers and threads.
+"""
+
+import asyncio
+import fcntl
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from uuid import uuid4
+
+from config import JOB_DB_PATH, LEASE_TTL_SECONDS, LOCK_DIR
+import log
+
+# Unique per process, so a restarted worker never mistakes an old lease for its own
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    key        TEXT PRIMARY KEY,
+    owner      TEXT NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+
+_lock = threading.Lock()
+_conn: sqlite3.Connection | None = None
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        JOB_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(JOB_DB_PATH, check_same_thread=False, isolation_level=None, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(_SCHEMA)
+        _conn = conn
+    return _conn
+
+
+# ---------------------------------------------------------------------
+# Task leases
+# ---------------------------------------------------------------------
+def acquire_lease(key: str, ttl: float = LEASE_TTL_SECONDS) -> bool:
+    """Take the lease for `key` if it is free, expired or already ours."""
+    now = time.time()
+    with _lock:
+        cur = _db().execute(
+            """
+            INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE leases.expires_at < ? OR leases.owner = excluded.owner
+            """,
+            (key, WORKER_ID, now + ttl, now),
+        )
+    return cur.rowcount == 1
+
+
+def renew_lease(key: str, ttl: float = LEASE_TTL_SECONDS) -> bool:
+    """Extend our lease; False if it expired and was taken by another worker."""
+    with _lock:
+        cur = _db().execute(
+            "UPDATE leases SET expires_at = ? WHERE key = ? AND owner = ?",
+            (time.time() + ttl, key, WORKER_ID),
+        )
+    return cur.rowcount == 1
+
+
+def release_lease(key: str):
+    with _lock:
+        _db().execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, WORKER_ID))
+
+
+def lease_holder(key: str) -> str | None:
+    """Worker currently holding an unexpired lease on `key`, if any."""
+    with _lock:
+        row = _db().execute(
+            "SELECT owner FROM leases WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+    return row[0] if row else None
+
+
+async def keep_lease(key: str, task: asyncio.Task, ttl: float = LEASE_TTL_SECONDS):
+    """
+    Renew the lease on `key` every ttl/3 seconds while `task` runs. If the lease
+    is lost, `task` is cancelled so two workers never run the same job.
+    """
+    while True:
+        await asyncio.sleep(ttl / 3)
+        if not renew_lease(key, ttl):
+            log.warning("⚠️ Lost the lease on %s; stopping this worker's run.", key)
+            task.cancel()
+            return
+
+
+# ---------------------------------------------------------------------
+# Per-repo git locks
+# ---------------------------------------------------------------------
+@contextmanager
+def repo_lock(repo_name: str):
+    """Exclusive lock on `repo_name` across processes (blocks until acquired)."""
+    LOCK_DIR.mkdir(parents=True, exist_ok=True)
+    with open(LOCK_DIR / f"{repo_name}.lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextmanager
+def try_repo_lock(repo_name: str):
+    """Like repo_lock, but yields False at once instead of waiting if another holder has it."""
+    LOCK_DIR.mkdir(parents=True, exist_ok=True)
+    with open(LOCK_DIR / f"{repo_name}.lock", "w") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,179 @@
+"""
+metrics.py
+----------
+Per-stage latency/cost instrumentation and Prometheus text exposition.
+
+- span(stage) times a pipeline stage: it feeds the stage-duration histogram
+  and the current task's trace (kept in a contextvar, so spans and LLM usage
+  recorded deep inside llm_client land on the right task).
+- record_llm_usage / record_llm_retry count tokens and retries per LLM call.
+- render() produces the text served on /metrics.
+"""
+
+import contextvars
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _fmt_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_value(v) -> str:
+    return str(v) if isinstance(v, int) else format(v, "g")
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        with _lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, v in sorted(self._values.items()):
+            lines.append(f"{self.name}{_fmt_labels(self.labels, values)} {_fmt_value(v)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._series: dict[tuple, list] = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *label_values):
+        with _lock:
+            series = self._series.setdefault(label_values, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, series in sorted(self._series.items()):
+            for bound, count in zip(self.buckets, series):
+                le = _fmt_labels(self.labels, values, 'le="%g"' % bound)
+                lines.append(f"{self.name}_bucket{le} {count}")
+            le = _fmt_labels(self.labels, values, 'le="+Inf"')
+            plain = _fmt_labels(self.labels, values)
+            lines.append(f"{self.name}_bucket{le} {series[-1]}")
+            lines.append(f"{self.name}_sum{plain} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{plain} {series[-1]}")
+        return lines
+
+
+def gauge_lines(name: str, help: str, samples: dict) -> list[str]:
+    """Render a gauge from {label-string: value}; use "" as the key for no labels."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    for labels, v in samples.items():
+        lines.append(f"{name}{labels} {_fmt_value(v)}")
+    return lines
+
+
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_duration_seconds", "Wall-clock time spent in each pipeline stage.", ("stage",)
+)
+TASKS = Counter("pipeline_tasks_total", "Finished tasks by outcome.", ("outcome",))
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens used, by call and token kind.", ("call", "kind"))
+LLM_REQUESTS = Counter("llm_requests_total", "LLM API requests by call.", ("call",))
+LLM_RETRIES = Counter("llm_retries_total", "LLM attempts that were retried, by call.", ("call",))
+
+METRICS = [STAGE_SECONDS, TASKS, LLM_REQUESTS, LLM_TOKENS, LLM_RETRIES]
+
+
+# ---------------------------------------------------------------------
+# Per-task traces
+# ---------------------------------------------------------------------
+class Trace:
+    """Timed spans and LLM usage for one task."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.started = time.time()
+        self.timings: dict[str, float] = {}
+        self.llm = {"prompt_tokens": 0, "completion_tokens": 0, "requests": 0, "retries": 0}
+
+    def summary(self) -> dict:
+        return {
+            "key": self.key,
+            "total_seconds": round(time.time() - self.started, 3),
+            "timings": self.timings,
+            "llm": self.llm,
+        }
+
+
+_current: contextvars.ContextVar[Trace | None] = contextvars.ContextVar("trace", default=None)
+
+
+def start_trace(key: str, timings: dict | None = None) -> Trace:
+    """Begin (or, after a restart, continue) the trace for the current task."""
+    trace = Trace(key)
+    trace.timings.update(timings or {})
+    _current.set(trace)
+    return trace
+
+
+def current_trace() -> Trace | None:
+    return _current.get()
+
+
+@contextmanager
+def span(stage: str):
+    """Time a pipeline stage for both the histogram and the current task's trace."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage)
+        trace = _current.get()
+        if trace is not None:
+            trace.timings[stage] = round(trace.timings.get(stage, 0) + elapsed, 3)
+
+
+def record_llm_usage(call: str, usage):
+    """Count one LLM request and its token usage (an OpenAI `usage` object or None)."""
+    LLM_REQUESTS.inc(call)
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    LLM_TOKENS.inc(call, "prompt", amount=prompt)
+    LLM_TOKENS.inc(call, "completion", amount=completion)
+    trace = _current.get()
+    if trace is not None:
+        trace.llm["requests"] += 1
+        trace.llm["prompt_tokens"] += prompt
+        trace.llm["completion_tokens"] += completion
+
+
+def record_llm_retry(call: str):
+    LLM_RETRIES.inc(call)
+    trace = _current.get()
+    if trace is not None:
+        trace.llm["retries"] += 1
+
+
+def peak_rss_bytes() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def render(extra: list[str] | None = None) -> str:
+    lines = []
+    for m in METRICS:
+        lines.extend(m.render())
+    lines.extend(gauge_lines("process_peak_rss_bytes", "Peak resident set size.", {"": peak_rss_bytes()}))
+    lines.extend(extra or [])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,41 @@
+"""
+models.py
+---------
+Typed request models for /api-endpoint.
+
+TaskRequest is validated from the scalar fields of the body only; its
+attachments are filled in after ingest.py has streamed them into the
+attachment store, so the model never carries base64 data.
+"""
+
+from typing import Any
+
+from pydantic import BaseModel, ConfigDict
+
+
+class AttachmentRef(BaseModel):
+    """An ingested attachment: its original name and blob in the attachment store."""
+    name: str
+    sha256: str
+    mime: str
+    size: int
+
+
+class TaskRequest(BaseModel):
+    # Unknown fields are kept (and stored with the job) rather than rejected
+    model_config = ConfigDict(extra="allow")
+
+    email: str
+    secret: str
+    task: str
+    round: int = 1
+    nonce: str | None = None
+    brief: str = ""
+    checks: list[Any] = []
+    evaluation_url: str
+    attachments: list[AttachmentRef] = []
+
+    @property
+    def key(self) -> str:
+        """Deduplication key: one job per email, task and round."""
+        return f"{self.email}:{self.task}:{self.round}"
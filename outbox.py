@@ -0,0 +1,312 @@
+"""
+outbox.py
+---------
+Durable outbox for evaluation-API notifications.
+
+Every evaluator POST is first written to an SQLite table (same database as the
+job store) and then delivered in the background through a shared keep-alive
+httpx client, with a concurrency cap per evaluation host. Failed deliveries
+are retried with jittered exponential backoff, across restarts, until
+OUTBOX_MAX_AGE_SECONDS has passed. A slow or down evaluator therefore never
+holds a pipeline worker.
+
+Each claimed row is delivered by its own task, and the loop keeps claiming
+while this worker has room, so a slow host only delays its own rows (and only
+a few of them are claimed at a time). Claims of rows still queued or in
+flight are renewed, so another worker never re-sends them.
+"""
+
+import asyncio
+import json
+import random
+import sqlite3
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from config import (
+    JOB_DB_PATH, JOB_TTL_SECONDS,
+    OUTBOX_PER_HOST_CONCURRENCY, OUTBOX_MAX_AGE_SECONDS, OUTBOX_BACKOFF_MAX,
+)
+import events
+import log
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_key         TEXT,
+    url             TEXT NOT NULL,
+    payload         TEXT NOT NULL,
+    status          TEXT NOT NULL DEFAULT 'pending',
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error      TEXT,
+    created_at      REAL NOT NULL,
+    updated_at      REAL NOT NULL
+)
+"""
+
+# A claimed row is not picked up by another worker for this long; the claim
+# is renewed every RENEW_SECONDS while the row is queued or in flight
+CLAIM_SECONDS = 60
+RENEW_SECONDS = CLAIM_SECONDS / 3
+# Rows one worker has queued or in flight at once, overall and per host
+MAX_IN_FLIGHT = 100
+HOST_QUEUE = 2 * OUTBOX_PER_HOST_CONCURRENCY
+# Due rows looked at per claim (rows of saturated hosts are skipped)
+SCAN_LIMIT = 500
+
+_lock = threading.Lock()
+_conn: sqlite3.Connection | None = None
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        JOB_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(JOB_DB_PATH, check_same_thread=False, isolation_level=None, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(_SCHEMA)
+        conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+        _conn = conn
+    return _conn
+
+
+def _backoff(attempts: int) -> float:
+    """Exponential backoff with +/-50% jitter, capped at OUTBOX_BACKOFF_MAX."""
+    return min(OUTBOX_BACKOFF_MAX, 2 ** attempts) * random.uniform(0.5, 1.5)
+
+
+class Outbox:
+    def __init__(self):
+        self._client = None  # httpx.AsyncClient, built on first delivery
+        self._task: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._host_limits: dict[str, asyncio.Semaphore] = {}
+        self._inflight: dict[int, str] = {}  # claimed row id -> host
+        self._deliveries: set[asyncio.Task] = set()
+
+    # ----------------------------------------------------------------
+    # Producer side
+    # ----------------------------------------------------------------
+    def enqueue(self, url: str, payload: dict, job_key: str | None = None) -> int:
+        """Persist a notification; it is delivered in the background."""
+        now = time.time()
+        with _lock:
+            cur = _db().execute(
+                "INSERT INTO outbox (job_key, url, payload, next_attempt_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_key, url, json.dumps(payload), now, now, now),
+            )
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return cur.lastrowid
+
+    def backlog(self, limit: int = 50) -> dict:
+        """Counts per status plus the oldest pending deliveries."""
+        with _lock:
+            db = _db()
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            rows = db.execute(
+                "SELECT id, job_key, url, attempts, next_attempt_at, last_error, created_at "
+                "FROM outbox WHERE status = 'pending' ORDER BY created_at LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return {
+            "pending": counts.get("pending", 0),
+            "delivered": counts.get("delivered", 0),
+            "dead": counts.get("dead", 0),
+            "oldest_pending": [dict(r) for r in rows],
+        }
+
+    def for_job(self, job_key: str) -> dict | None:
+        """Delivery state of the latest notification queued for a job, if any."""
+        with _lock:
+            row = _db().execute(
+                "SELECT status, attempts, last_error, updated_at FROM outbox WHERE job_key = ? "
+                "ORDER BY id DESC LIMIT 1",
+                (job_key,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    # ----------------------------------------------------------------
+    # Delivery side
+    # ----------------------------------------------------------------
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        # Cancelled rows stay pending and are claimable again once their claim expires
+        for task in list(self._deliveries):
+            task.cancel()
+        self._deliveries.clear()
+        self._inflight.clear()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _http(self):
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(timeout=15)
+        return self._client
+
+    def _claim_due(self) -> list[sqlite3.Row]:
+        """Claims due rows up to this worker's free capacity, skipping hosts that already have HOST_QUEUE rows."""
+        capacity = MAX_IN_FLIGHT - len(self._inflight)
+        if capacity <= 0:
+            return []
+        queued = Counter(self._inflight.values())
+        now = time.time()
+        with _lock:
+            db = _db()
+            # IMMEDIATE takes the write lock up front, so two workers never claim the same rows
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                due = db.execute(
+                    "SELECT * FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? "
+                    "ORDER BY next_attempt_at LIMIT ?",
+                    (now, SCAN_LIMIT),
+                ).fetchall()
+                rows = []
+                for r in due:
+                    host = urlsplit(r["url"]).netloc
+                    if r["id"] in self._inflight or queued[host] >= HOST_QUEUE:
+                        continue
+                    queued[host] += 1
+                    rows.append(r)
+                    if len(rows) >= capacity:
+                        break
+                if rows:
+                    db.executemany(
+                        "UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                        [(now + CLAIM_SECONDS, r["id"]) for r in rows],
+                    )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        return rows
+
+    def _renew_claims(self):
+        """Pushes back the claim expiry of every row this worker still has queued or in flight."""
+        ids = list(self._inflight)
+        if not ids:
+            return
+        with _lock:
+            _db().execute(
+                f"UPDATE outbox SET next_attempt_at = ? WHERE status = 'pending' AND id IN ({','.join('?' * len(ids))})",
+                (time.time() + CLAIM_SECONDS, *ids),
+            )
+
+    def _next_due_in(self) -> float | None:
+        with _lock:
+            row = _db().execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'"
+            ).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    async def _run(self):
+        renewed = time.monotonic()
+        while True:
+            try:
+                if self._inflight and time.monotonic() - renewed >= RENEW_SECONDS:
+                    self._renew_claims()
+                    renewed = time.monotonic()
+                rows = self._claim_due()
+                for row in rows:
+                    self._inflight[row["id"]] = urlsplit(row["url"]).netloc
+                    task = asyncio.create_task(self._deliver(row))
+                    self._deliveries.add(task)
+                    task.add_done_callback(self._delivery_done)
+                if rows:
+                    continue
+                self._evict_delivered()
+                delay = self._next_due_in()
+                if self._inflight:
+                    # Each finished delivery wakes the loop; otherwise claims are renewed
+                    # and due rows of saturated hosts looked at again within 1..RENEW_SECONDS
+                    delay = min(max(delay or 0.0, 1.0), RENEW_SECONDS)
+            except Exception as e:
+                log.warning("⚠️ Outbox loop error: %s", e)
+                delay = 5
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _delivery_done(self, task: asyncio.Task):
+        self._deliveries.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("❌ Outbox delivery crashed: %s", task.exception())
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _deliver(self, row: sqlite3.Row):
+        try:
+            await self._post(row)
+        finally:
+            # Same loop iteration as the final UPDATE, so a renewal never overwrites it
+            self._inflight.pop(row["id"], None)
+
+    async def _post(self, row: sqlite3.Row):
+        host = urlsplit(row["url"]).netloc
+        limit = self._host_limits.setdefault(host, asyncio.Semaphore(OUTBOX_PER_HOST_CONCURRENCY))
+        error = None
+        async with limit:
+            try:
+                log.debug("📤 POST → %s (attempt %d)", row["url"], row["attempts"] + 1, job=row["job_key"])
+                r = await self._http().post(
+                    row["url"],
+                    content=row["payload"],
+                    headers={"Content-Type": "application/json"},
+                )
+                if r.status_code != 200:
+                    error = f"HTTP {r.status_code}: {r.text[:200]}"
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+
+        now = time.time()
+        attempts = row["attempts"] + 1
+        with _lock:
+            db = _db()
+            if error is None:
+                db.execute(
+                    "UPDATE outbox SET status = 'delivered', attempts = ?, last_error = NULL, updated_at = ? WHERE id = ?",
+                    (attempts, now, row["id"]),
+                )
+                log.info("✅ Evaluation API acknowledged %s.", row["job_key"])
+                if row["job_key"]:
+                    events.publish(row["job_key"], "notified", attempts=attempts)
+            elif now - row["created_at"] > OUTBOX_MAX_AGE_SECONDS:
+                db.execute(
+                    "UPDATE outbox SET status = 'dead', attempts = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                    (attempts, error, now, row["id"]),
+                )
+                log.error("❌ Giving up notifying for %s: %s", row["job_key"], error)
+            else:
+                db.execute(
+                    "UPDATE outbox SET attempts = ?, last_error = ?, next_attempt_at = ?, updated_at = ? WHERE id = ?",
+                    (attempts, error, now + _backoff(attempts), now, row["id"]),
+                )
+                log.warning("⚠️ Notify attempt %d for %s failed: %s", attempts, row["job_key"], error)
+
+    def _evict_delivered(self):
+        with _lock:
+            _db().execute(
+                "DELETE FROM outbox WHERE status IN ('delivered', 'dead') AND updated_at < ?",
+                (time.time() - JOB_TTL_SECONDS,),
+            )
+
+
+outbox = Outbox()
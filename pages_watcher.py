@@ -0,0 +1,176 @@
+"""
+pages_watcher.py
+----------------
+One shared async watcher for GitHub Pages deployments.
+
+Callers register a pages URL (plus repo and pushed commit when known) and
+await a future. A single background task polls every pending deployment
+through one pooled httpx client with per-deployment adaptive backoff, so
+hundreds of concurrent deployments cost one poller instead of hundreds of
+sleeping threads.
+
+A deployment is ready when the Pages build API reports a finished build for
+the pushed commit and the site answers 200. Without a commit (or token), or
+when the build API is not usable (no Pages read scope, or a site deployed by
+Actions), the watcher falls back to waiting for a 200 from the URL.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+from config import (
+    GITHUB_USERNAME, GITHUB_TOKEN, GITHUB_API_URL,
+    PAGES_CONCURRENCY, PAGES_TIMEOUT, PAGES_POLL_MIN, PAGES_POLL_MAX,
+)
+
+
+@dataclass
+class _Watch:
+    url: str
+    repo_name: str | None
+    commit_sha: str | None
+    deadline: float
+    interval: float = PAGES_POLL_MIN
+    next_check: float = 0.0
+    build_confirmed: bool = False
+    builds_api: bool = True  # False once the build API answered without a usable build
+    waiters: list = field(default_factory=list)
+
+
+class PagesWatcher:
+    def __init__(self):
+        self._watches: dict[tuple, _Watch] = {}
+        self._client = None  # httpx.AsyncClient, built on the first wait()
+        self._task: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+
+    def _ensure_running(self):
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                timeout=10,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=PAGES_CONCURRENCY),
+            )
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def wait(
+        self,
+        pages_url: str,
+        repo_name: str | None = None,
+        commit_sha: str | None = None,
+        timeout: float = PAGES_TIMEOUT
+    ) -> bool:
+        """Resolves True once the deployment is live, False on timeout or failed build."""
+        self._ensure_running()
+        sha = commit_sha if commit_sha and commit_sha != "N/A" else None
+        key = (pages_url, sha)
+        watch = self._watches.get(key)
+        if watch is None:
+            watch = _Watch(pages_url, repo_name, sha, deadline=time.monotonic() + timeout)
+            self._watches[key] = watch
+        else:
+            watch.deadline = max(watch.deadline, time.monotonic() + timeout)
+        future = asyncio.get_running_loop().create_future()
+        watch.waiters.append(future)
+        self._wakeup.set()
+        return await future
+
+    def pending(self) -> int:
+        return len(self._watches)
+
+    async def _run(self):
+        while True:
+            if not self._watches:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            due = [w for w in self._watches.values() if w.next_check <= now]
+            if due:
+                await asyncio.gather(*(self._check(w) for w in due))
+
+            if self._watches:
+                delay = min(w.next_check for w in self._watches.values()) - time.monotonic()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.05, delay))
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _check(self, watch: _Watch):
+        try:
+            result = await self._probe(watch)
+        except Exception:
+            result = None
+
+        if result is None and time.monotonic() >= watch.deadline:
+            result = False
+        if result is None:
+            # Adaptive backoff: poll fast right after a push, slower as it drags on
+            watch.next_check = time.monotonic() + watch.interval
+            watch.interval = min(watch.interval * 1.5, PAGES_POLL_MAX)
+            return
+
+        self._watches.pop((watch.url, watch.commit_sha), None)
+        for future in watch.waiters:
+            if not future.done():
+                future.set_result(result)
+
+    async def _probe(self, watch: _Watch) -> bool | None:
+        """True = live, False = build failed, None = not ready yet."""
+        use_builds = watch.commit_sha and watch.repo_name and GITHUB_TOKEN and watch.builds_api
+        if use_builds and not watch.build_confirmed:
+            r = await self._client.get(
+                f"{GITHUB_API_URL}/repos/{GITHUB_USERNAME}/{watch.repo_name}/pages/builds/latest",
+                headers={
+                    "Authorization": f"token {GITHUB_TOKEN}",
+                    "Accept": "application/vnd.github+json",
+                },
+            )
+            build = r.json() if r.status_code == 200 else {}
+            if not isinstance(build, dict) or not build.get("commit"):
+                # 403/404 or no commit field: only the site itself can tell
+                watch.builds_api = False
+            elif build["commit"] != watch.commit_sha:
+                return None
+            elif build.get("status") == "errored":
+                return False
+            elif build.get("status") != "built":
+                return None
+            else:
+                watch.build_confirmed = True
+
+        r = await self._client.get(watch.url)
+        return True if r.status_code == 200 else None
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for watch in self._watches.values():
+            for future in watch.waiters:
+                if not future.done():
+                    future.set_result(False)
+        self._watches.clear()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+watcher = PagesWatcher()
+
+
+async def wait_for_pages(
+    pages_url: str,
+    repo_name: str | None = None,
+    commit_sha: str | None = None,
+    timeout: float = PAGES_TIMEOUT
+) -> bool:
+    """Wait until the Pages deployment for `commit_sha` is live, or timeout."""
+    return await watcher.wait(pages_url, repo_name, commit_sha, timeout)
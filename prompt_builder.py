@@ -0,0 +1,268 @@
+"""
+prompt_builder.py
+-----------------
+Type-aware, token-budgeted attachment context for LLM prompts.
+
+Instead of pasting base64 data URLs into the prompt, each attachment is
+summarized according to its type and fitted to a share of a token budget:
+- CSV: header, inferred column types, row count and sampled rows
+- JSON: structural outline (keys, types, array lengths, example values)
+- Markdown / plain text: raw text, truncated
+- anything else: name, MIME type and size only
+The full files still ship in the repo's attachments/ folder.
+
+For Round 2 edits, build_repo_context ranks the existing repo files by
+relevance to the brief and includes as many as fit in a second budget.
+"""
+
+import csv
+import io
+import json
+import random
+import re
+from pathlib import Path
+
+from attachment_utils import StoredAttachment
+from config import ATTACHMENT_TOKEN_BUDGET, REPO_CONTEXT_TOKEN_BUDGET
+
+CSV_SAMPLE_ROWS = 8
+JSON_MAX_DEPTH = 4
+JSON_MAX_KEYS = 25
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English/code)."""
+    return (len(text) + 3) // 4
+
+
+def fit_to_budget(text: str, budget_tokens: int) -> str:
+    """Truncate text to roughly `budget_tokens` tokens."""
+    limit = max(0, budget_tokens) * 4
+    if len(text) <= limit:
+        return text
+    return text[:limit].rstrip() + "\n... (truncated)"
+
+
+def _kind(att: StoredAttachment) -> str:
+    name = att.name.lower()
+    if att.mime == "text/csv" or name.endswith(".csv"):
+        return "csv"
+    if att.mime == "application/json" or name.endswith(".json"):
+        return "json"
+    if att.mime.startswith("text/") or name.endswith((".md", ".txt")):
+        return "text"
+    return "binary"
+
+
+def _open_text(att: StoredAttachment):
+    return open(att.path, "r", encoding="utf-8", errors="replace", newline="")
+
+
+def _infer_type(values: list[str]) -> str:
+    values = [v for v in values if v != ""]
+    if not values:
+        return "empty"
+    for caster, label in ((int, "int"), (float, "float")):
+        try:
+            for v in values:
+                caster(v)
+            return label
+        except ValueError:
+            continue
+    return "text"
+
+
+def summarize_csv(att: StoredAttachment, budget_tokens: int) -> str:
+    """Header, column types, row count and a deterministic sample of rows."""
+    rng = random.Random(att.sha256 or att.name)
+    head, reservoir, rows = [], [], 0
+    with _open_text(att) as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        for row in reader:
+            rows += 1
+            if len(head) < CSV_SAMPLE_ROWS // 2:
+                head.append(row)
+                continue
+            # Reservoir-sample the remainder so the sample covers the whole file
+            seen = rows - len(head)
+            if len(reservoir) < CSV_SAMPLE_ROWS - len(head):
+                reservoir.append(row)
+            else:
+                j = rng.randrange(seen)
+                if j < len(reservoir):
+                    reservoir[j] = row
+    sample = head + reservoir
+
+    columns = []
+    for i, col in enumerate(header):
+        col_type = _infer_type([r[i] for r in sample if i < len(r)])
+        columns.append(f"{col} ({col_type})")
+
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(header)
+    writer.writerows(sample)
+    text = (
+        f"Rows: {rows}\n"
+        f"Columns: {', '.join(columns)}\n"
+        f"Sample rows:\n{out.getvalue()}"
+    )
+    return fit_to_budget(text, budget_tokens)
+
+
+def _outline(value, depth: int = 0) -> str:
+    indent = "  " * depth
+    if isinstance(value, dict):
+        if depth >= JSON_MAX_DEPTH:
+            return f"object with {len(value)} keys"
+        lines = [f"object ({len(value)} keys)"]
+        for k in list(value)[:JSON_MAX_KEYS]:
+            lines.append(f"{indent}  {k}: {_outline(value[k], depth + 1)}")
+        if len(value) > JSON_MAX_KEYS:
+            lines.append(f"{indent}  ... {len(value) - JSON_MAX_KEYS} more keys")
+        return "\n".join(lines)
+    if isinstance(value, list):
+        if not value:
+            return "array (empty)"
+        if depth >= JSON_MAX_DEPTH:
+            return f"array of {len(value)}"
+        return f"array of {len(value)}, items like: {_outline(value[0], depth + 1)}"
+    if isinstance(value, str):
+        return f"string, e.g. {json.dumps(value[:40])}"
+    if isinstance(value, bool) or value is None:
+        return json.dumps(value)
+    return f"{type(value).__name__}, e.g. {value}"
+
+
+def summarize_json(att: StoredAttachment, budget_tokens: int) -> str:
+    """Structural outline of a JSON document."""
+    try:
+        with open(att.path, "rb") as f:
+            data = json.load(f)
+    except (ValueError, UnicodeDecodeError):
+        return summarize_text(att, budget_tokens)
+    return fit_to_budget(f"Structure: {_outline(data)}", budget_tokens)
+
+
+def summarize_text(att: StoredAttachment, budget_tokens: int) -> str:
+    """Raw text, truncated; only the budgeted prefix is read from disk."""
+    with _open_text(att) as f:
+        text = f.read(max(0, budget_tokens) * 4 + 1)
+    return fit_to_budget(text, budget_tokens)
+
+
+SUMMARIZERS = {
+    "csv": summarize_csv,
+    "json": summarize_json,
+    "text": summarize_text,
+}
+
+
+def summarize_attachment(att: StoredAttachment, budget_tokens: int) -> str:
+    summarizer = SUMMARIZERS.get(_kind(att))
+    body = summarizer(att, budget_tokens) if summarizer else "(binary file, contents not shown)"
+    return f"### attachments/{att.name} ({att.mime}, {att.size} bytes)\n{body}"
+
+
+def build_attachment_context(
+    attachments: list[StoredAttachment],
+    token_budget: int = ATTACHMENT_TOKEN_BUDGET
+) -> str:
+    """
+    Summaries of all attachments, fitted to `token_budget` tokens in total.
+    Budget left unused by small attachments is passed on to the next ones.
+    """
+    if not attachments:
+        return "(none)"
+
+    sections = []
+    remaining = token_budget
+    # Smallest first so their leftover budget flows to the larger files
+    pending = sorted(attachments, key=lambda a: a.size)
+    for i, att in enumerate(pending):
+        share = remaining // (len(pending) - i)
+        section = summarize_attachment(att, share)
+        sections.append(section)
+        remaining -= estimate_tokens(section)
+    return "\n\n".join(sections)
+
+
+# ---------------------------------------------------------------------
+# Round 2: existing repository context
+# ---------------------------------------------------------------------
+REPO_SKIP_DIRS = {".git", "attachments", "node_modules"}
+REPO_SKIP_FILES = {"LICENSE", "README.md"}  # README is regenerated separately
+REPO_MAX_FILE_BYTES = 200_000
+TYPE_WEIGHTS = {".html": 3.0, ".js": 3.0, ".css": 2.0, ".json": 1.0, ".md": 0.5}
+
+
+def list_repo_files(repo_dir: Path) -> list[str]:
+    """Relative paths of the text files an edit may touch."""
+    paths = []
+    for f in sorted(repo_dir.rglob("*")):
+        rel = f.relative_to(repo_dir)
+        if not f.is_file() or rel.parts[0] in REPO_SKIP_DIRS or rel.name in REPO_SKIP_FILES:
+            continue
+        paths.append(rel.as_posix())
+    return paths
+
+
+def _read_text_file(path: Path) -> str | None:
+    if path.stat().st_size > REPO_MAX_FILE_BYTES:
+        return None
+    data = path.read_bytes()
+    if b"\0" in data:
+        return None
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+def _relevance(path: str, text: str, brief_words: set[str], brief: str) -> float:
+    score = TYPE_WEIGHTS.get(Path(path).suffix.lower(), 0.2)
+    if path in brief or Path(path).name in brief:
+        score += 5
+    lowered = text.lower()
+    score += 0.5 * sum(1 for w in brief_words if w in lowered)
+    return score
+
+
+def build_repo_context(
+    repo_dir: Path,
+    brief: str,
+    token_budget: int = REPO_CONTEXT_TOKEN_BUDGET,
+    only: list[str] | None = None
+) -> tuple[str, list[str]]:
+    """
+    Current repo files for a Round 2 edit prompt, most relevant to the brief
+    first, until `token_budget` is used up. Files that don't fit are listed by
+    path only. `only` restricts the context to the given paths.
+    Returns: (context text, paths shown in full).
+    """
+    brief_words = {w for w in re.findall(r"[a-z0-9_#.-]{4,}", brief.lower())}
+    candidates = []
+    for rel in only or list_repo_files(repo_dir):
+        path = repo_dir / rel
+        text = _read_text_file(path) if path.is_file() else None
+        if text is None:
+            continue
+        candidates.append((_relevance(rel, text, brief_words, brief), rel, text))
+    candidates.sort(key=lambda c: (-c[0], c[1]))
+
+    sections, shown, omitted = [], [], []
+    remaining = token_budget
+    for _, rel, text in candidates:
+        section = f"=== {rel} ===\n{text}"
+        cost = estimate_tokens(section)
+        if cost <= remaining:
+            sections.append(section)
+            shown.append(rel)
+            remaining -= cost
+        else:
+            omitted.append(rel)
+
+    if omitted:
+        sections.append("Other files (not shown): " + ", ".join(omitted))
+    return "\n\n".join(sections) or "(empty repository)", shown
@@ -0,0 +1,290 @@
+"""
+rate_limiter.py
+---------------
+Process-wide admission control for OpenAI requests.
+
+Every LLM call (from any task) reserves a slot before it is sent:
+
+1. Two token buckets, requests per minute and tokens per minute. A request
+   costs its estimated prompt tokens plus max_tokens, which is how the API
+   itself counts a request against the TPM quota.
+2. An adaptive concurrency limit (AIMD): it grows by one after a full
+   window of unthrottled successes while the quota has headroom, is halved
+   on a 429, and shrinks by one when the time per output token rises well
+   above the best seen for that kind of call.
+
+The x-ratelimit-* headers of every response re-sync the buckets with the
+API's own view (including traffic from other workers sharing the key), and
+a 429 pauses all callers until its Retry-After instead of letting each task
+back off on its own schedule.
+"""
+
+import asyncio
+import re
+import time
+from contextlib import asynccontextmanager
+
+from config import (
+    LLM_RPM_LIMIT, LLM_TPM_LIMIT, LLM_CONCURRENCY_MIN, LLM_CONCURRENCY_MAX,
+    LLM_LATENCY_TOLERANCE,
+)
+from prompt_builder import estimate_tokens
+import log
+import metrics
+
+# Below this fraction of the quota remaining, concurrency stops growing
+HEADROOM_FRACTION = 0.1
+# Pause after a 429 that carries no Retry-After (doubles per consecutive 429)
+DEFAULT_PAUSE = 1.0
+MAX_PAUSE = 60.0
+# Replies shorter than this are timed as if they were this long
+MIN_LATENCY_TOKENS = 256
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+THROTTLE_SECONDS = metrics.Counter(
+    "llm_throttle_seconds_total", "Time LLM calls spent waiting for the rate limiter.", ("call",)
+)
+RATE_LIMITED = metrics.Counter("llm_rate_limited_total", "LLM requests rejected with 429, by call.", ("call",))
+metrics.METRICS += [THROTTLE_SECONDS, RATE_LIMITED]
+
+
+def parse_duration(value: str | None) -> float | None:
+    """Parses OpenAI reset values ("20ms", "1.5s", "6m0s") and plain seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _UNITS[unit] for n, unit in parts)
+
+
+def _int_header(headers, name: str) -> int | None:
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    return getattr(exc, "status_code", None) == 429
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding up to `capacity` units per minute."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self._updated = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.capacity / 60)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if they are now)."""
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)  # an oversized request waits for a full bucket, not forever
+        return 0.0 if self.level >= amount else (amount - self.level) * 60 / self.capacity
+
+    def take(self, amount: float):
+        if self.enabled:
+            self.level -= min(amount, self.capacity)
+
+    def sync(self, limit: int | None, remaining: int | None):
+        """Adopt the API's reported quota and never assume more is left than it reports."""
+        self._refill()
+        if limit:
+            self.capacity = float(limit)
+            self.level = min(self.level, self.capacity)
+        if remaining is not None and self.enabled:
+            self.level = min(self.level, float(remaining))
+
+    def headroom(self) -> float:
+        if not self.enabled:
+            return 1.0
+        self._refill()
+        return max(0.0, self.level) / self.capacity
+
+
+class _Report:
+    """What a request reports back to the limiter while it holds a slot."""
+
+    def __init__(self, limiter: "RateLimiter"):
+        self._limiter = limiter
+        self.completion_tokens = 0
+
+    def headers(self, headers):
+        self._limiter.observe_headers(headers)
+
+    def usage(self, usage):
+        self.completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+
+
+class RateLimiter:
+    def __init__(self):
+        self.requests = TokenBucket(LLM_RPM_LIMIT)
+        self.tokens = TokenBucket(LLM_TPM_LIMIT)
+        self.min_limit = max(1, LLM_CONCURRENCY_MIN)
+        self.max_limit = max(self.min_limit, LLM_CONCURRENCY_MAX)
+        self.limit = max(self.min_limit, self.max_limit // 2)
+        self.inflight = 0
+        self.waiting = 0
+        self._paused_until = 0.0
+        self._consecutive_429 = 0
+        self._successes = 0
+        self._slow_skip = 0  # slow calls still to ignore after a decrease
+        self._baseline: dict[str, float] = {}  # call -> fastest seconds per output token
+        self._recent: dict[str, float] = {}  # call -> moving average of the same
+        self._changed: asyncio.Condition | None = None
+
+    def _condition(self) -> asyncio.Condition:
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    async def _notify(self):
+        async with self._condition():
+            self._changed.notify_all()
+
+    async def acquire(self, call: str, cost: int):
+        """Wait until a concurrency slot, one request and `cost` tokens are available."""
+        changed = self._condition()
+        start = time.monotonic()
+        self.waiting += 1
+        try:
+            async with changed:
+                while True:
+                    now = time.monotonic()
+                    wait = max(
+                        self._paused_until - now,
+                        self.requests.wait_time(1),
+                        self.tokens.wait_time(cost),
+                    )
+                    if wait <= 0 and self.inflight < self.limit:
+                        break
+                    try:
+                        # Woken early when a slot is released
+                        await asyncio.wait_for(changed.wait(), timeout=wait if wait > 0 else None)
+                    except asyncio.TimeoutError:
+                        pass
+                self.requests.take(1)
+                self.tokens.take(cost)
+                self.inflight += 1
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - start
+        if waited > 0.001:
+            THROTTLE_SECONDS.inc(call, amount=waited)
+
+    def observe_headers(self, headers):
+        """Re-sync both buckets from x-ratelimit-* response headers."""
+        if headers is None:
+            return
+        self.requests.sync(
+            _int_header(headers, "x-ratelimit-limit-requests"),
+            _int_header(headers, "x-ratelimit-remaining-requests"),
+        )
+        self.tokens.sync(
+            _int_header(headers, "x-ratelimit-limit-tokens"),
+            _int_header(headers, "x-ratelimit-remaining-tokens"),
+        )
+
+    def on_success(self, call: str, latency: float, completion_tokens: int):
+        self._consecutive_429 = 0
+        # Seconds per output token (small replies floored, so fixed overhead doesn't dominate):
+        # this is what degrades when the API is overloaded, whatever the reply size
+        per_token = latency / max(completion_tokens, MIN_LATENCY_TOKENS)
+        baseline = self._baseline.get(call, per_token)
+        # Track the fastest rate, drifting up slowly so one lucky call doesn't pin it
+        self._baseline[call] = min(per_token, baseline * 0.99 + per_token * 0.01)
+        recent = self._recent.get(call, per_token) * 0.8 + per_token * 0.2
+        self._recent[call] = recent
+        if recent > baseline * LLM_LATENCY_TOLERANCE:
+            # One step per window of `limit` slow calls, not per call
+            if self._slow_skip > 0:
+                self._slow_skip -= 1
+            else:
+                self.limit = max(self.min_limit, self.limit - 1)
+                self._slow_skip = self.limit
+            self._successes = 0
+            return
+        self._slow_skip = 0
+        if min(self.requests.headroom(), self.tokens.headroom()) < HEADROOM_FRACTION:
+            return
+        self._successes += 1
+        if self._successes >= self.limit:
+            self.limit = min(self.max_limit, self.limit + 1)
+            self._successes = 0
+
+    def on_rate_limited(self, call: str, headers):
+        RATE_LIMITED.inc(call)
+        now = time.monotonic()
+        if now < self._paused_until:
+            return  # one decrease per burst of 429s from requests already in flight
+        self._consecutive_429 += 1
+        pause = None
+        if headers is not None:
+            ms = parse_duration(headers.get("retry-after-ms"))
+            pause = ms / 1000 if ms is not None else parse_duration(headers.get("retry-after"))
+            if pause is None:
+                pause = max(
+                    parse_duration(headers.get("x-ratelimit-reset-requests")) or 0,
+                    parse_duration(headers.get("x-ratelimit-reset-tokens")) or 0,
+                ) or None
+        if pause is None:
+            pause = DEFAULT_PAUSE * 2 ** (self._consecutive_429 - 1)
+        self._paused_until = now + min(pause, MAX_PAUSE)
+        self.limit = max(self.min_limit, self.limit // 2)
+        self._successes = 0
+        log.warning("⏳ LLM rate limited (%s); pausing %.1fs, concurrency %d", call, min(pause, MAX_PAUSE), self.limit)
+
+    @asynccontextmanager
+    async def slot(self, call: str, prompt: str, max_tokens: int):
+        """
+        Hold an admission slot for one request (including, for streams, the
+        whole time it is being read). Yields a _Report: pass it the response
+        headers and usage; the outcome adjusts the concurrency limit.
+        """
+        await self.acquire(call, estimate_tokens(prompt) + max_tokens)
+        report = _Report(self)
+        start = time.monotonic()
+        try:
+            yield report
+        except BaseException as e:
+            if is_rate_limited(e):
+                headers = getattr(getattr(e, "response", None), "headers", None)
+                self.observe_headers(headers)
+                self.on_rate_limited(call, headers)
+            raise
+        else:
+            self.on_success(call, time.monotonic() - start, report.completion_tokens)
+        finally:
+            self.inflight -= 1
+            await self._notify()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency_limit": self.limit,
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "requests_available": round(self.requests.level, 1) if self.requests.enabled else -1,
+            "tokens_available": round(self.tokens.level) if self.tokens.enabled else -1,
+            "paused_seconds": round(max(0.0, self._paused_until - time.monotonic()), 3),
+        }
+
+
+limiter = RateLimiter()
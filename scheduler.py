@@ -0,0 +1,114 @@
+"""
+scheduler.py
+------------
+Staged, bounded worker scheduler for the task pipeline.
+
+Every pipeline stage (attachment I/O, LLM calls, git/GitHub operations) owns
+its own thread pool and concurrency limit. Blocking
+work never runs on the event loop (async work such as LLM calls only takes
+a slot), and a burst of rounds is pipelined: one task can be pushing to
+GitHub while another is still waiting on the LLM.
+"""
+
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+from config import IO_CONCURRENCY, LLM_CONCURRENCY, GIT_CONCURRENCY
+
+
+class Stage:
+    """A named pipeline stage with a bounded executor and a concurrency limit."""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self.executor = ThreadPoolExecutor(max_workers=self.limit, thread_name_prefix=f"stage-{name}")
+        self._semaphore = asyncio.Semaphore(self.limit)
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of this stage's concurrency slots for the duration of the block."""
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            yield self
+        finally:
+            self.active -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    async def submit(self, fn, *args, **kwargs):
+        """
+        Run a blocking callable on this stage's executor (no slot is taken),
+        in a copy of the caller's context so its trace and log fields follow it.
+        """
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, partial(ctx.run, fn, *args, **kwargs))
+
+    async def run(self, fn, *args, **kwargs):
+        """Take a slot, then run a blocking callable on this stage's executor."""
+        async with self.slot():
+            return await self.submit(fn, *args, **kwargs)
+
+    async def run_async(self, coro):
+        """Take a slot, then await a coroutine (for non-blocking async work)."""
+        async with self.slot():
+            return await coro
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "completed": self.completed,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+STAGES: dict[str, Stage] = {
+    "io": Stage("io", IO_CONCURRENCY),
+    "llm": Stage("llm", LLM_CONCURRENCY),
+    "git": Stage("git", GIT_CONCURRENCY),
+}
+
+
+def stage(name: str) -> Stage:
+    """Look up a pipeline stage by name."""
+    try:
+        return STAGES[name]
+    except KeyError:
+        raise ValueError(f"Unknown pipeline stage: {name}") from None
+
+
+async def run_in_stage(name: str, fn, *args, **kwargs):
+    """Run a blocking callable inside the named stage."""
+    return await stage(name).run(fn, *args, **kwargs)
+
+
+async def run_async_in_stage(name: str, coro):
+    """Await a coroutine while holding one of the named stage's slots."""
+    return await stage(name).run_async(coro)
+
+
+def stats() -> dict:
+    """Snapshot of every stage's limit, active and waiting counts."""
+    return {name: s.stats() for name, s in STAGES.items()}
+
+
+def shutdown():
+    """Stop all stage executors (called on application shutdown)."""
+    for s in STAGES.values():
+        s.shutdown()
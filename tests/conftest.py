@@ -0,0 +1,72 @@
+"""
+conftest.py
+-----------
+Runs the tests against a scratch BASE_REPO_DIR (job database, blob store,
+locks) with dummy credentials. config.py reads the environment when it is
+first imported, so this has to happen before any project module is loaded.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+SCRATCH = Path(tempfile.mkdtemp(prefix="llm-tests-"))
+
+os.environ.update({
+    "BASE_REPO_DIR": str(SCRATCH / "repos"),
+    "STUDENT_SECRET": "test-secret",
+    "GITHUB_USERNAME": "tester",
+    "GITHUB_TOKEN": "test-github-token",
+    "OPENAI_API_KEY": "test-openai-key",
+    "DEBUG_MODE": "false",
+    "LOG_LEVEL": "error",
+    "PAGES_POLL_MIN": "0.01",
+    "PAGES_POLL_MAX": "0.05",
+})
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(scope="session")
+def fake_services_url():
+    """benchmarks/fake_services.py served by uvicorn on a background thread."""
+    import socket
+    import threading
+    import time
+
+    import uvicorn
+
+    sys.path.insert(0, str(ROOT / "benchmarks"))
+    import fake_services
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(fake_services.app, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("fake services did not start")
+        time.sleep(0.02)
+    yield f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+@pytest.fixture
+def github_stub(fake_services_url, tmp_path, monkeypatch):
+    """
+    The fake GitHub API (bare repos under tmp_path/remotes), with github_api
+    pointed at it through its normal pooled session. Returns the fake_services module.
+    """
+    import fake_services
+    import github_api
+
+    monkeypatch.setitem(fake_services.SETTINGS, "root", tmp_path)
+    monkeypatch.setattr(github_api, "GITHUB_API_URL", f"{fake_services_url}/github")
+    return fake_services
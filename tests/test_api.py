@@ -0,0 +1,84 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app as app_module
+import job_store
+import locks
+
+
+@pytest.fixture
+def client(monkeypatch):
+    started = []
+    monkeypatch.setattr(app_module, "start_task", lambda key, data: started.append((key, data)))
+    # No lifespan: nothing runs in the background
+    client = TestClient(app_module.app)
+    client.started = started
+    return client
+
+
+def post(client, payload, **kwargs):
+    content = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+    return client.post("/api-endpoint", content=content, headers={"Content-Type": "application/json"}, **kwargs)
+
+
+def task(**overrides) -> dict:
+    payload = {
+        "email": "a@b.c", "secret": "test-secret", "task": "api-test", "round": 1,
+        "brief": "b", "evaluation_url": "http://eval.test/notify",
+        "attachments": [{"name": "a.txt", "url": "data:text/plain;base64,aGk="}],
+    }
+    payload.update(overrides)
+    return payload
+
+
+def test_valid_request_is_accepted_and_started(client):
+    r = post(client, task(task="api-accepted"))
+    assert r.status_code == 200 and r.json()["status"] == "ok"
+
+    (key, data), = client.started
+    assert key == "a@b.c:api-accepted:1"
+    assert "secret" not in data
+    assert data["attachments"][0]["name"] == "a.txt" and data["attachments"][0]["size"] == 2
+    assert job_store.get_job(key)["status"] == "pending"
+    locks.release_lease(key)
+
+
+@pytest.mark.parametrize("secret", [None, "", "wrong", 123])
+def test_bad_or_missing_secret_is_rejected(client, secret):
+    payload = task()
+    if secret is None:
+        del payload["secret"]
+    else:
+        payload["secret"] = secret
+    assert post(client, payload).status_code == 403
+    assert client.started == []
+
+
+def test_secret_is_checked_before_the_fields_are_validated(client):
+    r = post(client, {"secret": "wrong", "round": "not a number"})
+    assert r.status_code == 403
+    assert "round" not in r.text
+
+
+def test_invalid_fields_with_the_right_secret_get_details(client):
+    r = post(client, task(round="not a number"))
+    assert r.status_code == 422
+    assert "round" in r.text
+
+
+def test_requests_are_rejected_when_no_secret_is_configured(client, monkeypatch):
+    monkeypatch.setattr(app_module, "STUDENT_SECRET", "")
+    assert post(client, task(secret="")).status_code == 503
+    assert post(client, {k: v for k, v in task().items() if k != "secret"}).status_code == 503
+
+
+@pytest.mark.parametrize("content", [
+    json.dumps(task()).encode() + b"garbage",
+    b"{not json",
+    b"",
+])
+def test_malformed_bodies_get_400(client, content):
+    assert post(client, content).status_code == 400
+
@@ -0,0 +1,205 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app as app_module
+import events
+import job_store
+
+KEY = "a@b.c:site:1"
+URL = "/tasks/a@b.c/site/1/events"
+
+
+@pytest.fixture(autouse=True)
+def fresh(tmp_path, monkeypatch):
+    """Empty job table and event history; no subscriber may outlive a test."""
+    monkeypatch.setattr(job_store, "JOB_DB_PATH", tmp_path / "jobs.db")
+    monkeypatch.setattr(job_store, "_conn", None)
+    monkeypatch.setattr(events, "_history", OrderedDict())
+    monkeypatch.setattr(events, "_next_id", {})
+    monkeypatch.setattr(events, "_subscribers", {})
+    yield
+    assert events._subscribers == {}
+    if job_store._conn is not None:
+        job_store._conn.close()
+
+
+@pytest.fixture
+def client():
+    # No lifespan: nothing runs in the background
+    return TestClient(app_module.app)
+
+
+def parse(body: str) -> list[tuple]:
+    """(event, data, id) for each server-sent event in `body`."""
+    parsed = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if fields:
+            event_id = int(fields["id"]) if "id" in fields else None
+            parsed.append((fields["event"], json.loads(fields["data"]), event_id))
+    return parsed
+
+
+def once_subscribed(*steps):
+    """Runs each step from another thread as soon as the stream has subscribed to KEY."""
+    def run():
+        deadline = time.monotonic() + 5
+        while KEY not in events._subscribers and time.monotonic() < deadline:
+            time.sleep(0.005)
+        for step in steps:
+            step()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def stream(client, steps=(), last_id=None) -> list[tuple]:
+    thread = once_subscribed(*steps) if steps else None
+    headers = {"Last-Event-ID": str(last_id)} if last_id is not None else {}
+    response = client.get(URL, headers=headers)
+    if thread is not None:
+        thread.join(5)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    return parse(response.text)
+
+
+# ---------------------------------------------------------------------
+# Stream over HTTP
+# ---------------------------------------------------------------------
+def test_snapshot_then_live_stages_until_done(client):
+    job_store.create_job(KEY, {"task": "site"})
+    job_store.advance(KEY, "attachments")
+
+    received = stream(client, [
+        lambda: job_store.advance(KEY, "generated", generated_files=["index.html"], workspace="/srv/x"),
+        lambda: events.publish(KEY, "file", path="index.html"),
+        lambda: job_store.finish(KEY),
+    ])
+
+    snapshot, *live = received
+    assert snapshot[0] == "snapshot" and snapshot[2] == 2
+    assert (snapshot[1]["stage"], snapshot[1]["status"]) == ("attachments", "running")
+    assert live == [
+        ("stage", {"stage": "generated", "status": "running", "generated_files": ["index.html"]}, 3),
+        ("file", {"path": "index.html"}, 4),
+        ("done", {"status": "done"}, 5),
+    ]
+
+
+def test_reconnect_replays_missed_events_then_continues_live(client):
+    job_store.create_job(KEY, {"task": "site"})
+    job_store.advance(KEY, "attachments")
+    job_store.advance(KEY, "generated")
+
+    received = stream(client, [lambda: job_store.fail(KEY, "push rejected")], last_id=1)
+
+    assert received == [
+        ("stage", {"stage": "attachments", "status": "running"}, 2),
+        ("stage", {"stage": "generated", "status": "running"}, 3),
+        ("failed", {"status": "failed", "error": "push rejected"}, 4),
+    ]
+
+
+def test_finished_round_ends_the_stream_at_once(client):
+    job_store.create_job(KEY, {"task": "site"})
+    job_store.finish(KEY)
+
+    [(event, data, event_id)] = stream(client)
+    assert (event, data["status"], event_id) == ("snapshot", "done", 2)
+
+    assert stream(client, last_id=1) == [("done", {"status": "done"}, 2)]
+
+
+def test_progress_of_another_worker_is_followed_through_the_job_store(client, monkeypatch):
+    monkeypatch.setattr(app_module, "TASK_EVENTS_POLL_SECONDS", 0.02)
+    job_store.create_job(KEY, {"task": "site"})
+    # Progress made elsewhere publishes nothing to this process
+    silent = lambda key, event, **data: None
+
+    received = stream(client, [
+        lambda: monkeypatch.setattr(events, "publish", silent),
+        lambda: job_store.advance(KEY, "readme"),
+        lambda: time.sleep(0.1),
+        lambda: job_store.fail(KEY, "boom"),
+    ])
+
+    assert [(event, data["stage"], data["status"]) for event, data, _ in received] == [
+        ("snapshot", "received", "pending"), ("stage", "readme", "running"), ("failed", "readme", "failed"),
+    ]
+    assert received[-1][1]["error"] == "boom"
+
+
+def test_unknown_round_is_404(client):
+    assert client.get(URL).status_code == 404
+
+
+# ---------------------------------------------------------------------
+# Subscribers
+# ---------------------------------------------------------------------
+def test_disconnect_unsubscribes():
+    job_store.create_job(KEY, {"task": "site"})
+
+    async def go():
+        stream = app_module.task_events(KEY, 0)
+        assert (await anext(stream)).startswith("id: 1\nevent: snapshot")
+        # The client goes away while the stream waits for the next event
+        waiting = asyncio.create_task(anext(stream))
+        await asyncio.sleep(0.02)
+        assert len(events._subscribers[KEY]) == 1
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        await stream.aclose()
+
+    asyncio.run(go())
+    assert events._subscribers == {}
+
+
+def test_events_reach_every_subscriber_and_are_kept_for_replay():
+    async def go():
+        with events.subscribe("k") as first, events.subscribe("k") as second:
+            await asyncio.to_thread(events.publish, "k", "stage", stage="readme")
+            got = [await asyncio.wait_for(q.get(), 1) for q in (first, second)]
+        return got
+
+    first, second = asyncio.run(go())
+    assert first == second and (first["id"], first["event"], first["data"]) == (1, "stage", {"stage": "readme"})
+    events.publish("k", "done")
+    assert [r["id"] for r in events.history("k")] == [1, 2]
+    assert [r["event"] for r in events.history("k", after=1)] == ["done"]
+
+
+def test_history_is_bounded(monkeypatch):
+    monkeypatch.setattr(events, "HISTORY_PER_JOB", 3)
+    monkeypatch.setattr(events, "HISTORY_JOBS", 2)
+    for i in range(5):
+        events.publish("a", "file", n=i)
+    events.publish("b", "stage")
+    events.publish("c", "stage")
+
+    assert "a" not in events._history and events.history("a") == []
+    assert [r["id"] for r in events.history("b")] == [1]
+    events.publish("a", "stage")
+    assert events.history("a")[0]["id"] == 1  # ids restart once a job is forgotten
+    for _ in range(4):
+        events.publish("a", "file")
+    assert [r["id"] for r in events.history("a")] == [3, 4, 5]
+
+
+def test_public_artifacts_hide_payloads_and_paths():
+    view = events.public_artifacts({
+        "commit_sha": "abc", "workspace": "/srv/repos/x", "seeded": True,
+        "attachments": [{"name": "data.csv", "sha256": "f00", "path": "/srv/blobs/f00"}],
+        "verification": {"ok": False, "problems": ["p"], "repaired": [], "report": "long"},
+    })
+    assert view == {
+        "commit_sha": "abc", "attachments": ["data.csv"],
+        "verification": {"ok": False, "problems": ["p"], "repaired": []},
+    }
@@ -0,0 +1,52 @@
+import subprocess
+
+import github_api
+
+
+def remote_git(stub, repo: str, *args) -> str:
+    return subprocess.run(
+        ["git", *args], cwd=stub._remote(repo), capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+
+def make_site(path, html: str = "<h1>hi</h1>"):
+    (path / "assets").mkdir(parents=True)
+    (path / "index.html").write_text(html)
+    (path / "assets" / "app.js").write_text("console.log(1);\n")
+    (path / "assets" / "logo.png").write_bytes(b"\x89PNG\r\n\x1a\n\xff\x00")
+    return path
+
+
+def test_publish_round1_commits_the_tree_on_top_of_the_initial_commit(github_stub, tmp_path):
+    site = make_site(tmp_path / "site")
+    name, sha, pages_url = github_api.publish_round1("demo", site)
+
+    assert name == "demo"
+    assert pages_url == github_api.pages_url_for("demo")
+    assert remote_git(github_stub, "demo", "rev-parse", "refs/heads/main") == sha
+    files = remote_git(github_stub, "demo", "ls-tree", "-r", "--name-only", sha).splitlines()
+    assert sorted(files) == ["assets/app.js", "assets/logo.png", "index.html"]
+    # Binary files go up as separate blobs, byte for byte
+    logo = subprocess.run(["git", "cat-file", "blob", f"{sha}:assets/logo.png"],
+                          cwd=github_stub._remote("demo"), capture_output=True, check=True).stdout
+    assert logo == (site / "assets" / "logo.png").read_bytes()
+    # Parent is the auto_init commit
+    assert remote_git(github_stub, "demo", "log", "--format=%s", sha).splitlines() == ["Initial commit", "Initial commit"]
+
+
+def test_publish_round1_into_an_existing_repo_adds_a_commit(github_stub, tmp_path):
+    _, first, _ = github_api.publish_round1("again", make_site(tmp_path / "one", "v1"))
+    _, second, _ = github_api.publish_round1("again", make_site(tmp_path / "two", "v2"))
+
+    assert second != first
+    assert remote_git(github_stub, "again", "rev-parse", f"{second}^") == first
+    assert remote_git(github_stub, "again", "show", f"{second}:index.html") == "v2"
+
+
+def test_api_errors_carry_the_status(github_stub):
+    try:
+        github_api.api("GET", "/repos/tester/missing")
+    except github_api.GitHubAPIError as e:
+        assert e.status_code == 404
+    else:
+        raise AssertionError("expected GitHubAPIError")
@@ -0,0 +1,109 @@
+import subprocess
+
+import pytest
+
+import github_api
+import github_utils
+
+
+@pytest.fixture
+def remote(github_stub, tmp_path, monkeypatch):
+    """A published repo on the fake GitHub, with git remotes and mirrors under tmp_path."""
+    monkeypatch.setattr(github_utils, "GIT_REMOTE_URL_TEMPLATE", f"file://{tmp_path}/remotes/{{repo}}.git")
+    monkeypatch.setattr(github_utils, "MIRROR_DIR", tmp_path / "mirrors")
+    site = tmp_path / "round1"
+    (site / "js").mkdir(parents=True)
+    (site / "index.html").write_text("<h1>v1</h1>\n")
+    (site / "js" / "old.js").write_text("old();\n")
+    (site / "style.css").write_text("body {}\n")
+    github_api.publish_round1("site", site)
+    return github_stub._remote("site")
+
+
+def git(cwd, *args) -> str:
+    return subprocess.run(
+        ["git", "-c", "user.name=other", "-c", "user.email=other@localhost", *args],
+        cwd=cwd, capture_output=True, text=True, check=True,
+    ).stdout.strip()
+
+
+def remote_files(remote) -> dict[str, str]:
+    names = git(remote, "ls-tree", "-r", "--name-only", "main").splitlines()
+    return {name: git(remote, "show", f"main:{name}") for name in names}
+
+
+def push_from_elsewhere(remote, tmp_path, path: str, content: str):
+    other = tmp_path / "other"
+    if not other.exists():
+        git(tmp_path, "clone", "-q", str(remote), str(other))
+    git(other, "pull", "-q", "--rebase")
+    (other / path).write_text(content)
+    git(other, "add", path)
+    git(other, "commit", "-q", "-m", f"edit {path}")
+    git(other, "push", "-q", "origin", "HEAD:main")
+
+
+def test_round2_pushes_changes_and_deletions(remote, tmp_path):
+    work = tmp_path / "round2"
+    assert github_utils.checkout_repo("site", work)
+    (work / "index.html").write_text("<h1>v2</h1>\n")
+    (work / "js" / "old.js").unlink()
+    (work / "js" / "new.js").write_text("fresh();\n")
+
+    _, sha, _ = github_utils.update_repo_round2("site", work)
+
+    assert sha == git(remote, "rev-parse", "main")
+    files = remote_files(remote)
+    assert "js/old.js" not in files
+    assert files["js/new.js"] == "fresh();"
+    assert files["index.html"] == "<h1>v2</h1>"
+    assert files["style.css"] == "body {}"
+
+
+def test_unseeded_round2_keeps_files_it_did_not_generate(remote, tmp_path):
+    # checkout_repo failed, so the workspace only holds the regenerated files
+    work = tmp_path / "round2"
+    work.mkdir()
+    (work / "index.html").write_text("<h1>v2</h1>\n")
+
+    _, sha, _ = github_utils.update_repo_round2("site", work, seeded=False)
+
+    assert sha == git(remote, "rev-parse", "main")
+    files = remote_files(remote)
+    assert files["index.html"] == "<h1>v2</h1>"
+    assert files["js/old.js"] == "old();"
+    assert files["style.css"] == "body {}"
+
+
+def test_round2_without_changes_does_not_commit(remote, tmp_path):
+    work = tmp_path / "round2"
+    github_utils.checkout_repo("site", work)
+    before = git(remote, "rev-parse", "main")
+    _, sha, _ = github_utils.update_repo_round2("site", work)
+    assert sha == before == git(remote, "rev-parse", "main")
+
+
+def test_rejected_push_is_rebased_onto_the_new_remote_head(remote, tmp_path):
+    mirror = github_utils.ensure_mirror("site")
+    (mirror / "index.html").write_text("<h1>mine</h1>\n")
+    git(mirror, "commit", "-q", "-am", "mine")
+    push_from_elsewhere(remote, tmp_path, "style.css", "body { color: red }\n")
+
+    github_utils.push_mirror("site", mirror)
+
+    assert git(remote, "rev-parse", "main") == git(mirror, "rev-parse", "HEAD")
+    files = remote_files(remote)
+    assert files["index.html"] == "<h1>mine</h1>"
+    assert files["style.css"] == "body { color: red }"
+
+
+def test_push_that_cannot_be_rebased_raises(remote, tmp_path):
+    mirror = github_utils.ensure_mirror("site")
+    (mirror / "index.html").write_text("<h1>mine</h1>\n")
+    git(mirror, "commit", "-q", "-am", "mine")
+    push_from_elsewhere(remote, tmp_path, "index.html", "<h1>theirs</h1>\n")
+
+    with pytest.raises(RuntimeError, match="rebase"):
+        github_utils.push_mirror("site", mirror)
+    assert remote_files(remote)["index.html"] == "<h1>theirs</h1>"
+    assert not (mirror / ".git" / "rebase-merge").exists()
@@ -0,0 +1,92 @@
+import base64
+import hashlib
+import json
+import mmap
+
+import pytest
+
+import ingest
+from attachment_utils import blob_path
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+DATA_URL = "data:image/png;base64," + base64.b64encode(PNG).decode()
+
+
+def body(**overrides) -> bytes:
+    payload = {
+        "email": "a@b.c", "secret": "s", "task": "t", "round": 2, "brief": "Make it \"nice\" {ok}",
+        "evaluation_url": "http://eval.test/notify",
+        "attachments": [{"name": "logo.png", "url": DATA_URL}, {"name": "ref", "url": "https://x.test/a"}],
+    }
+    payload.update(overrides)
+    return json.dumps(payload, indent=1).encode()
+
+
+def test_fields_are_decoded_and_attachment_urls_only_located():
+    buf = body()
+    fields, specs = ingest.scan_task_body(buf)
+
+    assert fields == {"email": "a@b.c", "secret": "s", "task": "t", "round": 2,
+                      "brief": "Make it \"nice\" {ok}", "evaluation_url": "http://eval.test/notify"}
+    assert [s["name"] for s in specs] == ["logo.png", "ref"]
+    start, end = specs[0]["url_span"]
+    assert buf[start:end].decode() == DATA_URL
+
+
+def test_urls_with_escapes_are_decoded_instead():
+    raw = b'{"attachments": [{"name": "a", "url": "https:\\/\\/x.test\\/\\"q"}]}'
+    _, specs = ingest.scan_task_body(raw)
+    assert specs == [{"name": "a", "url": 'https://x.test/"q'}]
+
+
+@pytest.mark.parametrize("attachments", [None, []])
+def test_missing_or_empty_attachments(attachments):
+    fields, specs = ingest.scan_task_body(body(attachments=attachments))
+    assert specs == [] and "attachments" not in fields
+
+
+def test_trailing_whitespace_is_allowed():
+    fields, _ = ingest.scan_task_body(b"  " + body() + b"\r\n\t ")
+    assert fields["task"] == "t"
+
+
+@pytest.mark.parametrize("buf", [
+    body() + b"garbage",
+    body() + b"{}",
+    b'{"a": 1,}',
+    b'{"a": [1, 2}',
+    b'{"a": tru}',
+    b'{"a": "unterminated',
+    b'["not", "an", "object"]',
+    b'{"attachments": "nope"}',
+    b"",
+])
+def test_malformed_bodies_raise_value_error(buf):
+    with pytest.raises(ValueError):
+        ingest.scan_task_body(buf)
+
+
+def test_store_attachments_decodes_data_urls_from_a_spooled_body(tmp_path):
+    buf = body()
+    path = tmp_path / "body.json"
+    path.write_bytes(buf)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        _, specs = ingest.scan_task_body(mapped)
+        refs = ingest.store_attachments(mapped, specs)
+
+    assert len(refs) == 1  # the https:// attachment is not stored
+    ref = refs[0]
+    assert (ref.name, ref.mime, ref.size) == ("logo.png", "image/png", len(PNG))
+    assert ref.sha256 == hashlib.sha256(PNG).hexdigest()
+    assert blob_path(ref.sha256).read_bytes() == PNG
+
+
+def test_spooled_body_moves_to_disk_past_the_memory_limit(monkeypatch):
+    monkeypatch.setattr(ingest, "SPOOL_MEMORY_BYTES", 16)
+    with ingest.SpooledBody() as spooled:
+        for part in (b'{"email": ', b'"a@b.c", ', b'"pad": "' + b"x" * 64 + b'"}'):
+            spooled.write(part)
+        spooled.finish()
+        assert isinstance(spooled.buf, mmap.mmap)
+        fields, _ = ingest.scan_task_body(spooled.buf)
+    assert fields["email"] == "a@b.c"
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+import app as app_module
+import job_store
+
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch):
+    """A fresh job table for each test (leases and workspaces keep the shared scratch database)."""
+    monkeypatch.setattr(job_store, "JOB_DB_PATH", tmp_path / "jobs.db")
+    monkeypatch.setattr(job_store, "_conn", None)
+    yield
+    if job_store._conn is not None:
+        job_store._conn.close()
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """process_task with the LLM, GitHub, Pages and evaluator calls replaced by recorders."""
+    calls = {"generate": 0, "readme": 0, "push": 0, "notify": 0}
+
+    async def generate(brief, attachments_dir, repo_folder, **kwargs):
+        calls["generate"] += 1
+        (repo_folder / "index.html").write_text("<html></html>")
+        return ["index.html"]
+
+    async def readme(**kwargs):
+        calls["readme"] += 1
+        if calls.get("hang_readme"):
+            await asyncio.sleep(3600)
+        return "# App\n"
+
+    def push(task_id, repo_folder, round_num, seeded=True):
+        calls["push"] += 1
+        return f"{task_id}-repo", "abc123", f"https://pages.test/{task_id}/"
+
+    async def pages(url, repo_name, commit_sha):
+        return True
+
+    def notify(**kwargs):
+        calls["notify"] += 1
+
+    monkeypatch.setattr(app_module, "generate_app_from_brief", generate)
+    monkeypatch.setattr(app_module, "generate_readme_for_repo", readme)
+    monkeypatch.setattr(app_module, "create_or_update_repo", push)
+    monkeypatch.setattr(app_module, "wait_for_pages", pages)
+    monkeypatch.setattr(app_module, "notify_evaluation_api", notify)
+    monkeypatch.setattr(app_module, "VERIFY_ENABLED", False)
+    return calls
+
+
+def task(name: str) -> dict:
+    return {
+        "email": "a@b.c", "task": name, "round": 1, "nonce": "n1", "brief": "b",
+        "evaluation_url": "http://eval.test/notify", "attachments": [],
+    }
+
+
+def test_stages_are_recorded_in_order(jobs):
+    job_store.create_job("k", {"secret": "s", "task": "t"})
+    job = job_store.advance("k", "generated", generated_files=["index.html"])
+    job = job_store.advance("k", "readme", timings={"readme": 1.0})
+
+    assert job["stage"] == "readme" and job["status"] == "running"
+    assert job["payload"] == {"task": "t"}
+    assert job["artifacts"] == {"generated_files": ["index.html"], "timings": {"readme": 1.0}}
+    assert job_store.stage_done(job, "generated") and not job_store.stage_done(job, "pushed")
+    assert [j["key"] for j in job_store.unfinished_jobs()] == ["k"]
+
+    job_store.finish("k")
+    assert job_store.unfinished_jobs() == []
+    with pytest.raises(ValueError):
+        job_store.advance("k", "deployed")
+
+
+def test_job_killed_after_generation_resumes_without_regenerating(jobs, pipeline):
+    data = task("resume-test")
+    key = app_module.task_key(data)
+
+    async def killed():
+        # The worker dies while the README call is still running
+        pipeline["hang_readme"] = True
+        run = asyncio.create_task(app_module.process_task(data))
+        while (job_store.get_job(key) or {}).get("stage") != "generated":
+            await asyncio.sleep(0.01)
+        run.cancel()
+        await asyncio.gather(run, return_exceptions=True)
+
+    asyncio.run(killed())
+    job = job_store.get_job(key)
+    assert (job["stage"], job["status"]) == ("generated", "running")
+    assert pipeline["generate"] == 1
+
+    async def restarted():
+        pipeline["hang_readme"] = False
+        await app_module.resume_unfinished_jobs()
+        return await app_module.ongoing_tasks[key]
+
+    job = asyncio.run(restarted())
+
+    assert (job["stage"], job["status"]) == ("notified", "done")
+    assert pipeline["generate"] == 1
+    assert pipeline["readme"] == 2 and pipeline["push"] == 1 and pipeline["notify"] == 1
+    assert job["artifacts"]["generated_files"] == ["index.html"]
+    assert job["artifacts"]["commit_sha"] == "abc123"
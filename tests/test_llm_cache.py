@@ -0,0 +1,41 @@
+import asyncio
+import os
+
+import pytest
+
+import llm_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(llm_cache, "_disk_bytes", None)
+    llm_cache._memory.clear()
+    return llm_cache
+
+
+def test_round_trip_through_both_tiers(cache):
+    key = cache.cache_key("m", "prompt", temperature=0.2)
+    assert asyncio.run(cache.get(key)) is None
+    asyncio.run(cache.put(key, "reply"))
+    assert asyncio.run(cache.get(key)) == "reply"
+    cache._memory.clear()
+    assert asyncio.run(cache.get(key)) == "reply"  # from disk
+
+
+def test_replacing_a_key_does_not_inflate_disk_usage(cache):
+    key = cache.cache_key("m", "prompt")
+    for text in ("a" * 100, "b" * 40, "c" * 40):
+        asyncio.run(cache.put(key, text))
+    assert cache._disk_bytes == 40 == sum(f.stat().st_size for f in cache.LLM_CACHE_DIR.glob("*/*.txt"))
+
+
+def test_least_recently_used_entries_are_evicted_over_the_cap(cache, monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_DISK_MB", 1)
+    keys = [cache.cache_key("m", str(i)) for i in range(4)]
+    for age, key in enumerate(keys[:3]):
+        asyncio.run(cache.put(key, "x" * 300_000))
+        os.utime(cache._path(key), (1000 + age, 1000 + age))
+    asyncio.run(cache.put(keys[3], "x" * 300_000))  # 1.2 MB > 1 MB
+    assert cache._disk_bytes == 900_000
+    assert [cache._path(k).exists() for k in keys] == [False, True, True, True]
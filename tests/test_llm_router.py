@@ -0,0 +1,153 @@
+import asyncio
+import json
+
+import pytest
+
+import llm_router
+from llm_router import Route, hedge_after, route_for, run_hedged
+
+
+@pytest.fixture(autouse=True)
+def fresh_latencies(monkeypatch):
+    monkeypatch.setattr(llm_router, "_latencies", {})
+    monkeypatch.setattr(llm_router, "LLM_HEDGE_MIN_SAMPLES", 10)
+
+
+def routes(monkeypatch, spec: dict):
+    monkeypatch.setattr(llm_router, "ROUTES", llm_router._load_routes(json.dumps(spec)))
+
+
+def tokens(n: int) -> str:
+    return "x" * (4 * n)
+
+
+def warm(route: Route, samples):
+    for s in samples:
+        llm_router._record_win(route, route.model, "primary", s)
+
+
+# ---------------------------------------------------------------------
+# Route selection
+# ---------------------------------------------------------------------
+def test_call_types_get_their_defaults(monkeypatch):
+    routes(monkeypatch, {})
+    route = route_for("plan", "short prompt")
+    assert (route.name, route.model, route.max_tokens) == ("plan", llm_router.LLM_DEFAULT_MODEL, 800)
+    unknown = route_for("something-new", "")
+    assert (unknown.name, unknown.max_tokens) == ("something-new", 1500)
+
+
+def test_size_tiers_pick_the_largest_matching_tier(monkeypatch):
+    routes(monkeypatch, {
+        "default": {"model": "small"},
+        "edits": {"hedge_model": "backup", "tiers": [
+            {"min_prompt_tokens": 6000, "model": "large", "max_tokens": 8000},
+            {"min_prompt_tokens": 2000, "model": "medium"},
+        ]},
+    })
+
+    small = route_for("edits", tokens(1999))
+    assert (small.name, small.model, small.max_tokens, small.hedge_model) == ("edits", "small", 2500, "backup")
+
+    medium = route_for("edits", tokens(2000))
+    assert (medium.name, medium.model, medium.max_tokens) == ("edits@2000", "medium", 2500)
+
+    large = route_for("edits", tokens(10000))
+    assert (large.name, large.model, large.max_tokens, large.hedge_model) == ("edits@6000", "large", 8000, "backup")
+
+    # Tiers of one call never apply to another
+    assert route_for("files", tokens(10000)).model == "small"
+
+
+def test_routes_load_from_a_file_and_reject_bad_specs(tmp_path):
+    path = tmp_path / "routes.json"
+    path.write_text(json.dumps({"readme": {"model": "cheap"}}))
+    loaded = llm_router._load_routes(str(path))
+    assert loaded["readme"] == {"max_tokens": 1500, "model": "cheap"}
+    assert loaded["files"] == {"max_tokens": 2500}
+
+    path.write_text('["files"]')
+    with pytest.raises(ValueError):
+        llm_router._load_routes(str(path))
+    with pytest.raises(ValueError):
+        llm_router._load_routes('{"files": "gpt-4o"}')
+
+
+# ---------------------------------------------------------------------
+# Hedging
+# ---------------------------------------------------------------------
+def test_no_hedge_until_enough_samples():
+    route = Route(name="files", model="m", max_tokens=100, hedge_percentile=0.9)
+    warm(route, [1.0] * 9)
+    assert hedge_after(route) is None
+    warm(route, [1.0])
+    assert hedge_after(route) == 1.0
+
+    assert hedge_after(Route(name="files", model="m", max_tokens=100, hedge_percentile=0)) is None
+
+
+def test_hedge_threshold_is_the_configured_percentile():
+    samples = [i / 10 for i in range(1, 21)]  # 0.1 .. 2.0
+    p90 = Route(name="files", model="m", max_tokens=100, hedge_percentile=0.9)
+    p50 = Route(name="files", model="m", max_tokens=100, hedge_percentile=0.5)
+    warm(p90, reversed(samples))
+    assert hedge_after(p90) == pytest.approx(1.9)
+    assert hedge_after(p50) == pytest.approx(1.1)
+
+
+def hedged(route: Route, behaviours: dict):
+    """run_hedged where each model sleeps and then returns or raises; records starts and cancellations."""
+    log = []
+
+    async def attempt(model: str):
+        delay, outcome = behaviours[model]
+        log.append(("start", model))
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            log.append(("cancelled", model))
+            raise
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return asyncio.run(run_hedged(route, attempt)), log
+
+
+def test_slow_primary_is_hedged_and_the_loser_cancelled():
+    route = Route(name="files", model="primary", max_tokens=100, hedge_percentile=0.5, hedge_model="backup")
+    warm(route, [0.05] * 10)
+    hedges = llm_router.HEDGES._values.get(("files",), 0)
+    wins = llm_router.ROUTE_WINS._values.get(("files", "backup", "hedge"), 0)
+
+    result, log = hedged(route, {"primary": (5, "slow"), "backup": (0.01, "fast")})
+
+    assert result == "fast"
+    assert log == [("start", "primary"), ("start", "backup"), ("cancelled", "primary")]
+    assert llm_router.HEDGES._values[("files",)] == hedges + 1
+    assert llm_router.ROUTE_WINS._values[("files", "backup", "hedge")] == wins + 1
+
+
+def test_fast_primary_is_not_hedged():
+    route = Route(name="files", model="primary", max_tokens=100, hedge_percentile=0.5, hedge_model="backup")
+    warm(route, [0.5] * 10)
+
+    result, log = hedged(route, {"primary": (0.01, "quick"), "backup": (0, "unused")})
+    assert (result, log) == ("quick", [("start", "primary")])
+
+
+def test_without_samples_a_slow_call_is_never_hedged():
+    route = Route(name="files", model="primary", max_tokens=100, hedge_percentile=0.5, hedge_model="backup")
+    result, log = hedged(route, {"primary": (0.2, "slow"), "backup": (0, "unused")})
+    assert (result, log) == ("slow", [("start", "primary")])
+
+
+def test_a_failed_attempt_does_not_win():
+    route = Route(name="files", model="primary", max_tokens=100, hedge_percentile=0.5, hedge_model="backup")
+    warm(route, [0.05] * 10)
+
+    result, _ = hedged(route, {"primary": (0.2, "late but valid"), "backup": (0.01, ValueError("bad reply"))})
+    assert result == "late but valid"
+
+    with pytest.raises(ValueError, match="second"):
+        hedged(route, {"primary": (0.1, ValueError("first")), "backup": (0.2, ValueError("second"))})
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import locks
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(locks, "JOB_DB_PATH", tmp_path / "jobs.db")
+    monkeypatch.setattr(locks, "LOCK_DIR", tmp_path / "locks")
+    monkeypatch.setattr(locks, "_conn", None)
+    yield
+    if locks._conn is not None:
+        locks._conn.close()
+
+
+def as_worker(monkeypatch, worker_id: str):
+    monkeypatch.setattr(locks, "WORKER_ID", worker_id)
+
+
+def test_lease_is_exclusive_until_released(db, monkeypatch):
+    as_worker(monkeypatch, "a")
+    assert locks.acquire_lease("k")
+    assert locks.acquire_lease("k")  # re-entrant for the holder
+    as_worker(monkeypatch, "b")
+    assert not locks.acquire_lease("k")
+    assert not locks.renew_lease("k")
+    assert locks.lease_holder("k") == "a"
+
+    as_worker(monkeypatch, "a")
+    locks.release_lease("k")
+    assert locks.lease_holder("k") is None
+    as_worker(monkeypatch, "b")
+    assert locks.acquire_lease("k")
+
+
+def test_release_by_another_worker_is_ignored(db, monkeypatch):
+    as_worker(monkeypatch, "a")
+    locks.acquire_lease("k")
+    as_worker(monkeypatch, "b")
+    locks.release_lease("k")
+    assert locks.lease_holder("k") == "a"
+
+
+def test_expired_lease_can_be_taken_over(db, monkeypatch):
+    as_worker(monkeypatch, "a")
+    assert locks.acquire_lease("k", ttl=-1)
+    assert locks.lease_holder("k") is None
+    as_worker(monkeypatch, "b")
+    assert locks.acquire_lease("k")
+    as_worker(monkeypatch, "a")
+    assert not locks.renew_lease("k")
+
+
+def test_only_one_of_many_worker_processes_gets_the_lease(db, tmp_path):
+    env = {**os.environ, "JOB_DB_PATH": str(tmp_path / "jobs.db"), "PYTHONPATH": str(ROOT)}
+    probe = "import locks; print(locks.acquire_lease('k'), locks.WORKER_ID)"
+    procs = [
+        subprocess.Popen([sys.executable, "-c", probe], env=env, cwd=ROOT, stdout=subprocess.PIPE, text=True)
+        for _ in range(6)
+    ]
+    results = [p.communicate(timeout=60)[0].split() for p in procs]
+    winners = [worker for won, worker in results if won == "True"]
+    assert len(winners) == 1
+    assert locks.lease_holder("k") == winners[0]
+
+
+def test_keep_lease_cancels_the_task_when_the_lease_is_lost(db, monkeypatch):
+    async def scenario():
+        assert locks.acquire_lease("k", ttl=0.3)
+        work = asyncio.create_task(asyncio.sleep(10))
+        keeper = asyncio.create_task(locks.keep_lease("k", work, ttl=0.3))
+        await asyncio.sleep(0.25)
+        assert not work.done()  # renewed so far
+        with locks._lock:
+            locks._db().execute("UPDATE leases SET owner = 'thief' WHERE key = 'k'")
+        with pytest.raises(asyncio.CancelledError):
+            await work
+        await keeper
+
+    asyncio.run(scenario())
+
+
+def test_repo_lock_excludes_other_holders(db):
+    with locks.repo_lock("site"):
+        with locks.try_repo_lock("site") as acquired:
+            assert acquired is False
+        with locks.try_repo_lock("other") as acquired:
+            assert acquired is True
+    with locks.try_repo_lock("site") as acquired:
+        assert acquired is True
+
+
+def test_repo_lock_blocks_until_released(db):
+    order = []
+
+    def second():
+        with locks.repo_lock("site"):
+            order.append("second")
+
+    with locks.repo_lock("site"):
+        t = threading.Thread(target=second)
+        t.start()
+        time.sleep(0.1)
+        order.append("first")
+    t.join(timeout=5)
+    assert order == ["first", "second"]
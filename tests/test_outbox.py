@@ -0,0 +1,154 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import outbox as outbox_module
+from outbox import Outbox
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh outbox table for each test."""
+    monkeypatch.setattr(outbox_module, "JOB_DB_PATH", tmp_path / "jobs.db")
+    monkeypatch.setattr(outbox_module, "_conn", None)
+    yield
+    if outbox_module._conn is not None:
+        outbox_module._conn.close()
+
+
+def worker(handler) -> Outbox:
+    box = Outbox()
+    box._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return box
+
+
+def row(row_id: int) -> dict:
+    with outbox_module._lock:
+        return dict(outbox_module._db().execute("SELECT * FROM outbox WHERE id = ?", (row_id,)).fetchone())
+
+
+def deliver_due(box: Outbox):
+    async def go():
+        for r in box._claim_due():
+            box._inflight[r["id"]] = "host"
+            await box._deliver(r)
+        await box._client.aclose()
+    asyncio.run(go())
+
+
+def test_acknowledged_notification_is_marked_delivered(db):
+    sent = []
+    box = worker(lambda request: sent.append(request.content) or httpx.Response(200))
+    row_id = box.enqueue("http://eval.test/notify", {"commit_sha": "abc"}, job_key="k")
+
+    deliver_due(box)
+
+    assert sent == [b'{"commit_sha": "abc"}']
+    assert row(row_id)["status"] == "delivered"
+    assert box.for_job("k")["attempts"] == 1
+    assert box._inflight == {}
+
+
+def test_failure_is_retried_after_a_jittered_backoff(db):
+    box = worker(lambda request: httpx.Response(503, text="busy"))
+    row_id = box.enqueue("http://eval.test/notify", {}, job_key="k")
+
+    before = time.time()
+    deliver_due(box)
+
+    r = row(row_id)
+    assert r["status"] == "pending" and r["attempts"] == 1
+    assert r["last_error"].startswith("HTTP 503")
+    assert before + 2 * 0.5 <= r["next_attempt_at"] <= time.time() + 2 * 1.5
+    assert box._claim_due() == []  # not due again yet
+
+
+def test_backoff_is_capped(monkeypatch):
+    monkeypatch.setattr(outbox_module, "OUTBOX_BACKOFF_MAX", 10)
+    assert all(5 <= outbox_module._backoff(30) <= 15 for _ in range(50))
+
+
+def test_notification_past_its_max_age_is_dead_lettered(db, monkeypatch):
+    box = worker(lambda request: httpx.Response(500))
+    row_id = box.enqueue("http://eval.test/notify", {}, job_key="k")
+    monkeypatch.setattr(outbox_module, "OUTBOX_MAX_AGE_SECONDS", -1)
+
+    deliver_due(box)
+
+    assert row(row_id)["status"] == "dead"
+    assert box.backlog()["dead"] == 1
+
+
+def test_claimed_rows_are_not_claimed_by_another_worker_until_the_claim_expires(db, monkeypatch):
+    first, second = Outbox(), Outbox()
+    ids = [first.enqueue("http://eval.test/notify", {"n": i}) for i in range(3)]
+
+    assert [r["id"] for r in first._claim_due()] == ids
+    assert second._claim_due() == []
+
+    later = time.time() + outbox_module.CLAIM_SECONDS + 1
+    monkeypatch.setattr(outbox_module.time, "time", lambda: later)
+    assert [r["id"] for r in second._claim_due()] == ids
+
+
+def test_renewed_claims_outlive_the_original_claim(db, monkeypatch):
+    first, second = Outbox(), Outbox()
+    row_id = first.enqueue("http://eval.test/notify", {})
+    for r in first._claim_due():
+        first._inflight[r["id"]] = "eval.test"
+
+    now = time.time()
+    monkeypatch.setattr(outbox_module.time, "time", lambda: now + outbox_module.CLAIM_SECONDS - 1)
+    first._renew_claims()
+    monkeypatch.setattr(outbox_module.time, "time", lambda: now + outbox_module.CLAIM_SECONDS + 1)
+    assert second._claim_due() == []
+    assert row(row_id)["status"] == "pending"
+
+
+def test_claims_stop_at_the_per_host_queue_limit(db):
+    box = Outbox()
+    for i in range(outbox_module.HOST_QUEUE + 3):
+        box.enqueue("http://slow.test/notify", {"n": i})
+    other = box.enqueue("http://fast.test/notify", {})
+
+    claimed = box._claim_due()
+
+    assert sum(r["url"].startswith("http://slow.test") for r in claimed) == outbox_module.HOST_QUEUE
+    assert other in [r["id"] for r in claimed]
+
+
+def test_slow_host_does_not_hold_up_other_hosts(db):
+    async def scenario():
+        stuck = asyncio.Event()
+        delivered = []
+
+        async def handler(request):
+            if request.url.host == "slow.test":
+                await stuck.wait()
+            delivered.append(request.url.host)
+            return httpx.Response(200)
+
+        box = worker(handler)
+        box.start()
+        for _ in range(3):
+            box.enqueue("http://slow.test/notify", {})
+        await asyncio.sleep(0.05)  # claimed and stuck in flight
+        fast = box.enqueue("http://fast.test/notify", {})
+        for _ in range(100):
+            if row(fast)["status"] == "delivered":
+                break
+            await asyncio.sleep(0.01)
+        assert row(fast)["status"] == "delivered"
+        assert "slow.test" not in delivered
+
+        stuck.set()
+        for _ in range(100):
+            if box.backlog()["pending"] == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert box.backlog()["delivered"] == 4
+        await box.aclose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,67 @@
+import asyncio
+
+import httpx
+import pytest
+
+from pages_watcher import PagesWatcher
+
+PAGE = "https://tester.github.io/site/"
+
+
+def wait(builds, page, commit_sha="abc123", timeout=2.0):
+    """Runs one watcher.wait() against a MockTransport; returns (result, requested paths)."""
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.url.path)
+        if request.url.path.endswith("/pages/builds/latest"):
+            return builds(len(seen))
+        return page(len(seen))
+
+    async def go():
+        watcher = PagesWatcher()
+        watcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await watcher.wait(PAGE, "site", commit_sha, timeout=timeout)
+        finally:
+            await watcher.aclose()
+
+    return asyncio.run(go()), seen
+
+
+def ok(n):
+    return httpx.Response(200, text="<html></html>")
+
+
+@pytest.mark.parametrize("builds", [
+    lambda n: httpx.Response(403, json={"message": "Resource not accessible by integration"}),
+    lambda n: httpx.Response(404, json={"message": "Not Found"}),
+    lambda n: httpx.Response(200, json={"status": "built"}),  # no commit (Actions deployments)
+])
+def test_unusable_build_api_falls_back_to_the_site(builds):
+    live, seen = wait(builds, ok)
+    assert live is True
+    # The build API is not asked again once it proved unusable
+    assert seen == ["/repos/tester/site/pages/builds/latest", "/site/"]
+
+
+def test_site_is_not_live_until_the_build_for_the_pushed_commit_is_done():
+    def builds(n):
+        commit, status = ("old", "built") if n < 3 else ("abc123", "building") if n < 5 else ("abc123", "built")
+        return httpx.Response(200, json={"commit": commit, "status": status})
+
+    live, seen = wait(builds, ok)
+    assert live is True
+    # The site (already 200 from the previous deployment) is only asked once the build is done
+    assert seen == ["/repos/tester/site/pages/builds/latest"] * 5 + ["/site/"]
+
+
+def test_errored_build_fails_the_wait():
+    live, seen = wait(lambda n: httpx.Response(200, json={"commit": "abc123", "status": "errored"}), ok)
+    assert live is False
+    assert "/site/" not in seen
+
+
+def test_timeout_resolves_false():
+    live, _ = wait(lambda n: httpx.Response(403), lambda n: httpx.Response(404), timeout=0.2)
+    assert live is False
@@ -0,0 +1,45 @@
+import pytest
+
+from llm_client import _validate_plan
+
+
+def plan(*paths):
+    return {"files": [{"path": p, "purpose": "x"} for p in paths], "notes": ""}
+
+
+def test_reserved_paths_are_dropped_from_the_plan():
+    result = _validate_plan(plan(
+        "index.html", "attachments/data.csv", "./attachments/logo.png", "README.md", "readme.md",
+        "LICENSE", ".git/config", "js/app.js", "docs/README.md",
+    ))
+    assert [f["path"] for f in result["files"]] == ["index.html", "js/app.js", "docs/README.md"]
+
+
+def test_paths_outside_the_repo_are_dropped_from_the_plan():
+    result = _validate_plan(plan(
+        "../x.js", "/etc/x", "js/../../x.js", "C:/x.js", "..\\x.js", "js/app.js", "css/..style.css",
+    ))
+    assert [f["path"] for f in result["files"]] == ["js/app.js", "css/..style.css"]
+
+
+def test_plan_of_only_escaping_paths_is_rejected():
+    with pytest.raises(ValueError):
+        _validate_plan(plan("../index.html", "/tmp/app.js"))
+
+
+def test_plan_of_only_reserved_paths_is_rejected():
+    with pytest.raises(ValueError):
+        _validate_plan(plan("README.md", "attachments/a.csv"))
+
+
+@pytest.mark.parametrize("bad", [{}, {"files": []}, plan("a.js", "a.js"), {"files": [{"path": ""}]}])
+def test_malformed_plans_are_rejected(bad):
+    with pytest.raises(ValueError):
+        _validate_plan(bad)
+
+
+def test_plan_is_capped(monkeypatch):
+    import llm_client
+
+    monkeypatch.setattr(llm_client, "LLM_PLAN_MAX_FILES", 2)
+    assert len(_validate_plan(plan("a.js", "b.js", "c.js"))["files"]) == 2
@@ -0,0 +1,221 @@
+import asyncio
+import types
+
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimiter, TokenBucket, parse_duration
+
+
+class Clock:
+    """Stands in for time.monotonic inside rate_limiter; moves only when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter, "time", types.SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def limiter(rpm=0, tpm=0, limit=8, min_limit=1, max_limit=16) -> RateLimiter:
+    lim = RateLimiter()
+    lim.requests, lim.tokens = TokenBucket(rpm), TokenBucket(tpm)
+    lim.min_limit, lim.max_limit, lim.limit = min_limit, max_limit, limit
+    return lim
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+    def __init__(self, headers):
+        super().__init__("429")
+        self.response = types.SimpleNamespace(headers=headers)
+
+
+async def is_blocked(lim: RateLimiter, cost: int, clock: Clock, advance: float = 0.0) -> bool:
+    """Whether acquire() is still waiting after the clock moved `advance` seconds (and waiters were woken)."""
+    task = asyncio.create_task(lim.acquire("files", cost))
+    await asyncio.sleep(0.02)
+    if advance:
+        clock.advance(advance)
+        await lim._notify()
+        await asyncio.sleep(0.02)
+    if task.done():
+        task.result()  # an acquire that failed is not an acquire that got through
+        return False
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    return True
+
+
+def test_bucket_refills_continuously(clock):
+    bucket = TokenBucket(60)
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.advance(0.5)
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+    clock.advance(120)
+    assert bucket.wait_time(60) == 0.0
+    assert bucket.level == 60.0  # never above capacity
+    # An oversized request waits for a full bucket instead of forever
+    bucket.take(60)
+    assert bucket.wait_time(500) == pytest.approx(60.0)
+    assert TokenBucket(0).wait_time(10 ** 9) == 0.0
+
+
+def test_bucket_sync_adopts_the_reported_quota(clock):
+    bucket = TokenBucket(100)
+    bucket.sync(limit=1000, remaining=40)
+    assert (bucket.capacity, bucket.level) == (1000.0, 40.0)
+    bucket.sync(limit=None, remaining=900)  # never assume more is left than we know of
+    assert bucket.level == 40.0
+
+
+def test_requests_block_once_the_rpm_is_spent(clock):
+    lim = limiter(rpm=2)
+
+    async def go():
+        await lim.acquire("files", 10)
+        await lim.acquire("files", 10)
+        assert await is_blocked(lim, 10, clock)
+        assert await is_blocked(lim, 10, clock, advance=20)
+        assert not await is_blocked(lim, 10, clock, advance=10)  # half a minute refills one request
+
+    asyncio.run(go())
+    assert lim.inflight == 3
+
+
+def test_requests_block_once_the_tpm_is_spent(clock):
+    lim = limiter(tpm=1000)
+
+    async def go():
+        await lim.acquire("files", 800)
+        assert await is_blocked(lim, 300, clock)
+        assert await is_blocked(lim, 300, clock, advance=1)  # 16 tokens back: not enough yet
+        assert not await is_blocked(lim, 300, clock, advance=5)
+
+    asyncio.run(go())
+
+
+def test_concurrency_limit_blocks_until_a_slot_is_released(clock):
+    lim = limiter(limit=1)
+
+    async def go():
+        async with lim.slot("files", "prompt", 10):
+            task = asyncio.create_task(lim.acquire("files", 10))
+            await asyncio.sleep(0.02)
+            assert not task.done()
+        await asyncio.wait_for(task, 1)
+        assert lim.inflight == 1
+
+    asyncio.run(go())
+
+
+def test_rate_limit_halves_concurrency_and_pauses_everyone(clock):
+    lim = limiter(limit=8)
+
+    async def rejected(headers):
+        with pytest.raises(RateLimited):
+            async with lim.slot("files", "prompt", 10):
+                raise RateLimited(headers)
+
+    async def go():
+        await rejected({"retry-after": "2"})
+        assert lim.limit == 4 and lim.inflight == 0
+        assert lim.stats()["paused_seconds"] == 2.0
+
+        # 429s for other requests already in flight don't halve it again
+        lim.on_rate_limited("files", {"retry-after": "2"})
+        assert lim.limit == 4
+
+        assert await is_blocked(lim, 10, clock)
+        assert await is_blocked(lim, 10, clock, advance=1.5)
+        assert not await is_blocked(lim, 10, clock, advance=1)
+
+    asyncio.run(go())
+
+
+def test_pause_without_retry_after_backs_off_exponentially(clock):
+    lim = limiter(limit=16)
+    for expected in (1.0, 2.0, 4.0):
+        lim.on_rate_limited("files", None)
+        assert lim.stats()["paused_seconds"] == expected
+        clock.advance(expected)
+    assert lim.limit == 2
+    lim.on_rate_limited("files", {"x-ratelimit-reset-requests": "1s", "x-ratelimit-reset-tokens": "6m0s"})
+    assert lim.stats()["paused_seconds"] == rate_limiter.MAX_PAUSE
+    assert lim.limit == 1  # never below the minimum
+    lim.on_rate_limited("files", None)
+
+
+def test_successes_grow_concurrency_back(clock):
+    lim = limiter(limit=2, max_limit=4)
+    for _ in range(2):
+        lim.on_success("files", 1.0, 500)
+    assert lim.limit == 3
+    for _ in range(2):
+        lim.on_success("files", 1.0, 500)
+    assert lim.limit == 3  # a full window of `limit` successes per step
+    lim.on_success("files", 1.0, 500)
+    assert lim.limit == 4
+    for _ in range(10):
+        lim.on_success("files", 1.0, 500)
+    assert lim.limit == 4
+
+
+def test_no_growth_without_quota_headroom(clock):
+    lim = limiter(rpm=100, limit=2)
+    lim.requests.take(95)
+    for _ in range(5):
+        lim.on_success("files", 1.0, 500)
+    assert lim.limit == 2
+
+
+def test_slower_output_tokens_shrink_concurrency(clock, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "LLM_LATENCY_TOLERANCE", 2.0)
+    lim = limiter(limit=6)
+
+    def calls(n, seconds):
+        for _ in range(n):
+            lim.on_success("files", seconds, 1000)
+
+    calls(1, 1.0)
+    calls(2, 5.0)  # the moving average crosses 2x the best rate
+    assert lim.limit == 5
+    calls(5, 5.0)
+    assert lim.limit == 5  # one step per window of `limit` slow calls, not per call
+    calls(1, 5.0)
+    assert lim.limit == 4
+
+    calls(20, 1.0)
+    recovered = lim.limit
+    assert recovered > 4
+    calls(2, 5.0)  # a new slow stretch steps down right away
+    assert lim.limit == recovered - 1
+
+
+def test_headers_resync_both_buckets(clock):
+    lim = limiter(rpm=500, tpm=200000)
+    lim.observe_headers({
+        "x-ratelimit-limit-requests": "60", "x-ratelimit-remaining-requests": "3",
+        "x-ratelimit-limit-tokens": "90000", "x-ratelimit-remaining-tokens": "nope",
+    })
+    assert (lim.requests.capacity, lim.requests.level) == (60.0, 3.0)
+    assert (lim.tokens.capacity, lim.tokens.level) == (90000.0, 90000.0)
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("20ms", 0.02), ("1.5s", 1.5), ("6m0s", 360.0), ("1h2m", 3720.0), ("3", 3.0), ("", None), ("soon", None),
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == (pytest.approx(seconds) if seconds is not None else None)
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from utils import FileArrayStreamParser, StreamParseError
+
+FILES = [
+    {"path": "index.html", "content": "<p>{\"braces\": [1, 2]}</p>"},
+    {"path": "script.js", "content": "const s = \"]\\\\\";\n"},
+]
+
+
+def feed_all(text: str, chunk: int) -> tuple[FileArrayStreamParser, list[dict]]:
+    parser = FileArrayStreamParser()
+    files = []
+    for i in range(0, len(text), chunk):
+        files += parser.feed(text[i:i + chunk])
+    parser.close()
+    return parser, files
+
+
+@pytest.mark.parametrize("chunk", [1, 3, 1000])
+def test_files_are_returned_as_each_object_closes(chunk):
+    parser, files = feed_all(json.dumps(FILES), chunk)
+    assert files == FILES
+    assert parser.files == FILES
+
+
+def test_each_file_is_emitted_before_the_array_ends():
+    parser = FileArrayStreamParser()
+    text = json.dumps(FILES)
+    first_end = text.index("}, {") + 1
+    assert parser.feed(text[:first_end]) == [FILES[0]]
+    assert not parser.finished
+
+
+@pytest.mark.parametrize("preamble", [
+    "```json\n",
+    'Here is the "app": ',
+    "Sure! Files {as requested} [see below]:\n",
+])
+def test_chatty_preamble_is_skipped(preamble):
+    _, files = feed_all(preamble + json.dumps(FILES) + "\n```", 7)
+    assert files == FILES
+
+
+def test_empty_array():
+    parser, files = feed_all("[ ]", 1)
+    assert files == [] and parser.finished
+
+
+def test_output_that_never_starts_an_array_fails_fast():
+    parser = FileArrayStreamParser()
+    with pytest.raises(StreamParseError):
+        parser.feed("x" * (FileArrayStreamParser.MAX_PREAMBLE + 1))
+
+
+def test_truncated_output_raises_on_close():
+    text = json.dumps(FILES)
+    parser = FileArrayStreamParser()
+    assert parser.feed(text[:-5]) == [FILES[0]]
+    with pytest.raises(StreamParseError, match="1 complete file"):
+        parser.close()
+
+
+@pytest.mark.parametrize("text", [
+    '[{"path": "a"}]',                                       # no content
+    '[{"path": "a", "content": "x"} {"path": "b", "content": "y"}]',  # missing comma
+    '[{"path": "a", "content": x}]',                         # not JSON
+])
+def test_malformed_objects_raise_mid_stream(text):
+    with pytest.raises(StreamParseError):
+        FileArrayStreamParser().feed(text)
@@ -0,0 +1,74 @@
+import pytest
+
+from llm_generator import apply_edits, safe_repo_path
+from utils import PatchError, apply_unified_diff
+
+ORIGINAL = "".join(f"line {i}\n" for i in range(1, 11))
+
+
+def test_replaces_a_line_using_its_context():
+    diff = "--- a/f\n+++ b/f\n@@ -4,3 +4,3 @@\n line 4\n-line 5\n+LINE FIVE\n line 6\n"
+    assert apply_unified_diff(ORIGINAL, diff) == ORIGINAL.replace("line 5\n", "LINE FIVE\n")
+
+
+def test_insertion_only_hunk_goes_after_the_given_line():
+    diff = "@@ -5,0 +6,1 @@\n+inserted\n"
+    lines = apply_unified_diff(ORIGINAL, diff).splitlines()
+    assert lines[4:7] == ["line 5", "inserted", "line 6"]
+
+
+def test_insertion_into_an_empty_file():
+    assert apply_unified_diff("", "@@ -0,0 +1,2 @@\n+a\n+b\n") == "a\nb\n"
+
+
+def test_wrong_line_numbers_are_only_a_hint():
+    diff = "@@ -40,2 +40,2 @@\n line 8\n-line 9\n+nine\n"
+    assert "nine\n" in apply_unified_diff(ORIGINAL, diff)
+
+
+def test_later_hunks_account_for_earlier_ones():
+    diff = (
+        "@@ -1,1 +1,3 @@\n line 1\n+a\n+b\n"
+        "@@ -5,0 +8,1 @@\n+after five\n"
+    )
+    lines = apply_unified_diff(ORIGINAL, diff).splitlines()
+    assert lines[:3] == ["line 1", "a", "b"]
+    assert lines[6:9] == ["line 5", "after five", "line 6"]
+
+
+def test_trailing_whitespace_differences_still_match():
+    diff = "@@ -2,1 +2,1 @@\n-line 2   \n+two\n"
+    assert apply_unified_diff(ORIGINAL, diff).splitlines()[1] == "two"
+
+
+@pytest.mark.parametrize("diff", [
+    "@@ -2,1 +2,1 @@\n-not in the file\n+x\n",
+    "no hunks here\n",
+    "@@ -2,1 +2,1 @@\n?bogus\n",
+])
+def test_bad_diffs_raise(diff):
+    with pytest.raises(PatchError):
+        apply_unified_diff(ORIGINAL, diff)
+
+
+def test_apply_edits_writes_patches_contents_and_deletions(tmp_path):
+    (tmp_path / "a.txt").write_text(ORIGINAL)
+    (tmp_path / "old.js").write_text("gone")
+    edits = [
+        {"path": "a.txt", "diff": "@@ -1,1 +1,1 @@\n-line 1\n+first\n"},
+        {"path": "b/new.txt", "content": "new"},
+        {"path": "old.js", "delete": True},
+        {"path": "a.txt", "diff": "@@ -1,1 +1,1 @@\n-missing\n+x\n"},
+    ]
+    changed, failed = apply_edits(tmp_path, edits)
+    assert changed == ["a.txt", "b/new.txt", "old.js"]
+    assert failed == ["a.txt"]
+    assert (tmp_path / "a.txt").read_text().startswith("first\n")
+    assert (tmp_path / "b/new.txt").read_text() == "new"
+    assert not (tmp_path / "old.js").exists()
+
+
+@pytest.mark.parametrize("rel", ["../escape.txt", ".git/config", "/etc/passwd"])
+def test_paths_outside_the_repo_are_refused(tmp_path, rel):
+    with pytest.raises(ValueError):
+        safe_repo_path(tmp_path, rel)
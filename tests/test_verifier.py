@@ -0,0 +1,80 @@
+import shutil
+
+import pytest
+
+from verifier import verify_repo
+
+needs_node = pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+
+
+def site(tmp_path, files: dict[str, str]):
+    for rel, text in files.items():
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+    return tmp_path
+
+
+GOOD = {
+    "index.html": """<!doctype html><html><head>
+<link rel="stylesheet" href="css/style.css"><link rel="icon" href="missing.ico">
+</head><body><div id="total"></div><img src="attachments/logo.png">
+<script src="js/app.js" type="module"></script></body></html>""",
+    "css/style.css": "body { color: red; } /* { */ a::after { content: '}'; }",
+    "js/app.js": "import { sum } from './util.js';\nfetch('data.json').then(r => r.json());\n"
+                 "document.querySelector('#chart');\n",
+    "js/util.js": "export const sum = (a, b) => a + b;\n",
+    "data.json": '{"rows": []}',
+    "attachments/logo.png": "png",
+}
+
+
+def test_a_complete_site_passes(tmp_path):
+    report = verify_repo(site(tmp_path, GOOD))
+    assert report.ok, report.problems
+    assert report.files_checked == 5
+
+
+def test_missing_references_are_blamed_on_the_referencing_file(tmp_path):
+    files = {**GOOD, "js/app.js": GOOD["js/app.js"] + "fetch('attachments/missing.csv');\n"}
+    del files["js/util.js"]
+    files["index.html"] = files["index.html"].replace("</body>", "<script src=\"js/gone.js\"></script></body>")
+
+    failing = verify_repo(site(tmp_path, files)).failing_files()
+
+    assert set(failing) == {"index.html", "js/app.js"}
+    assert any("js/gone.js" in m for m in failing["index.html"])
+    assert any("util.js" in m for m in failing["js/app.js"])
+    assert any("attachments/missing.csv" in m for m in failing["js/app.js"])
+
+
+def test_missing_index_truncated_html_and_bad_json_or_css(tmp_path):
+    files = {
+        "about.html": "<html><body><script>let x = 1;",
+        "data.json": "{not json",
+        "style.css": "a { color: red;",
+    }
+    failing = verify_repo(site(tmp_path, files)).failing_files()
+    assert set(failing) == {"index.html", "about.html", "data.json", "style.css"}
+
+
+@needs_node
+def test_javascript_syntax_errors_are_reported(tmp_path):
+    files = {**GOOD, "js/util.js": "export const sum = (a, b) => {\n"}
+    failing = verify_repo(site(tmp_path, files)).failing_files()
+    assert list(failing) == ["js/util.js"]
+
+
+def test_static_checks(tmp_path):
+    checks = [
+        "Page has an element with id total",
+        "document.querySelector('#chart') renders a bar chart",  # created by the script
+        "#summary shows the sum",
+        "data.json is loaded",
+        "results.csv is offered for download",
+        "The page looks nice",
+    ]
+    report = verify_repo(site(tmp_path, GOOD), checks)
+
+    assert [c["status"] for c in report.checks] == ["pass", "pass", "fail", "pass", "fail", "skipped"]
+    assert report.failing_files() == {"index.html": ["check '#summary shows the sum' expects an element with id 'summary'"]}
@@ -0,0 +1,154 @@
+import os
+import time
+
+import pytest
+
+import job_store
+import locks
+import workspace
+
+
+@pytest.fixture
+def ws(tmp_path, monkeypatch):
+    """Fresh workspace registry and job table, with task folders, mirrors and blobs under tmp_path."""
+    for module in (workspace, job_store):
+        monkeypatch.setattr(module, "JOB_DB_PATH", tmp_path / "jobs.db")
+        monkeypatch.setattr(module, "_conn", None)
+    monkeypatch.setattr(workspace, "BASE_REPO_DIR", tmp_path / "repos")
+    monkeypatch.setattr(workspace, "MIRROR_DIR", tmp_path / "repos" / ".mirrors")
+    monkeypatch.setattr(workspace, "ATTACHMENT_STORE_DIR", tmp_path / "repos" / ".blobs")
+    monkeypatch.setattr(workspace, "WORKSPACE_TMPFS_DIR", None)
+    yield tmp_path / "repos"
+    for module in (workspace, job_store):
+        if module._conn is not None:
+            module._conn.close()
+
+
+def folder(root, name: str, size: int = 1000):
+    path = root / name
+    path.mkdir(parents=True)
+    (path / "index.html").write_bytes(b"x" * size)
+    return path
+
+
+def tracked(path, kind: str, owner: str, last_used: float):
+    workspace.track(path, kind, owner, size=workspace.dir_size(path))
+    with workspace._lock:
+        workspace._db().execute("UPDATE workspaces SET last_used = ? WHERE path = ?", (last_used, str(path)))
+
+
+def unfinished(key: str, workspace_path=None, attachments=()):
+    job_store.create_job(key, {"task": key, "attachments": list(attachments)})
+    if workspace_path is not None:
+        job_store.advance(key, "attachments", workspace=str(workspace_path))
+
+
+def remaining(root) -> list[str]:
+    return sorted(p.name for p in root.iterdir() if not p.name.startswith("."))
+
+
+# ---------------------------------------------------------------------
+# Eviction
+# ---------------------------------------------------------------------
+def test_least_recently_used_are_evicted_down_to_the_low_watermark(ws):
+    for i, name in enumerate(["a_app", "b_app", "c_app", "d_app"]):
+        tracked(folder(ws, name), "task", f"job-{name}", last_used=100 + i)
+
+    # 4000 bytes tracked, limit 3000: evict until <= 2700
+    evicted = workspace._evict(tmpfs=False, limit=3000)
+
+    assert [os.path.basename(p) for p in evicted] == ["a_app", "b_app"]
+    assert remaining(ws) == ["c_app", "d_app"]
+    assert workspace.usage()["disk_entries"] == 2
+    assert workspace._evict(tmpfs=False, limit=3000) == []  # under the limit: nothing to do
+
+
+def test_workspaces_of_unfinished_jobs_are_kept(ws):
+    busy = folder(ws, "busy_app")
+    tracked(busy, "task", "busy", last_used=100)
+    tracked(folder(ws, "idle_app"), "task", "idle", last_used=200)
+    unfinished("busy", busy)
+
+    workspace._evict(tmpfs=False, limit=1500)
+
+    assert remaining(ws) == ["busy_app"]
+
+
+def test_locked_mirrors_are_skipped(ws):
+    mirrors = workspace.MIRROR_DIR
+    tracked(folder(mirrors, "held"), "mirror", "held", last_used=100)
+    tracked(folder(mirrors, "free"), "mirror", "free", last_used=200)
+
+    with locks.repo_lock("held"):
+        evicted = workspace._evict(tmpfs=False, limit=1500)
+
+    assert [os.path.basename(p) for p in evicted] == ["free"]
+    assert sorted(p.name for p in mirrors.iterdir()) == ["held"]
+
+
+def test_orphaned_blobs_are_collected_after_the_grace_period(ws):
+    blobs = workspace.ATTACHMENT_STORE_DIR
+    blobs.mkdir(parents=True)
+    old = time.time() - 7200
+    for name in ("orphan", "linked", "referenced", "upload.part", "fresh"):
+        (blobs / name).write_bytes(b"data")
+        if name != "fresh":
+            os.utime(blobs / name, (old, old))
+    os.link(blobs / "linked", folder(ws, "t_app") / "data.csv")
+    unfinished("k", attachments=[{"name": "a.csv", "sha256": "referenced"}])
+
+    assert workspace.collect_blobs(grace=3600) == 1
+    assert sorted(p.name for p in blobs.iterdir()) == ["fresh", "linked", "referenced", "upload.part"]
+
+
+# ---------------------------------------------------------------------
+# Reconcile
+# ---------------------------------------------------------------------
+def test_reconcile_registers_folders_and_recovers_their_owner(ws):
+    resumed = folder(ws, "resumed_n1_app")
+    folder(ws, "stray_n2_app")
+    folder(ws, "not-a-workspace")
+    folder(workspace.MIRROR_DIR, "site")
+    gone = ws / "gone_app"
+    workspace.track(gone, "task", "old")
+    unfinished("resumed", resumed)
+
+    assert workspace.reconcile() == 3
+
+    with workspace._lock:
+        rows = dict(workspace._db().execute("SELECT path, owner FROM workspaces").fetchall())
+    assert rows == {
+        str(resumed): "resumed",
+        str(ws / "stray_n2_app"): "",
+        str(workspace.MIRROR_DIR / "site"): "site",
+    }
+
+
+def test_adopted_folders_are_not_evicted_while_their_job_may_still_run(ws):
+    resumed = folder(ws, "resumed_n1_app")
+    stray = folder(ws, "stray_n2_app")
+    unfinished("resumed", resumed)
+    unfinished("other")  # not past 'received': its folder can't be identified yet
+    workspace.reconcile()
+    for last_used, path in enumerate((stray, resumed)):
+        with workspace._lock:
+            workspace._db().execute("UPDATE workspaces SET last_used = ? WHERE path = ?", (last_used, str(path)))
+
+    assert workspace._evict(tmpfs=False, limit=100) == []
+    job_store.finish("other")
+    assert workspace._evict(tmpfs=False, limit=100) == []  # the stray one may still be the resumed job's
+
+    job_store.finish("resumed")
+    assert workspace._evict(tmpfs=False, limit=100) == [str(stray), str(resumed)]
+
+
+def test_reconcile_fills_in_the_owner_of_an_already_adopted_folder(ws):
+    path = folder(ws, "late_n1_app")
+    workspace.reconcile()
+    unfinished("late", path)
+
+    workspace.reconcile()
+
+    with workspace._lock:
+        owner = workspace._db().execute("SELECT owner FROM workspaces WHERE path = ?", (str(path),)).fetchone()[0]
+    assert owner == "late"
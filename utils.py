@@ -0,0 +1,192 @@
+"""
+utils.py
+--------
+Helper functions for JSON extraction and validation of LLM output, and for
+applying LLM-written unified diffs.
+"""
+
+import json
+import re
+
+
+class StreamParseError(ValueError):
+    """Raised as soon as streamed LLM output can no longer be a valid file array."""
+
+
+class FileArrayStreamParser:
+    """
+    Incrementally parses a streamed `[{"path": ..., "content": ...}, ...]` array.
+
+    feed() accepts raw text chunks as they arrive and returns every file object
+    completed by that chunk, so callers can write files before the completion
+    ends. Malformed output raises StreamParseError mid-stream; close() raises if
+    the array was never terminated (truncated output).
+    """
+
+    # How much leading chatter (e.g. a ```json fence or a sentence) is tolerated before "["
+    MAX_PREAMBLE = 2000
+
+    def __init__(self):
+        self._buf = []          # characters of the object currently being read
+        self._preamble = 0
+        self._opening = False   # seen a "[" that may open the array (if "{" or "]" follows)
+        self._started = False   # seen the opening "["
+        self._finished = False  # seen the closing "]"
+        self._depth = 0         # brace/bracket depth inside the current object
+        self._in_string = False
+        self._escape = False
+        self._expect_value = True  # after "[" or ",": an object (or "]") must follow
+        self.files: list[dict] = []
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    def feed(self, chunk: str) -> list[dict]:
+        completed = []
+        for ch in chunk:
+            if self._finished:
+                break
+            if not self._started:
+                # Skip any text before the first "[" that is followed by "{" or "]"
+                if self._opening and not ch.isspace():
+                    self._opening = False
+                    if ch in "{]":
+                        self._started = True
+                if not self._started:
+                    if ch == "[":
+                        self._opening = True
+                    self._preamble += 1
+                    if self._preamble > self.MAX_PREAMBLE:
+                        raise StreamParseError("LLM output does not start with a JSON array")
+                    continue
+
+            if self._depth == 0:
+                # Between objects: only whitespace, commas, "{" and "]" are valid
+                if ch.isspace():
+                    continue
+                if ch == "{" and self._expect_value:
+                    self._depth = 1
+                    self._buf = [ch]
+                    self._expect_value = False
+                elif ch == "," and not self._expect_value:
+                    self._expect_value = True
+                elif ch == "]" and (not self._expect_value or not self.files):
+                    self._finished = True
+                else:
+                    raise StreamParseError(f"Unexpected {ch!r} between files in LLM output")
+                continue
+
+            self._buf.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.append(self._close_object())
+        return completed
+
+    def _close_object(self) -> dict:
+        text = "".join(self._buf)
+        self._buf = []
+        try:
+            obj = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise StreamParseError(f"Malformed file object in LLM output: {e}") from e
+        if not (isinstance(obj, dict) and "path" in obj and "content" in obj):
+            raise StreamParseError("File object is missing 'path' or 'content'")
+        self.files.append(obj)
+        return obj
+
+    def close(self):
+        """Validate that the stream ended with a complete array."""
+        if not self._finished:
+            raise StreamParseError(
+                f"LLM output was truncated after {len(self.files)} complete file(s)"
+            )
+
+
+class PatchError(ValueError):
+    """Raised when a unified diff does not apply cleanly to the current file."""
+
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@")
+
+
+def _parse_hunks(diff: str) -> list[tuple[int, list[str], list[str]]]:
+    """Returns [(old_start, old_lines, new_lines), ...] for each hunk in `diff`."""
+    hunks = []
+    current = None
+    for line in diff.splitlines():
+        header = _HUNK_HEADER.match(line)
+        if header:
+            current = (int(header.group(1)), [], [])
+            hunks.append(current)
+            continue
+        # File headers ("--- a/x", "+++ b/x") only appear before the first hunk
+        if current is None or line.startswith("\\"):
+            continue
+        tag, text = (line[0], line[1:]) if line else (" ", "")
+        if tag == " ":
+            current[1].append(text)
+            current[2].append(text)
+        elif tag == "-":
+            current[1].append(text)
+        elif tag == "+":
+            current[2].append(text)
+        else:
+            raise PatchError(f"Unexpected line in hunk: {line!r}")
+    if not hunks:
+        raise PatchError("Diff contains no hunks")
+    return hunks
+
+
+def _find_block(lines: list[str], block: list[str], start: int, expected: int) -> int:
+    """Index >= start where `block` occurs, closest to `expected`; -1 if absent."""
+    if not block:
+        return min(max(expected, start), len(lines))
+    candidates = []
+    for strip in (False, True):
+        norm = (lambda s: s.rstrip()) if strip else (lambda s: s)
+        target = [norm(b) for b in block]
+        for i in range(start, len(lines) - len(block) + 1):
+            if norm(lines[i]) == target[0] and [norm(x) for x in lines[i:i + len(block)]] == target:
+                candidates.append(i)
+        if candidates:
+            return min(candidates, key=lambda i: abs(i - expected))
+    return -1
+
+
+def apply_unified_diff(original: str, diff: str) -> str:
+    """
+    Applies a unified diff to `original` and returns the patched text.
+    Hunks are located by their context (line numbers are only a hint, since
+    LLM-written diffs often get them wrong); raises PatchError if any hunk
+    does not match.
+    """
+    lines = original.splitlines()
+    cursor, offset = 0, 0
+    for old_start, old_lines, new_lines in _parse_hunks(diff):
+        # A zero-length old range ("@@ -5,0 ...") means "insert after line 5"
+        base = old_start if not old_lines else old_start - 1
+        expected = max(0, base + offset)
+        at = _find_block(lines, old_lines, cursor, expected)
+        if at == -1:
+            preview = "\n".join(old_lines[:3])
+            raise PatchError(f"Hunk @@ -{old_start} does not match the file near:\n{preview}")
+        lines[at:at + len(old_lines)] = new_lines
+        cursor = at + len(new_lines)
+        offset = at - base + len(new_lines) - len(old_lines)
+    patched = "\n".join(lines)
+    if original.endswith("\n") or not original:
+        patched += "\n"
+    return patched
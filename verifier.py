@@ -0,0 +1,387 @@
+"""
+verifier.py
+-----------
+Local pre-push verification of a generated repo.
+
+verify_repo() serves the repo folder on a throwaway local static server and
+runs fast structural checks, so obviously broken output is caught before the
+push and the Pages wait:
+
+- index.html exists and every HTML page is served and not truncated
+- inline and standalone JavaScript parses (`node --check`, when node is installed)
+- JSON files parse and CSS braces balance
+- every local asset an HTML page references (scripts, styles, images, ...)
+  and every path a script fetches or imports resolves on the server,
+  including attachments/ paths
+- task `checks` that can be decided statically: element ids they mention
+  exist in the HTML or are created by a script, files they name exist
+
+Every problem is attributed to the file that has to change, so only those
+files are regenerated (see llm_generator.verify_and_repair). Checks that
+need a browser are reported as skipped.
+"""
+
+import json
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from functools import partial
+from html.parser import HTMLParser
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from pathlib import Path, PurePosixPath
+from urllib.parse import urljoin, urlsplit, unquote
+
+from config import VERIFY_NODE_TIMEOUT
+
+SKIP_DIRS = {".git", "node_modules"}
+JS_TYPES = {"", "text/javascript", "application/javascript", "module"}
+REF_ATTRS = {
+    "script": "src", "img": "src", "source": "src", "video": "src", "audio": "src",
+    "iframe": "src", "embed": "src", "track": "src", "link": "href", "a": "href",
+}
+# Links whose rel makes the page depend on them (a missing icon is harmless)
+LINK_RELS = {"stylesheet", "manifest", "preload", "modulepreload"}
+
+# fetch()/Worker() paths resolve against the page; import specifiers against the script
+_JS_PAGE_REF = re.compile(r"""\b(?:fetch|Worker|SharedWorker)\s*\(\s*(['"`])([^'"`$]+)\1""")
+_JS_IMPORT_REF = re.compile(
+    r"""\bimport\s*\(\s*(['"`])([^'"`$]+)\1|^\s*(?:import|export)\b[^'"`;]*?\bfrom\s*(['"])([^'"]+)\3""", re.M
+)
+_JS_ATTACHMENT_REF = re.compile(r"""(['"`])((?:\./|/)?attachments/[^'"`$?#]+)\1""")
+_CHECK_ID = re.compile(
+    r"""(?:(?:^|(?<=[\s"'`(\[,]))#|\bid\s*[=:]\s*["'`]?|\bid\s+["'`]|\bwith id\s+)([A-Za-z][\w-]*)"""
+)
+_CHECK_FILE = re.compile(r"""\b([\w./-]+\.(?:html|js|mjs|css|json|csv|txt|md|svg|png|jpe?g))\b""")
+
+
+@dataclass
+class Problem:
+    path: str      # repo file that has to change
+    message: str
+
+
+@dataclass
+class Report:
+    problems: list[Problem] = field(default_factory=list)
+    checks: list[dict] = field(default_factory=list)  # {"check", "status": pass|fail|skipped, "detail"}
+    files_checked: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+    def failing_files(self) -> dict[str, list[str]]:
+        """{path: [messages]} for every file with a problem."""
+        failing: dict[str, list[str]] = {}
+        for p in self.problems:
+            failing.setdefault(p.path, []).append(p.message)
+        return failing
+
+    def to_dict(self) -> dict:
+        return {
+            "ok": self.ok,
+            "files_checked": self.files_checked,
+            "problems": [asdict(p) for p in self.problems],
+            "checks": self.checks,
+        }
+
+
+# ---------------------------------------------------------------------
+# Local static server
+# ---------------------------------------------------------------------
+_http = None  # httpx.Client
+
+
+def _http_client():
+    """Shared httpx client for the local server checks (created on first use; it is thread-safe)."""
+    global _http
+    if _http is None:
+        import httpx
+
+        _http = httpx.Client(timeout=5)
+    return _http
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve_directory(root: Path):
+    """Serves `root` on 127.0.0.1 (random port) for the duration of the block; yields the base URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(_QuietHandler, directory=str(root)))
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.05}, name="verify-server", daemon=True
+    )
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# ---------------------------------------------------------------------
+# Parsing
+# ---------------------------------------------------------------------
+class _PageParser(HTMLParser):
+    """Collects local references, inline scripts and element ids of one HTML page."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.refs: list[tuple[str, bool]] = []  # (url, loaded as a module script)
+        self.inline_scripts: list[tuple[str, bool]] = []  # (code, is module)
+        self.ids: set[str] = set()
+        self.saw_html = self.closed_html = False
+        self._script: dict | None = None
+
+    @property
+    def unclosed_script(self) -> bool:
+        return self._script is not None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {k: v or "" for k, v in attrs}
+        if attrs.get("id"):
+            self.ids.add(attrs["id"])
+        if tag == "html":
+            self.saw_html = True
+        attr = REF_ATTRS.get(tag)
+        value = attrs.get(attr, "").strip() if attr else ""
+        script_type = attrs.get("type", "").strip().lower()
+        if tag == "link" and not LINK_RELS & set(attrs.get("rel", "").lower().split()):
+            value = ""
+        if value:
+            self.refs.append((value, tag == "script" and script_type == "module"))
+        if tag == "script" and not attrs.get("src"):
+            self._script = {"type": script_type, "code": []}
+        for srcset in (attrs.get("srcset"),) if tag in ("img", "source") else ():
+            for candidate in (srcset or "").split(","):
+                if candidate.strip():
+                    self.refs.append((candidate.split()[0], False))
+
+    def handle_data(self, data):
+        if self._script is not None:
+            self._script["code"].append(data)
+
+    def handle_endtag(self, tag):
+        if tag == "script" and self._script is not None:
+            if self._script["type"] in JS_TYPES:
+                self.inline_scripts.append(("".join(self._script["code"]), self._script["type"] == "module"))
+            self._script = None
+        elif tag == "html":
+            self.closed_html = True
+
+
+def _is_local(ref: str) -> bool:
+    if not ref or ref.startswith(("#", "//", "data:", "blob:", "mailto:", "tel:", "javascript:")):
+        return False
+    return not urlsplit(ref).scheme
+
+
+def _js_refs(code: str) -> list[tuple[str, bool]]:
+    """(path, relative to the script rather than the page) for local paths a script loads."""
+    refs = [(m.group(2), False) for m in _JS_PAGE_REF.finditer(code)]
+    refs += [(m.group(2) or m.group(4), True) for m in _JS_IMPORT_REF.finditer(code)]
+    refs += [(m.group(2), False) for m in _JS_ATTACHMENT_REF.finditer(code)]
+    # Bare specifiers ("react", "@scope/pkg") need an import map; not checked
+    return [
+        (ref, by_script) for ref, by_script in refs
+        if _is_local(ref) and (not by_script or ref.startswith(("./", "../", "/")))
+    ]
+
+
+def _node_check(code: str, module: bool) -> str | None:
+    """None if `code` parses as a script (or module), else node's error message."""
+    with tempfile.NamedTemporaryFile("w", suffix=".mjs" if module else ".cjs", delete=False) as f:
+        f.write(code)
+    try:
+        result = subprocess.run(
+            ["node", "--check", f.name], capture_output=True, text=True, timeout=VERIFY_NODE_TIMEOUT
+        )
+    except subprocess.TimeoutExpired:
+        return None  # inconclusive; don't block the push on a slow machine
+    finally:
+        Path(f.name).unlink(missing_ok=True)
+    if result.returncode == 0:
+        return None
+    lines = [l for l in result.stderr.splitlines() if l.strip() and not l.startswith(("Node.js", "    at "))]
+    return " ".join(lines[-3:])[:300] or "syntax error"
+
+
+def check_js(code: str, module: bool) -> str | None:
+    """Syntax error of a script, accepting either script or module grammar; None if node is missing."""
+    if shutil.which("node") is None:
+        return None
+    error = _node_check(code, module)
+    if error is not None and _node_check(code, not module) is None:
+        return None
+    return error
+
+
+def _css_balanced(text: str) -> bool:
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    text = re.sub(r"""(["'])(?:\\.|(?!\1).)*\1""", "", text)
+    depth = 0
+    for ch in text:
+        depth += {"{": 1, "}": -1}.get(ch, 0)
+        if depth < 0:
+            return False
+    return depth == 0
+
+
+# ---------------------------------------------------------------------
+# Verification
+# ---------------------------------------------------------------------
+def _repo_files(repo_dir: Path) -> list[str]:
+    return sorted(
+        f.relative_to(repo_dir).as_posix() for f in repo_dir.rglob("*")
+        if f.is_file() and not SKIP_DIRS & set(f.relative_to(repo_dir).parts)
+    )
+
+
+def _read(repo_dir: Path, rel: str) -> str | None:
+    try:
+        return (repo_dir / rel).read_text(encoding="utf-8")
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def _url_to_path(base_url: str, url: str) -> str | None:
+    """Repo-relative path for a URL on the local server (None if it points elsewhere)."""
+    parts = urlsplit(url)
+    if not url.startswith(base_url):
+        return None
+    path = unquote(parts.path).lstrip("/")
+    return (PurePosixPath(path) / "index.html").as_posix() if path.endswith("/") or not path else path
+
+
+def verify_repo(repo_dir: Path, checks: list | None = None) -> Report:
+    """Runs every structural check and the statically decidable `checks` against repo_dir."""
+    report = Report()
+    files = _repo_files(repo_dir)
+    pages = [f for f in files if f.endswith((".html", ".htm"))]
+    all_ids: set[str] = set()
+    js_text: dict[str, str] = {}
+    script_base: dict[str, str] = {}  # script path -> URL of the first page that loads it
+    module_scripts: set[str] = set()
+
+    if "index.html" not in files:
+        report.problems.append(Problem("index.html", "index.html is missing, so the Pages site has no entry page"))
+
+    import httpx
+
+    client = _http_client()
+    with serve_directory(repo_dir) as base_url:
+
+        def served(url: str) -> bool:
+            try:
+                return client.head(url).status_code == 200
+            except httpx.HTTPError:
+                return False
+
+        checked: set[tuple[str, str]] = set()
+
+        def require(owner: str, ref: str, url: str):
+            target = _url_to_path(base_url, url)
+            if target is None or (owner, target) in checked:
+                return
+            checked.add((owner, target))
+            if served(url):
+                return
+            # Pages serves /about from about.html
+            if not PurePosixPath(target).suffix and served(url.split("?")[0].split("#")[0] + ".html"):
+                return
+            report.problems.append(Problem(owner, f"references '{ref}', which does not resolve ({target} not found)"))
+
+        for page in pages:
+            report.files_checked += 1
+            text = _read(repo_dir, page)
+            page_url = urljoin(base_url, page)
+            if text is None or not served(page_url):
+                report.problems.append(Problem(page, "page could not be read or served"))
+                continue
+            parser = _PageParser()
+            parser.feed(text)
+            parser.close()
+            all_ids |= parser.ids
+            if parser.saw_html and not parser.closed_html or parser.unclosed_script:
+                report.problems.append(Problem(page, "HTML is truncated (unclosed <html> or <script>)"))
+            for ref, is_module in parser.refs:
+                if not _is_local(ref):
+                    continue
+                url = urljoin(page_url, ref)
+                require(page, ref, url)
+                target = _url_to_path(base_url, url)
+                if target and target.endswith((".js", ".mjs")):
+                    script_base.setdefault(target, page_url)
+                    if is_module:
+                        module_scripts.add(target)
+            for i, (code, is_module) in enumerate(parser.inline_scripts):
+                js_text[f"{page}#script{i}"] = code
+                error = check_js(code, is_module)
+                if error:
+                    report.problems.append(Problem(page, f"inline <script> #{i + 1} does not parse: {error}"))
+                for ref, by_script in _js_refs(code):
+                    require(page, ref, urljoin(page_url, ref))
+
+        for rel in files:
+            suffix = PurePosixPath(rel).suffix.lower()
+            if suffix not in (".js", ".mjs", ".json", ".css") or rel.startswith("attachments/"):
+                continue
+            report.files_checked += 1
+            text = _read(repo_dir, rel)
+            if text is None:
+                report.problems.append(Problem(rel, "file is not valid UTF-8 text"))
+                continue
+            if suffix == ".json":
+                try:
+                    json.loads(text)
+                except json.JSONDecodeError as e:
+                    report.problems.append(Problem(rel, f"invalid JSON: {e}"))
+            elif suffix == ".css":
+                if not _css_balanced(text):
+                    report.problems.append(Problem(rel, "unbalanced braces in CSS"))
+            else:
+                js_text[rel] = text
+                error = check_js(text, rel in module_scripts or suffix == ".mjs")
+                if error:
+                    report.problems.append(Problem(rel, f"does not parse: {error}"))
+                page_url = script_base.get(rel, base_url)
+                for ref, by_script in _js_refs(text):
+                    require(rel, ref, urljoin(urljoin(base_url, rel) if by_script else page_url, ref))
+
+    report.checks = [_static_check(check, files, all_ids, js_text, report) for check in checks or []]
+    return report
+
+
+def _static_check(check, files: list[str], ids: set[str], js_text: dict[str, str], report: Report) -> dict:
+    """Decides one task check from the files alone where possible."""
+    text = check if isinstance(check, str) else json.dumps(check)
+    wanted_ids = {m.group(1) for m in _CHECK_ID.finditer(text)}
+    wanted_files = {m.group(1).lstrip("./") for m in _CHECK_FILE.finditer(text)}
+    if not wanted_ids and not wanted_files:
+        return {"check": text, "status": "skipped", "detail": "needs a browser"}
+
+    scripts = "\n".join(js_text.values())
+    missing_ids = [
+        i for i in sorted(wanted_ids)
+        if i not in ids and not re.search(rf"""['"`]#?{re.escape(i)}['"`]""", scripts)
+    ]
+    missing_files = [
+        f for f in sorted(wanted_files)
+        if not any(p == f or p.endswith("/" + f) for p in files)
+    ]
+    for i in missing_ids:
+        report.problems.append(Problem("index.html", f"check '{text}' expects an element with id '{i}'"))
+    if missing_files:
+        detail = "missing file(s): " + ", ".join(missing_files)
+    elif missing_ids:
+        detail = "missing id(s): " + ", ".join(missing_ids)
+    else:
+        return {"check": text, "status": "pass", "detail": ""}
+    return {"check": text, "status": "fail", "detail": detail}
@@ -0,0 +1,287 @@
+"""
+workspace.py
+------------
+Bounded working directories under BASE_REPO_DIR.
+
+- allocate() hands out a task's workspace, on WORKSPACE_TMPFS_DIR (RAM) when
+  configured and there is room under its quota, otherwise on disk. The path
+  is stored with the job so a resumed job finds it again.
+- Every workspace and Round 2 mirror is recorded (path, owner, size, last
+  use) in the job database, so all workers share one view of disk usage.
+- enforce_quota() deletes the least recently used entries until the total is
+  under WORKSPACE_QUOTA_MB. A task workspace is pinned while its job is
+  pending or running (in any worker); a mirror while its repo lock is held.
+  A task folder found on disk whose job can't be identified is pinned while
+  any job is unfinished.
+  Attachment blobs no workspace links to any more are collected as well.
+- clone_file()/clone_tree() copy with a reflink (copy-on-write) where the
+  filesystem supports it, so seeding a workspace from a mirror costs no
+  extra disk. Attachments are hard links to the immutable blob store.
+"""
+
+import fcntl
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from config import (
+    JOB_DB_PATH, BASE_REPO_DIR, MIRROR_DIR, ATTACHMENT_STORE_DIR,
+    WORKSPACE_QUOTA_MB, WORKSPACE_TMPFS_DIR, WORKSPACE_TMPFS_QUOTA_MB, WORKSPACE_BLOB_GRACE_SECONDS,
+)
+import job_store
+import locks
+import log
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workspaces (
+    path       TEXT PRIMARY KEY,
+    kind       TEXT NOT NULL,           -- 'task' or 'mirror'
+    owner      TEXT NOT NULL,           -- job key, or repo name for a mirror
+    tmpfs      INTEGER NOT NULL DEFAULT 0,
+    size_bytes INTEGER NOT NULL DEFAULT 0,
+    last_used  REAL NOT NULL
+)
+"""
+
+# Linux ioctl that makes dest share src's extents (btrfs, XFS, ...)
+FICLONE = 0x40049409
+# Evict down to this fraction of the quota so every task doesn't trigger a pass
+LOW_WATERMARK = 0.9
+
+_lock = threading.Lock()
+_conn: sqlite3.Connection | None = None
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        JOB_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(JOB_DB_PATH, check_same_thread=False, isolation_level=None, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(_SCHEMA)
+        _conn = conn
+    return _conn
+
+
+# ---------------------------------------------------------------------
+# Copy-on-write copies
+# ---------------------------------------------------------------------
+def clone_file(src: Path, dest: Path):
+    """Reflink src to dest where supported, else copy (metadata preserved either way)."""
+    try:
+        with open(src, "rb") as s, open(dest, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        shutil.copystat(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+def clone_tree(src: Path, dest: Path, ignore=None):
+    """copytree() with clone_file(), merging into an existing dest."""
+    shutil.copytree(src, dest, ignore=ignore, copy_function=clone_file, dirs_exist_ok=True)
+
+
+def dir_size(path: Path) -> int:
+    """Bytes used by the files under path (hard-linked blobs count once per link)."""
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+# ---------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------
+def track(path: Path, kind: str, owner: str, tmpfs: bool = False, size: int | None = None):
+    """Record (or refresh) a workspace or mirror; `size` None keeps the last measurement."""
+    now = time.time()
+    with _lock:
+        _db().execute(
+            """
+            INSERT INTO workspaces (path, kind, owner, tmpfs, size_bytes, last_used)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                owner = excluded.owner,
+                last_used = excluded.last_used,
+                size_bytes = CASE WHEN ? IS NULL THEN workspaces.size_bytes ELSE excluded.size_bytes END
+            """,
+            (str(path), kind, owner, int(tmpfs), size or 0, now, size),
+        )
+
+
+def release(path: Path):
+    """Measure a workspace its job no longer needs and mark it used now (it becomes evictable)."""
+    with _lock:
+        row = _db().execute("SELECT kind, owner, tmpfs FROM workspaces WHERE path = ?", (str(path),)).fetchone()
+    if row is not None and path.exists():
+        track(path, row[0], row[1], bool(row[2]), size=dir_size(path))
+
+
+def _forget(path: str):
+    with _lock:
+        _db().execute("DELETE FROM workspaces WHERE path = ?", (path,))
+
+
+def usage() -> dict:
+    """Tracked bytes and entry counts, per tier."""
+    with _lock:
+        rows = _db().execute(
+            "SELECT tmpfs, COUNT(*), COALESCE(SUM(size_bytes), 0) FROM workspaces GROUP BY tmpfs"
+        ).fetchall()
+    stats = {"disk_bytes": 0, "disk_entries": 0, "tmpfs_bytes": 0, "tmpfs_entries": 0}
+    for tmpfs, count, size in rows:
+        tier = "tmpfs" if tmpfs else "disk"
+        stats[f"{tier}_bytes"], stats[f"{tier}_entries"] = size, count
+    return stats
+
+
+def allocate(key: str, name: str) -> Path:
+    """
+    Creates the workspace directory `name` for job `key`: on tmpfs if it is
+    configured and (after evicting finished tmpfs workspaces) under its quota,
+    otherwise under BASE_REPO_DIR.
+    """
+    if WORKSPACE_TMPFS_DIR is not None:
+        limit = WORKSPACE_TMPFS_QUOTA_MB * 1024 * 1024
+        if usage()["tmpfs_bytes"] >= limit * LOW_WATERMARK:
+            _evict(tmpfs=True, limit=limit)
+        if usage()["tmpfs_bytes"] < limit * LOW_WATERMARK:
+            path = WORKSPACE_TMPFS_DIR / name
+            try:
+                path.mkdir(parents=True, exist_ok=True)
+                track(path, "task", key, tmpfs=True)
+                return path
+            except OSError as e:
+                log.warning("⚠️ tmpfs workspace unavailable (%s); using disk.", e)
+    path = BASE_REPO_DIR / name
+    path.mkdir(parents=True, exist_ok=True)
+    track(path, "task", key)
+    return path
+
+
+# ---------------------------------------------------------------------
+# Eviction
+# ---------------------------------------------------------------------
+def _candidates(tmpfs: bool) -> list[tuple[str, str, str, int]]:
+    with _lock:
+        return _db().execute(
+            "SELECT path, kind, owner, size_bytes FROM workspaces WHERE tmpfs = ? ORDER BY last_used",
+            (int(tmpfs),),
+        ).fetchall()
+
+
+def _evict(tmpfs: bool, limit: int) -> list[str]:
+    """Delete unpinned entries of one tier, oldest first, until it is under LOW_WATERMARK * limit."""
+    entries = _candidates(tmpfs)
+    total = sum(e[3] for e in entries)
+    target = limit * LOW_WATERMARK
+    if total <= limit and not (tmpfs and total >= target):
+        return []
+    active = {job["key"] for job in job_store.unfinished_jobs()}
+    evicted = []
+    for path, kind, owner, size in entries:
+        if total <= target:
+            break
+        # An owner-less folder (adopted by reconcile) may belong to any unfinished job
+        if kind == "task" and (owner in active or (not owner and active)):
+            continue
+        if kind == "mirror":
+            # Held by a checkout or push in some worker: skip it this round
+            with locks.try_repo_lock(owner) as acquired:
+                if not acquired:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+        else:
+            shutil.rmtree(path, ignore_errors=True)
+        _forget(path)
+        total -= size
+        evicted.append(path)
+    return evicted
+
+
+def collect_blobs(grace: float = WORKSPACE_BLOB_GRACE_SECONDS) -> int:
+    """
+    Deletes attachment blobs that no workspace links to any more and no
+    unfinished job references, once they are older than `grace` seconds.
+    Returns the number of blobs removed.
+    """
+    if not ATTACHMENT_STORE_DIR.exists():
+        return 0
+    referenced = {
+        a.get("sha256")
+        for job in job_store.unfinished_jobs()
+        for a in (job["payload"].get("attachments") or []) + (job["artifacts"].get("attachments") or [])
+        if isinstance(a, dict)
+    }
+    cutoff = time.time() - grace
+    removed = 0
+    for blob in ATTACHMENT_STORE_DIR.iterdir():
+        try:
+            st = blob.stat()
+        except FileNotFoundError:
+            continue
+        if blob.suffix == ".part" or st.st_nlink > 1 or st.st_mtime > cutoff or blob.name in referenced:
+            continue
+        blob.unlink(missing_ok=True)
+        removed += 1
+    return removed
+
+
+def enforce_quota() -> dict:
+    """One eviction pass over both tiers plus blob collection. Returns what was removed."""
+    evicted = _evict(tmpfs=False, limit=WORKSPACE_QUOTA_MB * 1024 * 1024)
+    if WORKSPACE_TMPFS_DIR is not None:
+        evicted += _evict(tmpfs=True, limit=WORKSPACE_TMPFS_QUOTA_MB * 1024 * 1024)
+    blobs = collect_blobs()
+    if evicted or blobs:
+        log.info("🧹 Reclaimed %d workspace(s) and %d attachment blob(s).", len(evicted), blobs)
+    return {"workspaces": evicted, "blobs": blobs}
+
+
+def reconcile():
+    """
+    Registers workspaces and mirrors that exist on disk but are not tracked
+    (created before the registry, or by a crashed worker) and forgets
+    entries whose directory is gone. A task folder's owner is the unfinished
+    job whose `workspace` artifact names it, if any.
+    """
+    owners = {
+        job["artifacts"]["workspace"]: job["key"]
+        for job in job_store.unfinished_jobs()
+        if job["artifacts"].get("workspace")
+    }
+    with _lock:
+        db = _db()
+        known = {row[0] for row in db.execute("SELECT path FROM workspaces").fetchall()}
+        for path, key in owners.items():
+            db.execute("UPDATE workspaces SET owner = ? WHERE path = ? AND owner = ''", (key, path))
+    for path in known:
+        if not Path(path).exists():
+            _forget(path)
+    found = []
+    roots = [(BASE_REPO_DIR, "task", False), (MIRROR_DIR, "mirror", False)]
+    if WORKSPACE_TMPFS_DIR is not None:
+        roots.append((WORKSPACE_TMPFS_DIR, "task", True))
+    for root, kind, tmpfs in roots:
+        if not root.exists():
+            continue
+        for entry in root.iterdir():
+            if not entry.is_dir() or str(entry) in known:
+                continue
+            if kind == "task" and not entry.name.endswith("_app"):
+                continue
+            found.append((entry, kind, tmpfs))
+    for entry, kind, tmpfs in found:
+        # Unknown owners stay "": _evict keeps those while any job is unfinished
+        owner = entry.name if kind == "mirror" else owners.get(str(entry), "")
+        track(entry, kind, owner, tmpfs=tmpfs, size=dir_size(entry))
+        with _lock:
+            _db().execute("UPDATE workspaces SET last_used = ? WHERE path = ?", (entry.stat().st_mtime, str(entry)))
+    return len(found)